@@ -0,0 +1,112 @@
+import glob
+import json
+import os
+
+from behavior_generation.watch_history import load_watch_histories, save_watch_histories
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 3
+
+# Run arguments stored in the checkpoint. A resumed run reuses them, since they decide its output.
+RUN_PARAMETERS = [
+    "num_users",
+    "start_date",
+    "movie_data_file",
+    "constraint_rules_file",
+    "engine",
+    "sampling",
+    "seed",
+    "users_per_chunk",
+    "workers",
+    "shard_size",
+    "preference_format",
+    "output_format",
+    "partition_by",
+    "row_group_size",
+    "checkpoint_days",
+]
+
+
+def checkpoint_path(output_dir):
+    return os.path.join(output_dir, CHECKPOINT_FILE)
+
+
+def encode_random_state(state):
+    """
+    Convert a random.getstate() tuple to JSON-serializable lists.
+    """
+    version, internal_state, gauss_next = state
+    return [version, list(internal_state), gauss_next]
+
+
+def decode_random_state(state):
+    """
+    Convert a state encoded by encode_random_state back to the tuple random.setstate() expects.
+    """
+    version, internal_state, gauss_next = state
+    return version, tuple(internal_state), gauss_next
+
+
+def save_checkpoint(output_dir, parameters, next_day, num_days, writer_position, random_state=None, movie_data_digest=None, watch_histories=None, shard_random_states=None):
+    """
+    Save the checkpoint of a run in output_dir, replacing the previous one atomically.
+
+    Watch histories go to a watch_history-<next_day>.npz file referenced by the checkpoint,
+    so the previous checkpoint stays consistent until the new one replaces it.
+
+    :param parameters: Run arguments, the RUN_PARAMETERS are stored.
+    :param next_day: First day number not written yet.
+    :param num_days: Number of days the run simulates in total.
+    :param writer_position: Position returned by the behavior writer's checkpoint().
+    :param random_state: Optional random.getstate() to continue the random module stream from.
+    :param movie_data_digest: Optional digest of the movie data file the run used.
+    :param watch_histories: Optional dictionary of shard index to WatchHistory, the per-user state of the run.
+    :param shard_random_states: Optional dictionary of shard index to the random state of a sharded python engine run.
+    """
+    watch_history_file = None
+    if watch_histories is not None:
+        watch_history_file = f"watch_history-{next_day}.npz"
+        save_watch_histories(os.path.join(output_dir, watch_history_file), watch_histories)
+
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "parameters": {name: parameters[name] for name in RUN_PARAMETERS},
+        "next_day": next_day,
+        "num_days": num_days,
+        "writer_position": writer_position,
+        "random_state": encode_random_state(random_state) if random_state is not None else None,
+        "movie_data_digest": movie_data_digest,
+        "watch_history_file": watch_history_file,
+        "shard_random_states": {str(shard): encode_random_state(state) for shard, state in (shard_random_states or {}).items()},
+    }
+    path = checkpoint_path(output_dir)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+    for stale_file in glob.glob(os.path.join(output_dir, "watch_history-*.npz")):
+        if os.path.basename(stale_file) != watch_history_file:
+            os.remove(stale_file)
+
+
+def load_checkpoint(output_dir):
+    """
+    Load the checkpoint saved in output_dir, with its random states decoded and its watch histories loaded.
+    """
+    path = checkpoint_path(output_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No checkpoint found in '{output_dir}'.")
+    with open(path, "r", encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')} in '{path}'.")
+    if checkpoint["random_state"] is not None:
+        checkpoint["random_state"] = decode_random_state(checkpoint["random_state"])
+    checkpoint["shard_random_states"] = {int(shard): decode_random_state(state) for shard, state in checkpoint["shard_random_states"].items()}
+    checkpoint["watch_histories"] = None
+    if checkpoint["watch_history_file"] is not None:
+        checkpoint["watch_histories"] = load_watch_histories(os.path.join(output_dir, checkpoint["watch_history_file"]))
+    return checkpoint
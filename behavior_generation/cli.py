@@ -0,0 +1,562 @@
+import argparse
+import sys
+
+from behavior_generation.options import (
+    BEHAVIOR_ENGINES,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHECKPOINT_DAYS,
+    DEFAULT_CONSTRAINT_RULES_FILE,
+    DEFAULT_HOST,
+    DEFAULT_MOVIE_DATA_FILE,
+    DEFAULT_PORT,
+    DEFAULT_ROW_GROUP_SIZE,
+    DEFAULT_SERVER_WORKERS,
+    DEFAULT_SHARD_SIZE,
+    DEFAULT_USER_PROBABILITIES_FILE,
+    OUTPUT_FORMATS,
+    PARTITION_COLUMNS,
+    PREFERENCE_ENGINES,
+    PREFERENCE_FORMATS,
+    SAMPLING_MODES,
+    STDOUT_PATH,
+    USER_ENGINES,
+    USER_FILE_FORMATS,
+    USER_STREAM_FORMATS,
+)
+
+# Generation modules import pandas, NumPy and Faker, which take most of the startup time.
+# They are imported by the command that needs them, so --help and argument errors return at once.
+
+# Run parameters that do not change behavior data: the number of workers, the preference file
+# format, and files whose contents are hashed into the keys of the stages behaviors read.
+BEHAVIOR_CACHE_EXCLUDED_PARAMETERS = ["workers", "preference_format", "movie_data_file", "constraint_rules_file"]
+
+
+def get_timestamp():
+    # Imported here, like the generation modules, to keep startup short.
+    from datetime import datetime
+
+    return datetime.now().strftime("%d_%m_%Y_%H_%M")
+
+
+def load_user_probabilities(user_probabilities_file):
+    import json
+
+    try:
+        with open(user_probabilities_file, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        print(f"Error: The file '{user_probabilities_file}' was not found.")
+    except json.JSONDecodeError:
+        print(f"Error: The file '{user_probabilities_file}' contains invalid JSON.")
+
+
+def report(message, output_file):
+    """
+    Print a summary line, on standard error when the data itself is written to standard output.
+    """
+    print(message, file=sys.stderr if output_file == STDOUT_PATH else sys.stdout)
+
+
+def preference_file_name(directory, preference_format):
+    """
+    Path of a preference file in directory, without extension for a store directory.
+    """
+    return f"{directory}/preferences" if preference_format == "store" else f"{directory}/preferences.{preference_format}"
+
+
+def check_batch_size(args, parser):
+    if args.batch_size < 1:
+        parser.error("--batch_size must be at least 1.")
+
+
+def seed_value(text):
+    """
+    Argument type of --seed. NumPy seeds must be non-negative, whatever the engine or number of workers.
+    """
+    try:
+        seed = int(text)
+    except ValueError:
+        seed = -1
+    if seed < 0:
+        raise argparse.ArgumentTypeError(f"must be a non-negative integer, got '{text}'")
+    return seed
+
+
+def add_users_arguments(parser):
+    parser.add_argument("--num_users", type=int, default=100, help="Number of users to generate.")
+    parser.add_argument("--user_output_file", type=str, default=None, help=f"Output file for user data, '{STDOUT_PATH}' for standard output. Defaults to outputs/users/user_data.<output_format>.")
+    parser.add_argument("--output_format", type=str, default="csv", choices=USER_STREAM_FORMATS, help="Write users as pipe-separated CSV or as JSON Lines, one object per user.")
+    parser.add_argument("--user_probabilities_file", type=str, default=DEFAULT_USER_PROBABILITIES_FILE, help="Path to user probabilities file.")
+    parser.add_argument("--engine", type=str, default="python", choices=USER_ENGINES, help="User generation engine, vectorized samples users in batches.")
+    parser.add_argument("--seed", type=seed_value, default=None, help="Random seed, makes the generated users reproducible.")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Users generated and written at a time. Users of the vectorized engine depend on it as well as on --seed.")
+
+
+def run_users(args, parser):
+    """
+    Generate synthetic user data and write it batch by batch as CSV or JSON Lines.
+    """
+    check_batch_size(args, parser)
+    from behavior_generation.generators.user_generator import iter_users, seed_python_engine
+    from behavior_generation.utils import open_output
+    from behavior_generation.writers import write_user_batches
+
+    user_probabilities = load_user_probabilities(args.user_probabilities_file)
+    user_output_file = args.user_output_file or f"outputs/users/user_data.{args.output_format}"
+    if args.seed is not None:
+        seed_python_engine(args.seed)
+
+    # Generate user data one batch at a time
+    user_batches = iter_users(args.num_users, user_probabilities, engine=args.engine, seed=args.seed, batch_size=args.batch_size)
+
+    # Save each batch once generated, with CSV list fields joined into strings
+    with open_output(user_output_file) as file:
+        num_users = write_user_batches(user_batches, file, args.output_format)
+    report(f"Generated {num_users} users and saved to '{user_output_file}'.", user_output_file)
+
+
+def add_preferences_arguments(parser):
+    parser.add_argument("--num_users", type=int, default=100, help="Number of users to generate preferences for.")
+    parser.add_argument("--preference_output_file", type=str, default=None, help=f"Output file for preferences, '{STDOUT_PATH}' for standard output, or output directory with --preference_format store. Defaults to outputs/users/preferences.<preference_format>.")
+    parser.add_argument("--preference_format", type=str, default="json", choices=PREFERENCE_FORMATS, help="Save preferences as indented JSON, as JSON Lines with one object per user, or as a memory-mappable store directory, which is built in memory.")
+    parser.add_argument("--engine", type=str, default="python", choices=PREFERENCE_ENGINES, help="Preference generation engine, vectorized generates users in batches.")
+    parser.add_argument("--seed", type=seed_value, default=None, help="Random seed, makes the generated preferences reproducible.")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Users generated and written at a time. Preferences of the vectorized engine depend on it as well as on --seed.")
+
+
+def run_preferences(args, parser):
+    """
+    Generate synthetic user preferences and write them batch by batch as JSON or JSON Lines, or save them as a preference store directory.
+    """
+    check_batch_size(args, parser)
+    if args.preference_output_file == STDOUT_PATH and args.preference_format == "store":
+        parser.error(f"--preference_format store cannot be written to '{STDOUT_PATH}'.")
+    import random
+    from itertools import chain
+    from behavior_generation.generators.preference_generator import iter_user_preferences
+    from behavior_generation.preference_store import save_preference_batches
+    from behavior_generation.user_table import format_user_ids
+
+    preference_output_file = args.preference_output_file or preference_file_name("outputs/users", args.preference_format)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Generate user IDs lazily, one batch at a time
+    user_ids = chain.from_iterable(
+        format_user_ids(range(start, min(start + args.batch_size, args.num_users + 1)))
+        for start in range(1, args.num_users + 1, args.batch_size)
+    )
+
+    # Generate preferences one batch at a time, saving each batch once generated
+    preference_batches = iter_user_preferences(user_ids, engine=args.engine, seed=args.seed, batch_size=args.batch_size)
+    num_users = save_preference_batches(preference_batches, preference_output_file, args.preference_format)
+
+    report(f"Generated preferences for {num_users} users and saved to '{preference_output_file}'.", preference_output_file)
+
+
+def add_simulation_arguments(parser):
+    """
+    Arguments shared by the behaviors and pipeline commands.
+    """
+    parser.add_argument("--num_days", type=int, default=30, help="Number of days to simulate.")
+    parser.add_argument("--start_date", type=str, default="2025-01-01", help="Start date of simulation.")
+    parser.add_argument("--movie_data_file", type=str, default=DEFAULT_MOVIE_DATA_FILE, help="Path to movie data file.")
+    parser.add_argument("--constraint_rules_file", type=str, default=DEFAULT_CONSTRAINT_RULES_FILE, help="Path to the hard constraint rules file.")
+    parser.add_argument("--no_catalog_cache", action="store_true", help="Parse the movie data file instead of using its binary cache.")
+    parser.add_argument("--engine", type=str, default="python", choices=BEHAVIOR_ENGINES, help="Generation engine for users, preferences and behaviors. Only vectorized behaviors can be regenerated for a subset of users or a range of days on their own.")
+    parser.add_argument("--sampling", type=str, default="daily", choices=SAMPLING_MODES, help="count_then_place draws each user's number of watch days instead of one decision per day, for long horizons. Requires --engine vectorized.")
+    parser.add_argument("--seed", type=seed_value, default=None, help="Random seed for reproducible behavior data.")
+    parser.add_argument("--users_per_chunk", type=int, default=None, help="Users per written chunk, defaults to one chunk per simulated day.")
+    parser.add_argument("--output_format", type=str, default="csv", choices=OUTPUT_FORMATS, help="Format of the user and behavior data files.")
+    parser.add_argument("--partition_by", type=str, default=None, choices=PARTITION_COLUMNS, help="Partition parquet behavior data into one directory per value of this column.")
+    parser.add_argument("--row_group_size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help="Rows per parquet row group.")
+
+
+def check_simulation_arguments(args, parser):
+    if args.partition_by is not None and args.output_format != "parquet":
+        parser.error("--partition_by requires --output_format parquet.")
+    if args.sampling != "daily" and args.engine != "vectorized":
+        parser.error("--sampling count_then_place requires --engine vectorized.")
+
+
+def add_behaviors_arguments(parser):
+    parser.add_argument("--user_file", type=str, required=True, help="User data file saved by the users or pipeline command.")
+    parser.add_argument("--user_format", type=str, default="csv", choices=USER_FILE_FORMATS, help="Format of the user data file.")
+    parser.add_argument("--preference_file", type=str, required=True, help="Preferences saved by the preferences or pipeline command, a JSON or JSON Lines (.jsonl) file or a store directory.")
+    parser.add_argument("--behavior_output_file", type=str, default="outputs/behaviors/behavior_data.csv", help="Output file, or directory with --partition_by, for behavior data.")
+    add_simulation_arguments(parser)
+
+
+def run_behaviors(args, parser):
+    """
+    Generate behavior data for users and preferences saved by an earlier run.
+    """
+    check_simulation_arguments(args, parser)
+    from behavior_generation.generators.behavior_generator import iter_behavior_data
+    from behavior_generation.generators.hard_constraints import load_constraint_rules
+    from behavior_generation.movie_catalog import load_movie_catalog
+    from behavior_generation.preference_store import load_preferences
+    from behavior_generation.writers import open_behavior_writer, read_users
+
+    user_df = read_users(args.user_file, args.user_format)
+    user_preferences = load_preferences(args.preference_file)
+    movie_catalog = load_movie_catalog(args.movie_data_file, use_cache=not args.no_catalog_cache)
+
+    behavior_chunks = iter_behavior_data(
+        user_df,
+        movie_catalog,
+        user_preferences,
+        num_days=args.num_days,
+        start_date=args.start_date,
+        engine=args.engine,
+        seed=args.seed,
+        users_per_chunk=args.users_per_chunk,
+        sampling=args.sampling,
+        constraint_rules=load_constraint_rules(args.constraint_rules_file),
+    )
+    total_events = 0
+    with open_behavior_writer(args.behavior_output_file, args.output_format, partition_by=args.partition_by, row_group_size=args.row_group_size) as writer:
+        for chunk in behavior_chunks:
+            writer.write(chunk)
+            total_events += len(chunk)
+    print(f"Generated {total_events} events for {len(user_df)} users and saved to '{args.behavior_output_file}'.")
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--num_users", type=int, default=100, help="Number of users to generate.")
+    parser.add_argument("--user_probabilities_file", type=str, default=DEFAULT_USER_PROBABILITIES_FILE, help="Path to user probabilities file.")
+    add_simulation_arguments(parser)
+    parser.add_argument("--workers", type=int, default=None, help="Generate user shards in this many processes. Results only depend on --seed.")
+    parser.add_argument("--shard_size", type=int, default=DEFAULT_SHARD_SIZE, help="Users per shard when --workers is set.")
+    parser.add_argument("--preference_format", type=str, default="json", choices=PREFERENCE_FORMATS, help="Save preferences as indented JSON, as JSON Lines, or as a memory-mappable store directory.")
+    parser.add_argument("--instrument", action="store_true", help="Record stage timings and counters in outputs/<timestamp>/run_report.json.")
+    parser.add_argument("--trace_memory", action="store_true", help="With --instrument, also trace the peak memory of each stage, slowing the run down.")
+    parser.add_argument("--checkpoint_days", type=int, default=DEFAULT_CHECKPOINT_DAYS, help="Save a checkpoint in the output directory every this many simulated days.")
+    parser.add_argument("--resume", type=str, default=None, help="Output directory of an earlier run to continue from its checkpoint, with the arguments of that run.")
+    parser.add_argument("--extra_days", type=int, default=0, help="With --resume, number of days to simulate beyond the days of the earlier run.")
+    parser.add_argument("--stage_cache", type=str, default=None, help="Directory caching users, preferences, constraint pools and behaviors by the hash of their inputs, so reruns only recompute the stages whose inputs changed. Requires --seed to reuse stages.")
+
+
+def run_pipeline(args, parser):
+    """
+    Generate users, preferences and behaviors into a timestamped output directory, with checkpoints.
+    """
+    check_simulation_arguments(args, parser)
+    if args.extra_days and args.resume is None:
+        parser.error("--extra_days requires --resume.")
+
+    import json
+    import os
+    import random
+    from behavior_generation import instrumentation
+    from behavior_generation.instrumentation import RunInstrumentation
+    from behavior_generation.generators.behavior_generator import iter_behavior_data
+    from behavior_generation.generators.hard_constraints import get_filtered_movies, load_constraint_rules
+    from behavior_generation.generators.user_generator import generate_users, seed_python_engine
+    from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+    from behavior_generation.writers import open_behavior_writer, read_users, write_users
+    from behavior_generation.checkpoint import CHECKPOINT_FILE, RUN_PARAMETERS, checkpoint_path, load_checkpoint, save_checkpoint
+    from behavior_generation.movie_catalog import file_digest, load_movie_catalog
+    from behavior_generation.preference_store import save_preferences, load_preferences
+    from behavior_generation.stage_cache import StageCache, stage_key
+    from behavior_generation.user_table import format_user_ids
+    from behavior_generation.watch_history import WatchHistory
+    from behavior_generation.parallel import (
+        generate_users_parallel,
+        generate_preferences_parallel,
+        iter_behavior_data_parallel,
+    )
+
+    checkpoint = None
+    if args.resume is not None:
+        checkpoint = load_checkpoint(args.resume)
+        workers = args.workers
+        for name, value in checkpoint["parameters"].items():
+            setattr(args, name, value)
+        if workers is not None and args.workers is not None:
+            # Results do not depend on the number of workers, only on sharding.
+            args.workers = workers
+        output_dir = args.resume
+        first_day = checkpoint["next_day"]
+        args.num_days = checkpoint["num_days"] + args.extra_days
+    else:
+        timestamp = get_timestamp()
+        output_dir = f"outputs/{timestamp}"
+        first_day = 0
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(f"{output_dir}/users", exist_ok=True)
+        os.makedirs(f"{output_dir}/behaviors", exist_ok=True)
+
+    extension = "" if args.partition_by is not None else f".{args.output_format}"
+    user_output_file = f"{output_dir}/users/user_data.{args.output_format}"
+    preference_output_file = preference_file_name(f"{output_dir}/users", args.preference_format)
+    behavior_output_file = f"{output_dir}/behaviors/behavior_data{extension}"
+    # A Parquet file cannot be appended to, so only CSV and partitioned Parquet output are checkpointed.
+    resumable = args.output_format == "csv" or args.partition_by is not None
+
+    num_users = args.num_users
+    num_days = args.num_days
+    start_date= args.start_date
+    movie_data_file = args.movie_data_file
+    user_probabilities_file = args.user_probabilities_file
+
+    movie_data_digest = file_digest(movie_data_file)
+    if checkpoint is not None and movie_data_digest != checkpoint["movie_data_digest"]:
+        parser.error(f"'{movie_data_file}' changed since the run in '{output_dir}' started.")
+
+    run_instrumentation = RunInstrumentation(trace_memory=args.trace_memory).start() if args.instrument else None
+
+    sharded = args.workers is not None
+    if args.seed is None:
+        # Checkpoints continue from the seed, so every run has one.
+        args.seed = random.randrange(2**32)
+        print(f"Using seed {args.seed}.")
+    seed = args.seed
+
+    # Stages are looked up in the stage cache by the hash of their inputs.
+    stage_cache = StageCache(args.stage_cache) if args.stage_cache is not None and checkpoint is None else None
+
+    def run_stage(stage, key, compute, inputs):
+        if stage_cache is None or key is None:
+            return compute()
+        value, hit = stage_cache.cached(stage, key, compute, inputs)
+        if hit:
+            print(f"Reusing cached {stage} {key[:12]}.")
+        return value
+
+    if checkpoint is not None:
+        print(f"Resuming '{output_dir}' from day {first_day + 1}/{num_days}.")
+        with instrumentation.stage("users"):
+            user_df = read_users(user_output_file, args.output_format)
+        with instrumentation.stage("preferences"):
+            user_preferences = load_preferences(preference_output_file)
+        users_key = preferences_key = None
+    else:
+        user_probabilities = load_user_probabilities(user_probabilities_file)
+
+        print(f"Generating {num_users} users...")
+        shard_size = args.shard_size if sharded else None
+        users_inputs = {"num_users": num_users, "user_probabilities": user_probabilities, "engine": args.engine, "seed": seed, "shard_size": shard_size}
+        users_key = stage_key("users", users_inputs)
+        with instrumentation.stage("users"):
+            if sharded:
+                user_df = run_stage("users", users_key, lambda: generate_users_parallel(num_users, user_probabilities, seed, workers=args.workers, shard_size=args.shard_size, engine=args.engine), users_inputs)
+            else:
+                def compute_users():
+                    # The python engine draws from the random module and Faker, seeded like the users command does.
+                    seed_python_engine(seed)
+                    return generate_users(num_users, user_probabilities, engine=args.engine, seed=seed)
+
+                user_df = run_stage("users", users_key, compute_users, users_inputs)
+        with instrumentation.stage("write"):
+            write_users(user_df, user_output_file, args.output_format)
+        print(f"User data saved to '{user_output_file}'.")
+
+        preferences_inputs = {"engine": args.engine, "seed": seed, "shard_size": shard_size}
+        preferences_key = stage_key("preferences", preferences_inputs, [users_key])
+        with instrumentation.stage("preferences"):
+            if sharded:
+                user_preferences = run_stage("preferences", preferences_key, lambda: generate_preferences_parallel(format_user_ids(user_df["userID"]), seed, workers=args.workers, shard_size=args.shard_size, engine=args.engine), preferences_inputs)
+            else:
+                def compute_preferences():
+                    random.seed(seed)
+                    return generate_multiple_user_preferences(format_user_ids(user_df["userID"]), engine=args.engine, seed=seed)
+
+                user_preferences = run_stage("preferences", preferences_key, compute_preferences, preferences_inputs)
+        with instrumentation.stage("write"):
+            save_preferences(user_preferences, preference_output_file, args.preference_format)
+        if args.preference_format == "store":
+            # Behaviors read the memory-mapped store, so the preference dictionary can be released.
+            user_preferences = load_preferences(preference_output_file)
+        print(f"Preference data saved to '{preference_output_file}'.")
+
+    print("Loading movie data...")
+    with instrumentation.stage("catalog_load"):
+        movie_catalog = load_movie_catalog(movie_data_file, use_cache=not args.no_catalog_cache)
+        constraint_rules = load_constraint_rules(args.constraint_rules_file)
+    with instrumentation.stage("constraint_pools"):
+        # The compiled pools replace the rules, engines accept either.
+        pools_inputs = {"movie_data_digest": movie_data_digest, "constraint_rules": constraint_rules}
+        pools_key = stage_key("constraint_pools", pools_inputs)
+        constraint_rules = run_stage("constraint_pools", pools_key, lambda: get_filtered_movies(movie_catalog, constraint_rules), pools_inputs)
+
+    behaviors_inputs = {name: getattr(args, name) for name in RUN_PARAMETERS if name not in BEHAVIOR_CACHE_EXCLUDED_PARAMETERS}
+    behaviors_inputs.update(num_days=num_days, sharded=sharded)
+    behaviors_key = stage_key("behaviors", behaviors_inputs, [users_key, preferences_key, pools_key]) if stage_cache is not None else None
+    behavior_files = {os.path.basename(behavior_output_file): behavior_output_file}
+
+    if behaviors_key is not None and stage_cache.contains("behaviors", behaviors_key):
+        instrumentation.count("stage_cache_hits")
+        print(f"Reusing cached behaviors {behaviors_key[:12]}.")
+        with instrumentation.stage("write"):
+            stage_cache.restore_files("behaviors", behaviors_key, behavior_files)
+            cached_directory = stage_cache.entry_directory("behaviors", behaviors_key)
+            if resumable:
+                # The checkpoint is saved again with the arguments of this run, so it can be resumed like a generated one.
+                cached_checkpoint = load_checkpoint(cached_directory)
+                save_checkpoint(
+                    output_dir,
+                    vars(args),
+                    cached_checkpoint["next_day"],
+                    cached_checkpoint["num_days"],
+                    cached_checkpoint["writer_position"],
+                    cached_checkpoint["random_state"],
+                    movie_data_digest,
+                    cached_checkpoint["watch_histories"],
+                    cached_checkpoint["shard_random_states"],
+                )
+    else:
+        # The python engine draws from the random module, whose state is checkpointed. The other
+        # engines and sharded runs derive their draws from the seed and the day numbers.
+        if checkpoint is not None:
+            random.setstate(checkpoint["random_state"])
+        else:
+            random.seed(seed)
+        behavior_seed = seed if sharded or args.engine != "python" else None
+        # Watch histories per user shard, a single shard holding every user without --workers.
+        watch_histories = checkpoint["watch_histories"] if checkpoint is not None else {}
+        if not sharded:
+            watch_histories.setdefault(0, WatchHistory())
+        # Random states of the shards of a sharded python engine run, whose blocks can span segments.
+        shard_random_states = checkpoint["shard_random_states"] if checkpoint is not None else {}
+
+        print(f"Generating behaviors for {num_days - first_day} days")
+        total_events = 0
+        position = checkpoint["writer_position"] if checkpoint is not None else None
+        with open_behavior_writer(behavior_output_file, args.output_format, partition_by=args.partition_by, row_group_size=args.row_group_size, position=position) as writer:
+            if not resumable:
+                print("Unpartitioned parquet output cannot be appended to, no checkpoints are saved.")
+            elif checkpoint is None:
+                save_checkpoint(output_dir, vars(args), first_day, num_days, writer.checkpoint(), random.getstate(), movie_data_digest, watch_histories, shard_random_states)
+
+            # Days are generated in segments aligned to multiples of checkpoint_days, a checkpoint
+            # being saved after each, so an extended run splits days like a longer run would.
+            segment_starts = sorted({first_day, *range(first_day - first_day % args.checkpoint_days + args.checkpoint_days, num_days, args.checkpoint_days)})
+            for segment_start, segment_end in zip(segment_starts, segment_starts[1:] + [num_days]):
+                if segment_start >= segment_end:
+                    continue
+                if sharded:
+                    behavior_chunks = iter_behavior_data_parallel(
+                        user_df,
+                        movie_catalog,
+                        user_preferences,
+                        seed,
+                        num_days=segment_end - segment_start,
+                        start_date=start_date,
+                        engine=args.engine,
+                        workers=args.workers,
+                        shard_size=args.shard_size,
+                        sampling=args.sampling,
+                        first_day=segment_start,
+                        watch_histories=watch_histories,
+                        random_states=shard_random_states,
+                        constraint_rules=constraint_rules
+                    )
+                else:
+                    behavior_chunks = iter_behavior_data(
+                        user_df,
+                        movie_catalog,
+                        user_preferences,
+                        num_days=segment_end - segment_start,
+                        start_date=start_date,
+                        engine=args.engine,
+                        seed=behavior_seed,
+                        users_per_chunk=args.users_per_chunk,
+                        sampling=args.sampling,
+                        first_day=segment_start,
+                        watch_history=watch_histories[0],
+                        constraint_rules=constraint_rules
+                    )
+
+                # Chunks are written as they arrive, so memory stays bounded by the chunk size.
+                for chunk in instrumentation.iterate("behaviors", behavior_chunks):
+                    with instrumentation.stage("write"):
+                        writer.write(chunk)
+                    total_events += len(chunk)
+                    print(f"Day {chunk['day_number'].iloc[0] + 1}/{num_days}: wrote {len(chunk)} events ({total_events} total).")
+
+                if resumable:
+                    with instrumentation.stage("write"):
+                        save_checkpoint(output_dir, vars(args), segment_end, num_days, writer.checkpoint(), random.getstate(), movie_data_digest, watch_histories, shard_random_states)
+
+        if behaviors_key is not None:
+            instrumentation.count("stage_cache_misses")
+            if resumable:
+                # The last checkpoint, saved after day num_days, and its watch histories.
+                watch_history_file = f"watch_history-{num_days}.npz"
+                behavior_files[CHECKPOINT_FILE] = checkpoint_path(output_dir)
+                behavior_files[watch_history_file] = os.path.join(output_dir, watch_history_file)
+            with instrumentation.stage("write"):
+                stage_cache.store_files("behaviors", behaviors_key, behavior_files, behaviors_inputs)
+    print(f"Behavior data saved to '{behavior_output_file}'.")
+
+    if run_instrumentation is not None:
+        run_instrumentation.stop()
+        report_file = f"{output_dir}/run_report.json"
+        run_instrumentation.write_report(report_file, parameters=vars(args))
+        print(f"Run report saved to '{report_file}'.")
+
+
+def add_serve_arguments(parser):
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SERVER_WORKERS, help="Requests served concurrently.")
+    parser.add_argument("--movie_data_file", type=str, default=DEFAULT_MOVIE_DATA_FILE, help="Path to movie data file.")
+    parser.add_argument("--no_catalog_cache", action="store_true", help="Parse the movie data file instead of using its binary cache.")
+    parser.add_argument("--user_probabilities_file", type=str, default=DEFAULT_USER_PROBABILITIES_FILE, help="Path to user probabilities file.")
+    parser.add_argument("--constraint_rules_file", type=str, default=DEFAULT_CONSTRAINT_RULES_FILE, help="Path to the hard constraint rules file.")
+
+
+def run_serve(args, parser):
+    """
+    Serve generation requests over local HTTP, with the movie catalog and configuration loaded once.
+    """
+    from behavior_generation.server import GenerationServer, GenerationService
+
+    print("Loading movie data and configuration...")
+    service = GenerationService(args.movie_data_file, args.user_probabilities_file, args.constraint_rules_file, use_catalog_cache=not args.no_catalog_cache)
+
+    server = GenerationServer((args.host, args.port), service, workers=args.workers)
+    print(f"Serving generation requests on http://{args.host}:{server.server_port} with {args.workers} workers.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Subcommands, with the functions adding their arguments and running them.
+COMMANDS = {
+    "users": (add_users_arguments, run_users, "Generate synthetic user data."),
+    "preferences": (add_preferences_arguments, run_preferences, "Generate synthetic user preferences."),
+    "behaviors": (add_behaviors_arguments, run_behaviors, "Generate behavior data for saved users and preferences."),
+    "pipeline": (add_pipeline_arguments, run_pipeline, "Generate users, preferences and behaviors, with checkpoints."),
+    "serve": (add_serve_arguments, run_serve, "Serve generation requests over local HTTP."),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="behavior-gen", description="Generate synthetic user and behavior data.")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+    for name, (add_arguments, _, description) in COMMANDS.items():
+        add_arguments(subparsers.add_parser(name, help=description, description=description))
+    return parser, subparsers
+
+
+def main(argv=None):
+    """
+    Entry point of the behavior-gen command.
+
+    :param argv: Optional arguments, defaults to sys.argv[1:].
+    """
+    parser, subparsers = build_parser()
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    # Removed from the arguments, which runs store in checkpoints and reports.
+    command = args.__dict__.pop("command")
+    COMMANDS[command][1](args, subparsers.choices[command])
+
+
+if __name__ == "__main__":
+    main()
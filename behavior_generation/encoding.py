@@ -0,0 +1,79 @@
+import numpy as np
+
+from behavior_generation.data.country_data import LANGUAGES_BY_COUNTRY, LANGUAGE_PROBS_BY_ORIGIN
+from behavior_generation.data.user_probabilities import (
+    GENRE_LIKE_PROBS,
+    GENRE_DISLIKE_PROBS,
+    LANGUAGE_PROBS,
+)
+
+
+def build_vocabulary(*groups):
+    """
+    Merge iterables of names into one ordered list without duplicates.
+    """
+    vocabulary = []
+    for group in groups:
+        for name in group:
+            if name not in vocabulary:
+                vocabulary.append(name)
+    return vocabulary
+
+
+# Every genre and language a user can be generated with gets one bit.
+# Catalog values outside these vocabularies can never match a user, so they are left without a bit.
+GENRES = build_vocabulary(GENRE_LIKE_PROBS, GENRE_DISLIKE_PROBS)
+LANGUAGES = build_vocabulary(
+    LANGUAGE_PROBS,
+    *LANGUAGES_BY_COUNTRY.values(),
+    *LANGUAGE_PROBS_BY_ORIGIN.values(),
+)
+
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GENRES)}
+LANGUAGE_BITS = {language: 1 << bit for bit, language in enumerate(LANGUAGES)}
+
+GENRE_MASK_DTYPE = np.uint32
+LANGUAGE_MASK_DTYPE = np.uint64
+
+
+def encode_set(items, bits):
+    """
+    Encode a list of names as an integer bitmask.
+
+    :param items: List of names (e.g. a user's liked genres).
+    :param bits: Mapping of name to bit, GENRE_BITS or LANGUAGE_BITS.
+    :return: The bitmask as a Python int.
+    """
+    mask = 0
+    for item in items:
+        if item not in bits:
+            raise ValueError(f"'{item}' has no bit in the encoding vocabulary.")
+        mask |= bits[item]
+    return mask
+
+
+def decode_set(mask, vocabulary):
+    """
+    Decode an integer bitmask back into the list of names it contains.
+    """
+    mask = int(mask)
+    return [name for bit, name in enumerate(vocabulary) if mask >> bit & 1]
+
+
+def encode_genres(genres):
+    return encode_set(genres, GENRE_BITS)
+
+
+def encode_languages(languages):
+    return encode_set(languages, LANGUAGE_BITS)
+
+
+def popcount(values):
+    """
+    Number of set bits of every element of an unsigned integer array.
+    """
+    values = np.asarray(values).astype(np.uint64)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((values * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
@@ -2,11 +2,20 @@ import random
 import pandas as pd
 from datetime import datetime, timedelta
 
-from behavior_generation.utils import pick_from_probabilities
+from behavior_generation import instrumentation
+from behavior_generation.options import BEHAVIOR_ENGINES, SAMPLING_MODES
+from behavior_generation.preference_store import PreferenceStore
+from behavior_generation.utils import Sampler
 
-from behavior_generation.generators.satisfaction_calculator import calculate_satisfaction_score
+from behavior_generation.user_table import compact_users, format_user_ids, user_bitmasks
+from behavior_generation.watch_history import WatchHistory
 
-from behavior_generation.generators.hard_constraints import get_filtered_movies, pick_movie
+from behavior_generation.generators.satisfaction_calculator import calculate_satisfaction_score_from_masks
+
+from behavior_generation.generators.hard_constraints import as_movie_catalog, get_filtered_movies, pick_movie
+
+# Preference distributions drawn from for the context of every watch event.
+CONTEXT_DISTRIBUTIONS = ["LOCATION_PROBS", "COMPANION_PROBS", "TIME_OF_DAY_PROBS"]
 
 SEASON_BY_MONTH = {
     1: "Winter", 2: "Winter", 3: "Spring",
@@ -15,14 +24,16 @@ SEASON_BY_MONTH = {
     10: "Autumn", 11: "Autumn", 12: "Winter"
 }
 
-def create_day_mapping(start_date, num_days):
+def create_day_mapping(start_date, num_days, first_day=0):
     """
     Create a mapping of day_number to season and day_of_week using the start_date.
+
+    :param first_day: Day number of the first mapped day, start_date being day 0.
     """
     day_mapping = {}
-    current_date = datetime.strptime(start_date, "%Y-%m-%d")
+    current_date = datetime.strptime(start_date, "%Y-%m-%d") + timedelta(days=first_day)
 
-    for day_number in range(num_days):
+    for day_number in range(first_day, first_day + num_days):
         month = current_date.month
         day_of_week = current_date.strftime("%A")
         season = SEASON_BY_MONTH[month]
@@ -37,61 +48,149 @@ def create_day_mapping(start_date, num_days):
     return day_mapping
 
 
-def generate_behavior_data(users, movies, user_preferences, num_days=30, start_date="2025-01-01"):
+
+
+def generate_behavior_data(users, movies, user_preferences, num_days=30, start_date="2025-01-01", engine="python", seed=None, first_day=0, sampling="daily", watch_history=None, constraint_rules=None):
     """
     Generate synthetic behavior data considering seasonality and day_of_week on a per-user basis.
     Each user decides whether to watch a movie each day based on their probabilities,
     with retries based on their watch tendency.
+
+    :param movies: MovieCatalog, or Pandas DataFrame containing movie data.
+    :param user_preferences: Preference dictionary keyed by user ID, or a PreferenceStore.
+    :param engine: "python" for the reference per-user loop, "vectorized" for the NumPy engine.
+    :param seed: Optional seed, makes the run reproducible.
+        The vectorized engine keys its draws by (seed, userID, day_number), so any subset of
+        users, or any range of days given the watch history of its earlier days, regenerates
+        exactly the rows of the full run for the same seed. The python engine draws every user
+        and day from one random module stream, so only a whole run starting at day 0 does.
+        rebuild_watch_history gives the history of earlier days from their behavior rows.
+    :param first_day: Day number of the first simulated day, start_date being day 0.
+    :param sampling: "daily" draws every user's watch decision on every day. "count_then_place",
+        only with the vectorized engine, draws each user's number of watch days per
+        (season, day_of_week) and places them on dates, for long horizons.
+    :param watch_history: Optional WatchHistory of the days before first_day, keyed by row in users.
+        Scores use how many times the user watched the movie before, and the history is
+        updated with the generated events, so it can be passed on to a later call.
+    :param constraint_rules: Optional hard constraint rules as returned by load_constraint_rules,
+        defaults to the rules of DEFAULT_CONSTRAINT_RULES_FILE.
     """
-    behavior_data = []
-    user_records = users.to_dict("records")
+    chunks = list(iter_behavior_data(users, movies, user_preferences, num_days=num_days, start_date=start_date, engine=engine, seed=seed, first_day=first_day, sampling=sampling, watch_history=watch_history, constraint_rules=constraint_rules))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
 
-    filtered_movies = get_filtered_movies(movies)
+
+def iter_behavior_data(users, movies, user_preferences, num_days=30, start_date="2025-01-01", engine="python", seed=None, users_per_chunk=None, first_day=0, sampling="daily", watch_history=None, constraint_rules=None):
+    """
+    Generate the same behavior data as generate_behavior_data, yielded as DataFrame chunks in date order.
+
+    Each chunk holds the events of one simulated day, or of one shard of users_per_chunk users
+    within a day, so memory depends on the chunk size rather than the total event count.
+    Days without any event yield no chunk.
+
+    :param users_per_chunk: Optional number of users per chunk, defaults to all users.
+    :param first_day: Day number of the first simulated day, start_date being day 0.
+    """
+    if engine not in BEHAVIOR_ENGINES:
+        raise ValueError(f"Unknown behavior engine '{engine}'. Expected one of {BEHAVIOR_ENGINES}.")
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode '{sampling}'. Expected one of {SAMPLING_MODES}.")
+    if sampling == "count_then_place" and engine != "vectorized":
+        raise ValueError("The count_then_place sampling mode requires the vectorized engine.")
+
+    if seed is not None:
+        random.seed(seed)
+
+    if sampling == "count_then_place":
+        from behavior_generation.generators.counted_behavior_generator import iter_behavior_data_counted
+        yield from iter_behavior_data_counted(users, movies, user_preferences, num_days=num_days, start_date=start_date, seed=seed, users_per_chunk=users_per_chunk, first_day=first_day, watch_history=watch_history, constraint_rules=constraint_rules)
+        return
+
+    if engine == "vectorized":
+        from behavior_generation.generators.vectorized_behavior_generator import iter_behavior_data_vectorized
+        yield from iter_behavior_data_vectorized(users, movies, user_preferences, num_days=num_days, start_date=start_date, seed=seed, users_per_chunk=users_per_chunk, first_day=first_day, watch_history=watch_history, constraint_rules=constraint_rules)
+        return
+
+    # Columns of the compact user table are read directly, rather than building one dictionary per user.
+    users = compact_users(users)
+    user_ids = format_user_ids(users["userID"]).tolist()
+    hard_constraints = users["hard_constraint"].to_numpy(dtype=object).tolist()
+    award_hunters = users["award_hunter"].tolist()
+    # Preferences are looked up once per user rather than every day, and a PreferenceStore builds
+    # them in bulk. Samplers are compiled the first time a user watches and kept for later days.
+    if isinstance(user_preferences, PreferenceStore):
+        preferences_by_user = user_preferences.to_list(user_ids)
+    else:
+        preferences_by_user = [user_preferences[user_id] for user_id in user_ids]
+    samplers_by_user = [None] * len(user_ids)
+    users_per_chunk = users_per_chunk or max(len(user_ids), 1)
+
+    catalog = as_movie_catalog(movies)
+    with instrumentation.stage("constraint_pools"):
+        filtered_movies = get_filtered_movies(catalog, constraint_rules)
+    bitmasks = user_bitmasks(users)
+    watch_history = watch_history if watch_history is not None else WatchHistory()
+    counters = instrumentation.active_counters()
 
     # Create day mapping
-    day_mapping = create_day_mapping(start_date, num_days)
+    day_mapping = create_day_mapping(start_date, num_days, first_day)
 
-    for day_number in range(num_days):
+    for day_number in range(first_day, first_day + num_days):
         season = day_mapping[day_number]["season"]
         day_of_week = day_mapping[day_number]["day_of_week"]
+        behavior_data = []
 
-        for user in user_records:
-            user_id = user["userID"]
-            user_watch_tendency = user_preferences[user_id]["WATCH_TENDENCY"]
-            user_season_probs = user_preferences[user_id]["SEASON_PROBS"]
-            user_day_of_week_probs = user_preferences[user_id]["DAY_OF_WEEK_PROBS"]
+        for user_index, user_id in enumerate(user_ids):
+            preferences = preferences_by_user[user_index]
+            user_watch_tendency = preferences["WATCH_TENDENCY"]
+            user_season_probs = preferences["SEASON_PROBS"]
+            user_day_of_week_probs = preferences["DAY_OF_WEEK_PROBS"]
 
             watch_probability = user_season_probs.get(season, 0) * user_day_of_week_probs.get(day_of_week, 0)
 
             watch_status = False
-            for _ in range(user_watch_tendency):
+            for trial in range(user_watch_tendency):
                 if random.random() < watch_probability:
                     watch_status = True
                     break
 
+            if counters is not None:
+                counters["watch_decisions"] += 1
+                counters["watch_trials"] += trial + 1 if watch_status else user_watch_tendency
+
             if watch_status:
-                location = pick_from_probabilities(user_preferences[user_id]["LOCATION_PROBS"])
-                companions = pick_from_probabilities(user_preferences[user_id]["COMPANION_PROBS"])
+                samplers = samplers_by_user[user_index]
+                if samplers is None:
+                    samplers = samplers_by_user[user_index] = {key: Sampler(preferences[key]) for key in CONTEXT_DISTRIBUTIONS}
+                location = samplers["LOCATION_PROBS"].sample()
+                companions = samplers["COMPANION_PROBS"].sample()
                 user_mood = random.choice(["Happy", "Neutral", "Sad"])
-                time_of_day = pick_from_probabilities(user_preferences[user_id]["TIME_OF_DAY_PROBS"])
+                time_of_day = samplers["TIME_OF_DAY_PROBS"].sample()
 
-                movie = pick_movie(filtered_movies, user, companions, time_of_day)
+                movie_index = pick_movie(filtered_movies, hard_constraints[user_index], bitmasks["language_spoken"][user_index], companions, time_of_day)
+                rewatches = watch_history.record(user_index, movie_index)
 
                 # Calculate satisfaction score
-                satisfaction_score = calculate_satisfaction_score(
-                    movie["genres"],
-                    user["liked_genres"],
-                    user["disliked_genres"],
-                    movie["language"],
-                    user["language_spoken"],
-                    movie["imdbRating"],
+                satisfaction_score = calculate_satisfaction_score_from_masks(
+                    catalog.genre_bitmask[movie_index],
+                    catalog.genre_count[movie_index],
+                    bitmasks["liked_genres"][user_index],
+                    bitmasks["disliked_genres"][user_index],
+                    catalog.language_bitmask[movie_index],
+                    bitmasks["language_spoken"][user_index],
+                    catalog.imdb_rating[movie_index],
                     user_mood,
-                    movie.get("numberOfRewatches", 0),
-                    user["award_hunter"],
-                    movie["havingAward"],
-                    user_preferences[user_id]["SATISFACTION_WEIGHTS"]
+                    rewatches,
+                    award_hunters[user_index],
+                    catalog.having_award[movie_index],
+                    preferences["SATISFACTION_WEIGHTS"]
                 )
 
+                if counters is not None:
+                    counters["scoring_calls"] += 1
+                    counters["events"] += 1
+
                 # Add the behavior record
                 behavior_data.append({
                     "day_number": day_number,
@@ -100,11 +199,55 @@ def generate_behavior_data(users, movies, user_preferences, num_days=30, start_d
                     "day_of_week": day_of_week,
                     "time_of_day": time_of_day,
                     "userId": user_id,
-                    "movieId": movie["movieId"],
+                    "movieId": str(catalog.movie_ids[movie_index]),
                     "location": location,
                     "companions": companions,
                     "user_mood": user_mood,
                     "satisfaction_score": satisfaction_score
                 })
 
-    return pd.DataFrame(behavior_data)
+            if behavior_data and (user_index + 1) % users_per_chunk == 0:
+                yield build_behavior_chunk(behavior_data)
+                behavior_data = []
+
+        if behavior_data:
+            yield build_behavior_chunk(behavior_data)
+
+
+def rebuild_watch_history(users, movies, behavior_chunks, first_day=None):
+    """
+    Count the watches of earlier behavior rows, to regenerate later days without simulating the earlier ones.
+
+    :param behavior_chunks: Behavior DataFrame, e.g. read from the output of a run, or an iterable of chunks.
+    :param first_day: Optional day number, only the rows of earlier days are counted.
+    :return: WatchHistory keyed by row in users, as the watch_history of generate_behavior_data.
+    """
+    users = compact_users(users)
+    catalog = as_movie_catalog(movies)
+    user_rows = pd.Index(format_user_ids(users["userID"]))
+    movie_indices = pd.Index(catalog.movie_ids.astype(str))
+    if isinstance(behavior_chunks, pd.DataFrame):
+        behavior_chunks = [behavior_chunks]
+
+    watch_history = WatchHistory()
+    for chunk in behavior_chunks:
+        if first_day is not None:
+            chunk = chunk[chunk["day_number"] < first_day]
+        rows = user_rows.get_indexer(chunk["userId"].astype(str))
+        movies_watched = movie_indices.get_indexer(chunk["movieId"].astype(str))
+        if (movies_watched < 0).any():
+            raise ValueError(f"Unknown movie '{chunk['movieId'].iloc[(movies_watched < 0).argmax()]}' in the behavior data.")
+        # Rows of other users do not change the history of these users.
+        known = rows >= 0
+        watch_history.record_many(rows[known], movies_watched[known])
+    return watch_history
+
+
+def build_behavior_chunk(behavior_data):
+    """
+    Build a chunk DataFrame from behavior records.
+
+    Clamped scores of exactly 0 or 1 are ints, so the score column is cast to float
+    to keep every chunk written the same way.
+    """
+    return pd.DataFrame(behavior_data).astype({"satisfaction_score": float})
@@ -0,0 +1,206 @@
+import random
+import numpy as np
+
+from behavior_generation.data.preference_categories import SEASONS, DAYS_OF_WEEK
+from behavior_generation import instrumentation
+
+from behavior_generation.generators.vectorized_behavior_generator import (
+    prepare_simulation,
+    calculate_watch_chance,
+    iter_day_chunks,
+)
+
+# Days whose event counts are drawn together. Longer blocks mean fewer count draws per user and day.
+DEFAULT_DAYS_PER_BLOCK = 365
+
+# Days whose events are placed together, aligned to day 0 like checkpoint segments. A run only
+# places the events of the windows it simulates, so its work grows with its own events.
+DEFAULT_DAYS_PER_WINDOW = 30
+
+
+def sample_distinct_slots(counts, num_slots, rng):
+    """
+    Draw counts[i] distinct slots out of range(num_slots) for every i, each subset equally likely.
+
+    Slots are drawn at random and duplicates are redrawn until none is left. When more than
+    half of the slots are needed, the slots to leave out are drawn instead, so the work stays
+    proportional to the number of slots returned.
+
+    :return: (indices, slots) arrays, where indices[j] is the i owning slots[j].
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    complement = counts * 2 > num_slots
+    indices = np.repeat(np.arange(len(counts)), np.where(complement, num_slots - counts, counts))
+    slots = rng.integers(0, num_slots, size=len(indices))
+
+    while True:
+        order = np.lexsort((slots, indices))
+        duplicate = np.zeros(len(order), dtype=bool)
+        duplicate[1:] = (indices[order][1:] == indices[order][:-1]) & (slots[order][1:] == slots[order][:-1])
+        if not duplicate.any():
+            break
+        redrawn = order[duplicate]
+        slots[redrawn] = rng.integers(0, num_slots, size=len(redrawn))
+
+    drawn = ~complement[indices]
+    complement_indices = np.flatnonzero(complement)
+    left_out = np.zeros((len(complement_indices), num_slots), dtype=bool)
+    complement_rows = np.searchsorted(complement_indices, indices[~drawn])
+    left_out[complement_rows, slots[~drawn]] = True
+    rows, kept_slots = np.nonzero(~left_out)
+
+    return (
+        np.concatenate([indices[drawn], complement_indices[rows]]),
+        np.concatenate([slots[drawn], kept_slots]),
+    )
+
+
+def group_days(day_mapping, day_numbers):
+    """
+    Group day numbers by their (season, day_of_week), the only day attributes watch chances depend on.
+
+    :return: Dictionary of (season, day_of_week) to the sorted array of its day numbers.
+    """
+    groups = {}
+    for day_number in day_numbers:
+        day = day_mapping[day_number]
+        groups.setdefault((day["season"], day["day_of_week"]), []).append(day_number)
+    return {group: np.array(days, dtype=np.int64) for group, days in groups.items()}
+
+
+def group_code(season, day_of_week):
+    """
+    Stable number of a (season, day_of_week) group, keying its random streams.
+    """
+    return SEASONS.index(season) * len(DAYS_OF_WEEK) + DAYS_OF_WEEK.index(day_of_week)
+
+
+def window_bounds(block_start, block_stop, days_per_window):
+    """
+    Bounds of the windows of a block: multiples of days_per_window, cut at the block's ends.
+    """
+    inner = range(block_start - block_start % days_per_window + days_per_window, block_stop, days_per_window)
+    return np.array([block_start, *inner, block_stop], dtype=np.int64)
+
+
+def draw_window_events(simulation, seed, block_index, day_mapping, block_days, bounds, windows):
+    """
+    Draw the watch events of every user in some windows of a block.
+
+    For each (season, day_of_week) group, the number of watch days of each user over the block
+    is drawn with one binomial sample, then split between the windows in order, each split being
+    a hypergeometric draw of the days left. Both come from a generator keyed by (seed, block,
+    group), and a window's events are placed with a generator keyed by the window too, so the
+    events of a window are the same whichever windows are drawn together.
+
+    :param bounds: Window bounds from window_bounds.
+    :param windows: Sorted indices of the windows to draw.
+    :return: Dictionary of window index to (event_users, event_days) arrays sorted by day, then user.
+    """
+    events = {window: ([], []) for window in windows}
+    last_window = windows[-1]
+    for (season, day_of_week), days in group_days(day_mapping, block_days).items():
+        window_days = np.searchsorted(bounds, days, side="right") - 1
+        if not np.isin(window_days, windows).any():
+            continue
+        code = group_code(season, day_of_week)
+        rng = np.random.default_rng([seed, block_index, code])
+        watch_chance = calculate_watch_chance(simulation, season, day_of_week)
+        remaining = rng.binomial(len(days), watch_chance)
+        instrumentation.count("watch_decisions", len(remaining))
+
+        days_left = len(days)
+        for window in np.unique(window_days[window_days <= last_window]):
+            group_window_days = days[window_days == window]
+            users = np.flatnonzero(remaining)
+            if len(group_window_days) == days_left:
+                counts = remaining[users]
+            else:
+                counts = rng.hypergeometric(len(group_window_days), days_left - len(group_window_days), remaining[users])
+            remaining[users] -= counts
+            days_left -= len(group_window_days)
+
+            if window in events:
+                watching = counts > 0
+                placement_rng = np.random.default_rng([seed, block_index, code, window])
+                indices, slots = sample_distinct_slots(counts[watching], len(group_window_days), placement_rng)
+                events[window][0].append(users[watching][indices])
+                events[window][1].append(group_window_days[slots])
+
+    drawn = {}
+    for window, (event_users, event_days) in events.items():
+        event_users = np.concatenate(event_users) if event_users else np.zeros(0, dtype=np.int64)
+        event_days = np.concatenate(event_days) if event_days else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((event_users, event_days))
+        drawn[window] = event_users[order], event_days[order]
+    return drawn
+
+
+def iter_behavior_data_counted(
+    users,
+    movies,
+    user_preferences,
+    num_days=30,
+    start_date="2025-01-01",
+    seed=None,
+    users_per_chunk=None,
+    first_day=0,
+    days_per_block=DEFAULT_DAYS_PER_BLOCK,
+    days_per_window=DEFAULT_DAYS_PER_WINDOW,
+    watch_history=None,
+    constraint_rules=None,
+):
+    """
+    Generate behavior data by drawing how many events each user has, then placing them on dates.
+
+    A user's watch chance only depends on the (season, day_of_week) of a day. Within a block of
+    days, the number of days a user watches among the n days of such a group is drawn with one
+    binomial sample, and the watched days are a uniformly drawn subset of the group's days.
+    That is the same distribution as one Bernoulli draw per user and day, so the cost grows with
+    the number of events instead of users x days.
+
+    Blocks are aligned to multiples of days_per_block, and windows to multiples of days_per_window,
+    both from day 0. Events are only placed in the windows overlapping the simulated days, see
+    draw_window_events, so simulating a block in several calls does not draw its events again.
+    Contexts, movies and scores are drawn like the vectorized engine does, keyed by
+    (seed, userID, day_number). So for the same seed and users, any range of days regenerates
+    exactly the rows of a longer run given the watch history of its earlier days, but unlike
+    the vectorized engine, a subset of users does not.
+
+    :param seed: Optional seed, drawn from the random module when omitted.
+    :param users_per_chunk: Optional number of users per chunk, defaults to all users.
+    :param first_day: Day number of the first simulated day, start_date being day 0.
+    :param days_per_block: Days whose event counts are drawn together.
+    :param days_per_window: Days whose events are placed together.
+    :param watch_history: Optional WatchHistory of the days before first_day, updated with the generated events.
+    :param constraint_rules: Optional hard constraint rules as returned by load_constraint_rules.
+    :return: Generator of DataFrame chunks in date order, with the same schema as generate_behavior_data.
+    """
+    # Imported here, behavior_generator dispatches to this module.
+    from behavior_generation.generators.behavior_generator import create_day_mapping
+
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    simulation = prepare_simulation(users, movies, user_preferences, watch_history, constraint_rules)
+    users_per_chunk = users_per_chunk or max(len(simulation["user_ids"]), 1)
+    last_day = first_day + num_days
+
+    for block_index in range(first_day // days_per_block, -(-last_day // days_per_block)):
+        block_days = range(block_index * days_per_block, (block_index + 1) * days_per_block)
+        day_mapping = create_day_mapping(start_date, days_per_block, block_days.start)
+        bounds = window_bounds(block_days.start, block_days.stop, days_per_window)
+        simulated_days = range(max(block_days.start, first_day), min(block_days.stop, last_day))
+        windows = list(range(
+            int(np.searchsorted(bounds, simulated_days.start, side="right")) - 1,
+            int(np.searchsorted(bounds, simulated_days.stop - 1, side="right")),
+        ))
+
+        drawn = draw_window_events(simulation, seed, block_index, day_mapping, block_days, bounds, windows)
+        for window in windows:
+            event_users, event_days = drawn.pop(window)
+            window_days = range(max(bounds[window], simulated_days.start), min(bounds[window + 1], simulated_days.stop))
+            day_bounds = np.searchsorted(event_days, np.arange(window_days.start, window_days.stop + 1))
+            for day_number, start, stop in zip(window_days, day_bounds[:-1], day_bounds[1:]):
+                if stop > start:
+                    yield from iter_day_chunks(simulation, seed, day_number, day_mapping[day_number], event_users[start:stop], users_per_chunk)
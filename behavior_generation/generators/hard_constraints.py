@@ -1,66 +1,254 @@
+import json
 import random
+import numpy as np
 import pandas as pd
 
-def get_filtered_movies(movies_df):
+from behavior_generation import instrumentation
+from behavior_generation.encoding import LANGUAGES
+from behavior_generation.movie_catalog import MovieCatalog
+from behavior_generation.options import DEFAULT_CONSTRAINT_RULES_FILE
+from behavior_generation.utils import LRUCache
+
+# A user's hard_constraint holds one rule name, or several joined with "+", e.g. "13_17_constraint+no_long_movie_constraint".
+CONSTRAINT_SEPARATOR = "+"
+NO_CONSTRAINT = "no_constraint"
+
+# Pools kept for (constraint set, companions, time_of_day, languages) combinations.
+CONSTRAINT_POOL_CACHE_SIZE = 4096
+
+# Catalog predicates a rule case can use in its "movies" entry, each turning its value into a movie mask.
+# "known_languages" is not a catalog predicate, it restricts movies to the languages of each user.
+MOVIE_PREDICATES = {
+    "maturity_not_in": lambda catalog, ratings: ~catalog.maturity_mask(ratings),
+    "genres_not_containing": lambda catalog, words: ~catalog.genre_mask(lambda genre: any(word in genre for word in words)),
+    "max_duration": lambda catalog, minutes: catalog.duration <= minutes,
+    "min_imdb_rating": lambda catalog, rating: catalog.imdb_rating >= rating,
+    "having_award": lambda catalog, having_award: (catalog.having_award == 1) == having_award,
+}
+
+CONTEXT_CONDITIONS = ["companions", "time_of_day"]
+
+# Suffix of the pool name of a context whose known languages leave no movie, so only its other rules apply.
+ANY_LANGUAGE_SUFFIX = ":any_language"
+
+
+def as_movie_catalog(movies):
+    """
+    Return movies as a MovieCatalog, converting a movie DataFrame if needed.
+    """
+    return movies if isinstance(movies, MovieCatalog) else MovieCatalog.from_dataframe(movies)
+
+
+def load_constraint_rules(path=DEFAULT_CONSTRAINT_RULES_FILE):
     """
-    Pre-filters movies into separate lists based on constraints.
+    Load hard constraint rules from a JSON file.
 
-    :param movies_df: Pandas DataFrame containing movie data.
-    :return: Dictionary where keys are constraint types, and values are precomputed lists of movie records.
+    Each rule name maps to a list of cases. A case has a "name", used as the pool name in
+    instrumentation, an optional "when" restricting it to some "companions" or "time_of_day"
+    values, and a "movies" entry of MOVIE_PREDICATES (and "known_languages") that all have to hold.
+    The first case matching the context applies, a rule without a matching case does not restrict movies.
     """
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
 
-    filtered_movies = {
-        "under_13": movies_df[
-            (~movies_df["maturityRating"].isin(["PG-13", "NC-17", "R"]))
-        ].to_dict("records"),
 
-        "under_13_with_parent": movies_df[
-            (~movies_df["maturityRating"].isin(["NC-17", "R"]))
-        ].to_dict("records"),
+class LanguageIndex:
+    """
+    Inverted index from each language to the bitset of movies available in it.
 
-        "13_17": movies_df[
-            (~movies_df["maturityRating"].isin(["NC-17", "R"]))
-        ].to_dict("records"),
+    A user's movies are the union of the bitsets of the languages they speak.
+    """
 
-        "13_17_with_parent": movies_df[
-            (~movies_df["maturityRating"].isin(["NC-17"]))
-        ].to_dict("records"),
+    def __init__(self, catalog):
+        self.bitsets = np.packbits(
+            (catalog.language_bitmask[None, :] >> np.arange(len(LANGUAGES), dtype=np.uint64)[:, None]) & np.uint64(1),
+            axis=1,
+        )
 
-        # Morning should avoid Thriller, or Horror
-        "no_morning_thriller_horror": movies_df[
-            ~movies_df["genres"].str.contains("Thriller|Horror", regex=True, na=False)
-        ].to_dict("records"),
+    def bitset(self, language_mask):
+        """
+        Packed bitset of the movies available in at least one language of language_mask.
+        """
+        language_mask = int(language_mask)
+        languages = [bit for bit in range(len(LANGUAGES)) if language_mask >> bit & 1]
+        if not languages:
+            return np.zeros(self.bitsets.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitsets[languages], axis=0)
 
-        # Busy people won't watch a movie longer than 2 hours
-        "no_long_movie_constraint": movies_df[movies_df["duration"] <= 120].to_dict("records"),
 
-        # Award Hunters will only watch awarded movies
-        "strict_award_hunter": movies_df[movies_df["havingAward"] == 1].to_dict("records"),
+class ConstraintPools:
+    """
+    Hard constraint rules compiled against a catalog, resolving each user context to its movie pool.
 
-        # Default (no constraint)
-        "no_constraint": movies_df.to_dict("records"),
-    }
+    Every rule case is compiled once into a packed movie bitset. The pool of a (constraint set,
+    companions, time_of_day) context is the intersection of the bitsets of the cases that apply,
+    also intersected with the user's languages when a case asks for known languages. Pools are
+    cached with least recently used eviction, so a pick costs the same however many rules exist.
 
-    return filtered_movies
+    Known languages are the only soft restriction. When a user's languages leave no movie, the
+    language restriction is dropped and the other rules still apply. A context whose other rules
+    leave no movie raises a ValueError, as no movie satisfies its hard constraints.
+    """
 
-def pick_movie(movies, user, companions, time_of_day):
+    def __init__(self, catalog, rules=None, cache_size=CONSTRAINT_POOL_CACHE_SIZE):
+        rules = rules if rules is not None else load_constraint_rules()
+        self.num_movies = len(catalog)
+        self.all_movies = np.arange(self.num_movies, dtype=np.int32)
+        self.language_index = LanguageIndex(catalog)
+        self.rules = {name: [self.compile_case(catalog, name, case) for case in cases] for name, cases in rules.items()}
+        self.constraint_sets = {}
+        self.pools = LRUCache(cache_size)
+
+    def compile_case(self, catalog, rule_name, case):
+        when = case.get("when", {})
+        unknown = set(when) - set(CONTEXT_CONDITIONS)
+        unknown |= set(case.get("movies", {})) - set(MOVIE_PREDICATES) - {"known_languages"}
+        if unknown:
+            raise ValueError(f"Unknown conditions {sorted(unknown)} in hard constraint rule '{rule_name}'.")
+
+        mask = np.ones(self.num_movies, dtype=bool)
+        for predicate, value in case.get("movies", {}).items():
+            if predicate != "known_languages":
+                mask &= MOVIE_PREDICATES[predicate](catalog, value)
+        return {
+            "name": case.get("name", rule_name),
+            "when": {condition: set(values) for condition, values in when.items()},
+            "bitset": np.packbits(mask),
+            "known_languages": bool(case.get("movies", {}).get("known_languages", False)),
+        }
+
+    def constraint_set(self, hard_constraint):
+        """
+        Compiled rules of a hard_constraint value, and whether one of them depends on the user's languages.
+        """
+        constraint_set = self.constraint_sets.get(hard_constraint)
+        if constraint_set is None:
+            names = [name for name in str(hard_constraint).split(CONSTRAINT_SEPARATOR) if name and name != NO_CONSTRAINT]
+            unknown = [name for name in names if name not in self.rules]
+            if unknown:
+                raise ValueError(f"Unknown hard constraints {unknown}. Expected rules among {sorted(self.rules)}.")
+            rules = [self.rules[name] for name in names]
+            known_languages = any(case["known_languages"] for cases in rules for case in cases)
+            constraint_set = self.constraint_sets[hard_constraint] = (rules, known_languages)
+        return constraint_set
+
+    def uses_languages(self, hard_constraint):
+        return self.constraint_set(hard_constraint)[1]
+
+    def pool(self, hard_constraint, companions, time_of_day, language_mask=None):
+        """
+        Pool of a user context.
+
+        :param language_mask: The user's language bitmask, only used when uses_languages(hard_constraint).
+        :return: (pool name, array of movie row indices into the catalog).
+        """
+        rules, known_languages = self.constraint_set(hard_constraint)
+        key = (hard_constraint, companions, time_of_day, int(language_mask) if known_languages else None)
+        entry = self.pools.get(key)
+        if entry is None:
+            entry = self.build_pool(rules, {"companions": companions, "time_of_day": time_of_day}, key[3])
+            self.pools.put(key, entry)
+        return entry
+
+    def build_pool(self, rules, context, language_mask):
+        names = []
+        bitset = None
+        language_bitset = None
+        for cases in rules:
+            case = next((case for case in cases if all(context[condition] in values for condition, values in case["when"].items())), None)
+            if case is None:
+                continue
+            names.append(case["name"])
+            if case["known_languages"]:
+                language_bitset = self.language_index.bitset(language_mask)
+            bitset = case["bitset"] if bitset is None else bitset & case["bitset"]
+
+        if bitset is None:
+            return NO_CONSTRAINT, self.all_movies
+        name = CONSTRAINT_SEPARATOR.join(names)
+        if language_bitset is not None and (bitset & language_bitset).any():
+            bitset = bitset & language_bitset
+        elif language_bitset is not None:
+            name += ANY_LANGUAGE_SUFFIX
+        pool = np.flatnonzero(np.unpackbits(bitset, count=self.num_movies)).astype(np.int32)
+        if not len(pool):
+            raise ValueError(f"No movie satisfies the hard constraints '{name}' with companions '{context['companions']}' and time of day '{context['time_of_day']}'.")
+        return name, pool
+
+
+def get_filtered_movies(movies, rules=None):
     """
-    Picks a movie based on the user's constraint.
+    Compile the hard constraint rules against the movies.
+
+    :param movies: MovieCatalog, or Pandas DataFrame containing movie data.
+    :param rules: Optional rules as returned by load_constraint_rules, defaults to DEFAULT_CONSTRAINT_RULES_FILE.
+        ConstraintPools already compiled against the movies are returned as they are, so they can be shared across runs.
+    :return: ConstraintPools resolving each user context to its movie pool.
     """
+    if isinstance(rules, ConstraintPools):
+        return rules
+    return ConstraintPools(as_movie_catalog(movies), rules)
 
-    if user["hard_constraint"] == "under_13":
-        return random.choice(movies["under_13_with_parent"] if companions == "Family" else movies["under_13"])
-    
-    elif user["hard_constraint"] == "13_17_constraint":
-        return random.choice(movies["13_17_with_parent"] if companions == "Family" else movies["13_17"])
 
-    elif user["hard_constraint"] == "no_morning_thriller_horror" and time_of_day == "Morning":
-        return random.choice(movies["no_morning_thriller_horror"])
+def pick_movie(movies, hard_constraint, language_mask, companions, time_of_day):
+    """
+    Picks a movie based on the user's constraints.
 
-    elif user["hard_constraint"] == "no_long_movie_constraint":
-        return random.choice(movies["no_long_movie_constraint"])
+    :param movies: ConstraintPools from get_filtered_movies.
+    :param hard_constraint: The user's hard constraint.
+    :param language_mask: Bitmask of the user's languages.
+    :return: Row index of the picked movie in the catalog.
+    """
+    language_mask = int(language_mask) if movies.uses_languages(hard_constraint) else None
+    pool_name, pool = movies.pool(hard_constraint, companions, time_of_day, language_mask)
+    instrumentation.count_pool_picks(pool_name)
+    return int(random.choice(pool))
 
-    elif user["hard_constraint"] == "strict_award_hunter":
-        return random.choice(movies["strict_award_hunter"])
 
-    return random.choice(movies["no_constraint"])
+def pick_movies(movies, hard_constraints, companions, times_of_day, uniforms, language_masks=None):
+    """
+    Picks one movie per event for a batch of events.
+
+    :param movies: ConstraintPools from get_filtered_movies.
+    :param hard_constraints: Array of the users' hard constraints, one per event.
+    :param companions: Array of companions, one per event.
+    :param times_of_day: Array of times of day, one per event.
+    :param uniforms: Uniform draws in [0, 1), one per event.
+    :param language_masks: Array of the users' language bitmasks, one per event.
+        Required when a user has a constraint on known languages.
+    :return: Array of picked movie row indices.
+    """
+    uniforms = np.asarray(uniforms)
+    picks = np.empty(len(uniforms), dtype=np.int32)
+    if not len(uniforms):
+        return picks
+    if language_masks is None:
+        language_masks = np.zeros(len(uniforms), dtype=np.uint64)
+
+    # Events are grouped by pool key with NumPy: the codes of the constraint, companions, time of day
+    # and, for constraints on known languages only, language mask are combined into one group code.
+    constraint_codes, constraints = pd.factorize(np.asarray(hard_constraints, dtype=object))
+    companion_codes, companion_values = pd.factorize(np.asarray(companions, dtype=object))
+    time_codes, time_values = pd.factorize(np.asarray(times_of_day, dtype=object))
+    uses_languages = np.array([movies.uses_languages(hard_constraint) for hard_constraint in constraints])
+    language_codes, language_values = pd.factorize(np.where(uses_languages[constraint_codes], np.asarray(language_masks, dtype=np.uint64), np.uint64(0)))
+
+    group_codes = ((constraint_codes.astype(np.int64) * len(companion_values) + companion_codes) * len(time_values) + time_codes) * len(language_values) + language_codes
+    groups, first_events, group_of_event, group_sizes = np.unique(group_codes, return_index=True, return_inverse=True, return_counts=True)
+
+    # Only the pool lookup is done per group. Pools are concatenated, and every event picks
+    # from its group's slice of them at once.
+    pools = []
+    for first, size in zip(first_events, group_sizes):
+        constraint_code = constraint_codes[first]
+        language_mask = int(language_values[language_codes[first]]) if uses_languages[constraint_code] else None
+        pool_name, pool = movies.pool(constraints[constraint_code], companion_values[companion_codes[first]], time_values[time_codes[first]], language_mask)
+        instrumentation.count_pool_picks(pool_name, int(size))
+        pools.append(pool)
+
+    pool_sizes = np.array([len(pool) for pool in pools], dtype=np.intp)
+    pool_offsets = np.cumsum(pool_sizes) - pool_sizes
+    event_pool_sizes = pool_sizes[group_of_event]
+    positions = np.minimum((uniforms * event_pool_sizes).astype(np.intp), event_pool_sizes - 1)
+    picks[:] = np.concatenate(pools)[pool_offsets[group_of_event] + positions]
+    return picks
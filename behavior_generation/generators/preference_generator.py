@@ -9,6 +9,19 @@ from behavior_generation.data.preference_categories import (
     TIMES_OF_DAY,
     LOCATIONS,
 )
+from behavior_generation.options import DEFAULT_BATCH_SIZE, PREFERENCE_ENGINES
+from behavior_generation.utils import iter_batches
+
+# Range of the uniform draw of each satisfaction weight before normalization.
+SATISFACTION_WEIGHT_RANGES = {
+    "liked_genre_match": (0.2, 0.4),
+    "disliked_genre_match": (0.3, 0.5),
+    "language_match": (0.05, 0.2),
+    "imdb_rating": (0.15, 0.3),
+    "user_mood": (0.05, 0.2),
+    "rewatch_factor": (0.05, 0.2),
+    "award_bonus": (0.05, 0.15),
+}
 
 
 def normalize_probabilities(probabilities):
@@ -50,15 +63,8 @@ def generate_satisfaction_weights():
     """
     Generate individual weights for satisfaction score components, ensuring a balanced total.
     """
-    weights = {
-        "liked_genre_match": round(random.uniform(0.2, 0.4), 2),
-        "disliked_genre_match": round(random.uniform(0.3, 0.5), 2) * -1,  # Negative influence
-        "language_match": round(random.uniform(0.05, 0.2), 2),
-        "imdb_rating": round(random.uniform(0.15, 0.3), 2),
-        "user_mood": round(random.uniform(0.05, 0.2), 2),
-        "rewatch_factor": round(random.uniform(0.05, 0.2), 2),
-        "award_bonus": round(random.uniform(0.05, 0.15), 2),
-    }
+    weights = {factor: round(random.uniform(low, high), 2) for factor, (low, high) in SATISFACTION_WEIGHT_RANGES.items()}
+    weights["disliked_genre_match"] *= -1  # Negative influence
 
     # Normalize to sum to 1 (absolute values considered)
     total_abs = sum(abs(w) for w in weights.values())
@@ -95,15 +101,49 @@ def generate_single_user_preferences(user_id):
         }
     }
 
-def generate_multiple_user_preferences(user_ids):
+def generate_multiple_user_preferences(user_ids, engine="python", seed=None):
     """
     Generate user-specific probabilities for a list of user IDs.
 
     :param user_ids: List of user IDs.
+    :param engine: "python" to generate users one by one, "vectorized" to generate every user at once with NumPy.
+        The vectorized engine returns a PreferenceStore, which is read like the dictionary.
+    :param seed: Optional seed for the vectorized engine.
     :return: A dictionary with user IDs as keys and their respective preferences as values.
     """
+    if engine not in PREFERENCE_ENGINES:
+        raise ValueError(f"Unknown preference engine '{engine}'. Expected one of {PREFERENCE_ENGINES}.")
+
+    if engine == "vectorized":
+        from behavior_generation.generators.vectorized_preference_generator import generate_preferences_vectorized
+        return generate_preferences_vectorized(user_ids, seed=seed)
+
     all_preferences = {}
-    for user_id in user_ids:
-        all_preferences.update(generate_single_user_preferences(user_id))
+    for preferences in iter_user_preferences(user_ids):
+        all_preferences.update(preferences)
     return all_preferences
-    
\ No newline at end of file
+
+
+def iter_user_preferences(user_ids, engine="python", seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate the preferences of generate_multiple_user_preferences for at most batch_size users at a time.
+
+    user_ids is read lazily, so only one batch of users and preferences is held in memory. With the
+    default batch size, the batches hold the preferences of generate_multiple_user_preferences.
+
+    :param user_ids: Iterable of user IDs.
+    :return: Iterator of preference dictionaries, or of PreferenceStores with the vectorized engine.
+    """
+    if engine not in PREFERENCE_ENGINES:
+        raise ValueError(f"Unknown preference engine '{engine}'. Expected one of {PREFERENCE_ENGINES}.")
+
+    if engine == "vectorized":
+        from behavior_generation.generators.vectorized_preference_generator import iter_preferences_vectorized
+        yield from iter_preferences_vectorized(user_ids, seed=seed, batch_size=batch_size)
+        return
+
+    for batch_user_ids in iter_batches(user_ids, batch_size):
+        preferences = {}
+        for user_id in batch_user_ids:
+            preferences.update(generate_single_user_preferences(user_id))
+        yield preferences
@@ -1,3 +1,74 @@
+import numpy as np
+
+from behavior_generation.encoding import popcount
+from behavior_generation.utils import round_array
+
+USER_MOOD_SCORES = {
+    "Happy": 1.0,
+    "Neutral": 0.7,
+    "Sad": 0.4,
+}
+
+# Order of the satisfaction weight columns used by the batched scorer.
+SATISFACTION_FACTORS = [
+    "liked_genre_match",
+    "disliked_genre_match",
+    "language_match",
+    "imdb_rating",
+    "user_mood",
+    "rewatch_factor",
+    "award_bonus",
+]
+
+
+def calculate_genre_match_score(movie_genres, genres):
+    """
+    Share of the movie's genres that appear in the given genre list.
+    """
+    if not movie_genres or not genres:
+        return 0
+    match_count = len(set(movie_genres).intersection(set(genres)))
+    return match_count / len(movie_genres)
+
+
+def calculate_user_mood_score(user_mood):
+    return USER_MOOD_SCORES.get(user_mood, 0.7)
+
+
+def calculate_imdb_rating_score(imdb_rating):
+    if imdb_rating and float(imdb_rating) < 5.5:
+        return -0.4
+    return float(imdb_rating) / 10 if imdb_rating else 0
+
+
+def combine_satisfaction_score(
+    liked_genre_match_score,
+    disliked_genre_match_score,
+    language_match,
+    imdb_rating_normalized,
+    user_mood_score,
+    number_of_rewatches,
+    award_bonus,
+    satisfaction_weights
+):
+    """
+    Weight the satisfaction factors, then clamp the result to [0, 1] and round it to 2 decimals.
+
+    The sum is converted to a Python float first, as round() on a NumPy float rounds differently.
+    """
+    satisfaction = (
+        (liked_genre_match_score * satisfaction_weights["liked_genre_match"]) +
+        (disliked_genre_match_score * satisfaction_weights["disliked_genre_match"]) +
+        (language_match * satisfaction_weights["language_match"]) +
+        (imdb_rating_normalized * satisfaction_weights["imdb_rating"]) +
+        (user_mood_score * satisfaction_weights["user_mood"]) +
+        (min(number_of_rewatches, 3) * satisfaction_weights["rewatch_factor"]) +
+        (award_bonus * satisfaction_weights["award_bonus"])
+    )
+
+    return round(max(0, min(float(satisfaction), 1)), 2)
+
+
 def calculate_satisfaction_score(
     movie_genres,
     liked_genres,
@@ -28,22 +99,6 @@ def calculate_satisfaction_score(
     movie_genres = movie_genres.split(", ") if isinstance(movie_genres, str) else movie_genres
     movie_languages = movie_language.split(", ") if isinstance(movie_language, str) else movie_language
 
-    # Calculate genre match score
-    def calculate_genre_match_score(movie_genres, genres):
-        if not movie_genres or not genres:
-            return 0
-        match_count = len(set(movie_genres).intersection(set(genres)))
-        return match_count / len(movie_genres)
-
-    # Calculate user mood score
-    def calculate_user_mood_score(user_mood):
-        USER_MOOD_SCORES = {
-            "Happy": 1.0,
-            "Neutral": 0.7,
-            "Sad": 0.4,
-        }
-        return USER_MOOD_SCORES.get(user_mood, 0.7)
-
     # Genre match score
     liked_genre_match_score = calculate_genre_match_score(movie_genres, liked_genres)
     disliked_genre_match_score = calculate_genre_match_score(movie_genres, disliked_genres)
@@ -51,27 +106,116 @@ def calculate_satisfaction_score(
     # Language match
     language_match = 1 if any(lang in user_languages for lang in movie_languages) else 0
 
-    if imdb_rating and float(imdb_rating) < 5.5:
-        imdb_rating_normalized = -0.4
-    else:
-        imdb_rating_normalized = float(imdb_rating) / 10 if imdb_rating else 0
+    # Having award bonus
+    award_bonus = 0.1 if award_hunter and movie_award else 0
 
+    return combine_satisfaction_score(
+        liked_genre_match_score,
+        disliked_genre_match_score,
+        language_match,
+        calculate_imdb_rating_score(imdb_rating),
+        calculate_user_mood_score(user_mood),
+        number_of_rewatches,
+        award_bonus,
+        satisfaction_weights
+    )
 
-    # User mood score
-    user_mood_score = calculate_user_mood_score(user_mood)
 
-    # Having award bonus
+def calculate_satisfaction_score_from_masks(
+    movie_genre_mask,
+    movie_genre_count,
+    liked_genre_mask,
+    disliked_genre_mask,
+    movie_language_mask,
+    user_language_mask,
+    imdb_rating,
+    user_mood,
+    number_of_rewatches,
+    award_hunter,
+    movie_award,
+    satisfaction_weights
+):
+    """
+    Same score as calculate_satisfaction_score, with genres and languages given as bitmasks.
+
+    :param movie_genre_mask: Genre bitmask of the movie.
+    :param movie_genre_count: Number of genre entries of the movie, including ones without a bit.
+    :param liked_genre_mask: Bitmask of the genres the user likes.
+    :param disliked_genre_mask: Bitmask of the genres the user dislikes.
+    :param movie_language_mask: Language bitmask of the movie.
+    :param user_language_mask: Bitmask of the user's known languages.
+    :return: Satisfaction score (0 to 1).
+    """
+    movie_genre_mask = int(movie_genre_mask)
+
+    liked_genre_match_score = bin(movie_genre_mask & int(liked_genre_mask)).count("1") / movie_genre_count if liked_genre_mask else 0
+    disliked_genre_match_score = bin(movie_genre_mask & int(disliked_genre_mask)).count("1") / movie_genre_count if disliked_genre_mask else 0
+
+    language_match = 1 if int(movie_language_mask) & int(user_language_mask) else 0
+
     award_bonus = 0.1 if award_hunter and movie_award else 0
 
-    # Calculate the weighted satisfaction score
+    return combine_satisfaction_score(
+        liked_genre_match_score,
+        disliked_genre_match_score,
+        language_match,
+        calculate_imdb_rating_score(imdb_rating),
+        calculate_user_mood_score(user_mood),
+        number_of_rewatches,
+        award_bonus,
+        satisfaction_weights
+    )
+
+
+def calculate_satisfaction_scores(
+    movie_genre_masks,
+    movie_genre_counts,
+    liked_genre_masks,
+    disliked_genre_masks,
+    movie_language_masks,
+    user_language_masks,
+    imdb_ratings,
+    user_mood_scores,
+    numbers_of_rewatches,
+    award_hunters,
+    movie_awards,
+    satisfaction_weights
+):
+    """
+    Batched calculate_satisfaction_score_from_masks, scoring one (user, movie, mood) triple per element.
+
+    All arguments are arrays of equal length, except satisfaction_weights which is an
+    (events x factors) matrix with columns ordered as SATISFACTION_FACTORS, and
+    user_mood_scores which holds the already looked-up mood scores.
+    :return: Array of satisfaction scores (0 to 1), identical to the scalar scorer.
+    """
+    movie_genre_counts = np.asarray(movie_genre_counts, dtype=np.float64)
+    imdb_ratings = np.asarray(imdb_ratings, dtype=np.float64)
+    satisfaction_weights = np.asarray(satisfaction_weights, dtype=np.float64)
+
+    liked_genre_match_score = popcount(np.bitwise_and(movie_genre_masks, liked_genre_masks)) / movie_genre_counts
+    disliked_genre_match_score = popcount(np.bitwise_and(movie_genre_masks, disliked_genre_masks)) / movie_genre_counts
+
+    language_match = (np.bitwise_and(movie_language_masks, user_language_masks) != 0).astype(np.float64)
+
+    imdb_rating_normalized = np.where(
+        (imdb_ratings != 0) & (imdb_ratings < 5.5),
+        -0.4,
+        np.where(imdb_ratings != 0, imdb_ratings / 10, 0.0),
+    )
+
+    award_bonus = np.where((np.asarray(award_hunters) != 0) & (np.asarray(movie_awards) != 0), 0.1, 0.0)
+
     satisfaction = (
-        (liked_genre_match_score * satisfaction_weights["liked_genre_match"]) +
-        (disliked_genre_match_score * satisfaction_weights["disliked_genre_match"]) +
-        (language_match * satisfaction_weights["language_match"]) +
-        (imdb_rating_normalized * satisfaction_weights["imdb_rating"]) +
-        (user_mood_score * satisfaction_weights["user_mood"]) +
-        (min(number_of_rewatches, 3) * satisfaction_weights["rewatch_factor"]) +
-        (award_bonus * satisfaction_weights["award_bonus"])
+        (liked_genre_match_score * satisfaction_weights[:, 0]) +
+        (disliked_genre_match_score * satisfaction_weights[:, 1]) +
+        (language_match * satisfaction_weights[:, 2]) +
+        (imdb_rating_normalized * satisfaction_weights[:, 3]) +
+        (np.asarray(user_mood_scores, dtype=np.float64) * satisfaction_weights[:, 4]) +
+        (np.minimum(numbers_of_rewatches, 3) * satisfaction_weights[:, 5]) +
+        (award_bonus * satisfaction_weights[:, 6])
     )
 
-    return round(max(0, min(satisfaction, 1)), 2)
+    # A NaN score clamps to 0 in the scalar scorer, and -0.0 must not leak into the output.
+    clamped = np.where(np.isnan(satisfaction), 0.0, np.clip(satisfaction, 0, 1)) + 0.0
+    return round_array(clamped, 2)
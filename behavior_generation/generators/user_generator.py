@@ -13,7 +13,9 @@ from behavior_generation.data.user_probabilities import (
     LANGUAGE_PROBS,
 )
 
-from behavior_generation.utils import pick_from_probabilities
+from behavior_generation.utils import iter_batches, pick_from_probabilities
+from behavior_generation.options import DEFAULT_BATCH_SIZE, USER_ENGINES
+from behavior_generation.user_table import compact_users, concat_users
 
 
 def generate_single_user(index, user_probabilities):
@@ -86,11 +88,50 @@ def get_specialized_country_probs(origin_country):
     return specialized_probs
 
 
-def generate_users(num_users, user_probabilities):
+
+
+def seed_python_engine(seed):
+    """
+    Seed the random module and Faker, which the python engine draws users from.
+    """
+    random.seed(seed)
+    Faker.seed(seed)
+
+
+def generate_users(num_users, user_probabilities, start_index=0, engine="python", seed=None):
+    """
+    Generate a DataFrame containing synthetic user data, as a compact user table.
+
+    User IDs are integers, enumerations are categoricals and genre and language sets are
+    bitmasks, see behavior_generation.user_table. format_users converts it back to strings and lists.
+
+    :param start_index: Index of the first user, used to number users of a shard.
+    :param engine: "python" to generate users one by one, "vectorized" to sample them in batches with NumPy.
+    :param seed: Optional seed for the vectorized engine.
+    """
+    return concat_users(list(iter_users(num_users, user_probabilities, start_index=start_index, engine=engine, seed=seed)))
+
+
+def iter_users(num_users, user_probabilities, start_index=0, engine="python", seed=None, batch_size=DEFAULT_BATCH_SIZE):
     """
-    Generate a DataFrame containing synthetic user data.
+    Generate the users of generate_users as compact user tables of at most batch_size users.
+
+    Only one batch is held in memory, so any number of users can be written as they are generated.
+    The python engine generates the same users whatever the batch size. The vectorized engine
+    samples one batch at a time, so with the default batch size it generates the users of generate_users.
+
+    :param batch_size: Number of users per yielded table.
     """
-    return pd.DataFrame([generate_single_user(i, user_probabilities) for i in range(num_users)])
+    if engine not in USER_ENGINES:
+        raise ValueError(f"Unknown user engine '{engine}'. Expected one of {USER_ENGINES}.")
+
+    if engine == "vectorized":
+        from behavior_generation.generators.vectorized_user_generator import iter_users_vectorized
+        yield from iter_users_vectorized(num_users, user_probabilities, start_index=start_index, seed=seed, batch_size=batch_size)
+        return
+
+    for indexes in iter_batches(range(start_index, start_index + num_users), batch_size):
+        yield compact_users(pd.DataFrame([generate_single_user(i, user_probabilities) for i in indexes]))
 
 
 def pick_working_status(age_range, WORKING_STATUS_PROBS):
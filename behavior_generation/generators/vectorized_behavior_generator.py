@@ -0,0 +1,234 @@
+import random
+import numpy as np
+import pandas as pd
+
+from behavior_generation.data.preference_categories import (
+    COMPANIONS,
+    SEASONS,
+    DAYS_OF_WEEK,
+    TIMES_OF_DAY,
+    LOCATIONS,
+)
+
+from behavior_generation import instrumentation
+from behavior_generation.preference_store import PreferenceStore
+from behavior_generation.user_table import compact_users, format_user_ids, user_bitmasks
+from behavior_generation.watch_history import WatchHistory
+
+from behavior_generation.keyed_random import (
+    WATCH_STREAM,
+    LOCATION_STREAM,
+    COMPANION_STREAM,
+    USER_MOOD_STREAM,
+    TIME_OF_DAY_STREAM,
+    MOVIE_STREAM,
+    keyed_uniform,
+    user_keys,
+)
+
+from behavior_generation.generators.satisfaction_calculator import (
+    USER_MOOD_SCORES,
+    SATISFACTION_FACTORS,
+    calculate_satisfaction_scores,
+)
+
+from behavior_generation.generators.hard_constraints import as_movie_catalog, get_filtered_movies, pick_movies
+
+USER_MOODS = ["Happy", "Neutral", "Sad"]
+USER_MOOD_SCORE_VALUES = np.array([USER_MOOD_SCORES[user_mood] for user_mood in USER_MOODS])
+
+
+def build_probability_matrix(user_ids, user_preferences, key, categories):
+    """
+    Stack one preference distribution of every user into a (users x categories) matrix.
+
+    :param user_ids: Ordered list of user IDs, one row per user.
+    :param user_preferences: Dictionary of user preferences keyed by user ID, or a PreferenceStore.
+    :param key: Preference key to stack (e.g. "SEASON_PROBS").
+    :param categories: Ordered list of categories, one column per category.
+    :return: A float matrix of probabilities.
+    """
+    if isinstance(user_preferences, PreferenceStore):
+        return user_preferences.matrix(key, user_ids)
+    return np.array(
+        [[user_preferences[user_id][key].get(category, 0) for category in categories] for user_id in user_ids],
+        dtype=np.float64,
+    ).reshape(len(user_ids), len(categories))
+
+
+def compile_probability_matrix(probability_matrix):
+    """
+    Compile a (users x categories) probability matrix into the cumulative matrix used by sample_categorical.
+
+    Rows are treated as unnormalized weights, the same way random.choices treats them.
+    """
+    return np.cumsum(probability_matrix, axis=1)
+
+
+def sample_categorical(cumulative_matrix, uniforms):
+    """
+    Draw one category index per row of a cumulative matrix from compile_probability_matrix.
+
+    :param uniforms: Uniform draws in [0, 1), one per row.
+    """
+    draws = uniforms * cumulative_matrix[:, -1]
+    picks = (cumulative_matrix <= draws[:, None]).sum(axis=1)
+    return np.minimum(picks, cumulative_matrix.shape[1] - 1)
+
+
+def prepare_simulation(users, movies, user_preferences, watch_history=None, constraint_rules=None):
+    """
+    Gather the per-user and per-movie arrays used to simulate behaviors in batches.
+
+    :param watch_history: Optional WatchHistory of earlier days, keyed by row in users, updated as events are drawn.
+    :param constraint_rules: Optional hard constraint rules as returned by load_constraint_rules.
+    :return: Dictionary of arrays, with one row per user in the order of users.
+    """
+    users = compact_users(users)
+    user_ids = format_user_ids(users["userID"])
+
+    catalog = as_movie_catalog(movies)
+    with instrumentation.stage("constraint_pools"):
+        filtered_movies = get_filtered_movies(catalog, constraint_rules)
+
+    if isinstance(user_preferences, PreferenceStore):
+        watch_tendency = user_preferences.watch_tendency[user_preferences.rows(user_ids)].astype(np.float64)
+    else:
+        watch_tendency = np.array([user_preferences[user_id]["WATCH_TENDENCY"] for user_id in user_ids], dtype=np.float64)
+
+    return {
+        "user_ids": user_ids,
+        "keys": user_keys(user_ids),
+        "catalog": catalog,
+        "filtered_movies": filtered_movies,
+        "hard_constraints": users["hard_constraint"].to_numpy(dtype=object),
+        "award_hunters": users["award_hunter"].to_numpy(dtype=np.int8),
+        "user_bitmasks": user_bitmasks(users),
+        "watch_tendency": watch_tendency,
+        "season_matrix": build_probability_matrix(user_ids, user_preferences, "SEASON_PROBS", SEASONS),
+        "day_of_week_matrix": build_probability_matrix(user_ids, user_preferences, "DAY_OF_WEEK_PROBS", DAYS_OF_WEEK),
+        "location_cumulative": compile_probability_matrix(build_probability_matrix(user_ids, user_preferences, "LOCATION_PROBS", LOCATIONS)),
+        "companion_cumulative": compile_probability_matrix(build_probability_matrix(user_ids, user_preferences, "COMPANION_PROBS", COMPANIONS)),
+        "time_of_day_cumulative": compile_probability_matrix(build_probability_matrix(user_ids, user_preferences, "TIME_OF_DAY_PROBS", TIMES_OF_DAY)),
+        "satisfaction_weight_matrix": build_probability_matrix(user_ids, user_preferences, "SATISFACTION_WEIGHTS", SATISFACTION_FACTORS),
+        "watch_history": watch_history if watch_history is not None else WatchHistory(),
+    }
+
+
+def calculate_watch_chance(simulation, season, day_of_week):
+    """
+    Chance of each user to watch a movie on a day of the given season and day of week.
+
+    Uses the closed form 1 - (1 - p) ** watch_tendency, which is the probability that
+    at least one of the per-user retries succeeds.
+    """
+    watch_probability = simulation["season_matrix"][:, SEASONS.index(season)] * simulation["day_of_week_matrix"][:, DAYS_OF_WEEK.index(day_of_week)]
+    return 1 - (1 - watch_probability) ** simulation["watch_tendency"]
+
+
+def iter_day_chunks(simulation, seed, day_number, day, watchers, users_per_chunk):
+    """
+    Draw the context, movie and score of every event of one day, yielding them in user shards.
+
+    Draws are keyed by (seed, userID, day_number), so an event's values only depend on its user and day.
+    Scores use the user's rewatches of the movie, counted in the simulation's watch history.
+
+    :param day: Entry of create_day_mapping for day_number.
+    :param watchers: Sorted row indices of the users watching a movie that day.
+    """
+    catalog = simulation["catalog"]
+    user_bitmasks = simulation["user_bitmasks"]
+
+    watcher_keys = simulation["keys"][watchers]
+    locations = sample_categorical(simulation["location_cumulative"][watchers], keyed_uniform(seed, watcher_keys, day_number, LOCATION_STREAM))
+    companions = sample_categorical(simulation["companion_cumulative"][watchers], keyed_uniform(seed, watcher_keys, day_number, COMPANION_STREAM))
+    user_moods = (keyed_uniform(seed, watcher_keys, day_number, USER_MOOD_STREAM) * len(USER_MOODS)).astype(np.intp)
+    times_of_day = sample_categorical(simulation["time_of_day_cumulative"][watchers], keyed_uniform(seed, watcher_keys, day_number, TIME_OF_DAY_STREAM))
+
+    movie_indices = pick_movies(
+        simulation["filtered_movies"],
+        simulation["hard_constraints"][watchers],
+        np.take(COMPANIONS, companions),
+        np.take(TIMES_OF_DAY, times_of_day),
+        keyed_uniform(seed, watcher_keys, day_number, MOVIE_STREAM),
+        user_bitmasks["language_spoken"][watchers],
+    )
+    rewatches = simulation["watch_history"].record_many(watchers, movie_indices)
+
+    satisfaction_scores = calculate_satisfaction_scores(
+        catalog.genre_bitmask[movie_indices],
+        catalog.genre_count[movie_indices],
+        user_bitmasks["liked_genres"][watchers],
+        user_bitmasks["disliked_genres"][watchers],
+        catalog.language_bitmask[movie_indices],
+        user_bitmasks["language_spoken"][watchers],
+        catalog.imdb_rating[movie_indices],
+        USER_MOOD_SCORE_VALUES[user_moods],
+        rewatches,
+        simulation["award_hunters"][watchers],
+        catalog.having_award[movie_indices],
+        simulation["satisfaction_weight_matrix"][watchers],
+    )
+
+    instrumentation.count("scoring_calls", len(watchers))
+    instrumentation.count("events", len(watchers))
+
+    day_data = pd.DataFrame({
+        "day_number": day_number,
+        "date": day["date"],
+        "season": day["season"],
+        "day_of_week": day["day_of_week"],
+        "time_of_day": np.take(TIMES_OF_DAY, times_of_day).astype(object),
+        "userId": simulation["user_ids"][watchers],
+        "movieId": catalog.movie_ids[movie_indices].astype(object),
+        "location": np.take(LOCATIONS, locations).astype(object),
+        "companions": np.take(COMPANIONS, companions).astype(object),
+        "user_mood": np.take(USER_MOODS, user_moods).astype(object),
+        "satisfaction_score": satisfaction_scores,
+    })
+
+    # Watchers are sorted, so each user shard is a contiguous slice of the day.
+    shard_bounds = np.searchsorted(watchers, np.arange(0, len(simulation["user_ids"]) + users_per_chunk, users_per_chunk))
+    for start, stop in zip(shard_bounds[:-1], shard_bounds[1:]):
+        if stop > start:
+            yield day_data.iloc[start:stop].reset_index(drop=True)
+
+
+def iter_behavior_data_vectorized(users, movies, user_preferences, num_days=30, start_date="2025-01-01", seed=None, users_per_chunk=None, first_day=0, watch_history=None, constraint_rules=None):
+    """
+    Generate synthetic behavior data with NumPy, processing every user of a day at once.
+
+    Watch decisions use the closed form of calculate_watch_chance. Context values are
+    drawn as batched categorical samples from per-user cumulative matrices, compiled once per run.
+
+    Every draw comes from a counter-based generator keyed by (seed, userID, day_number),
+    so a user's events on a day never depend on the other users simulated. Scores also depend
+    on the user's watch history, so later days match a longer run when given its history.
+
+    :param seed: Optional seed, drawn from the random module when omitted.
+    :param users_per_chunk: Optional number of users per chunk, defaults to all users.
+        The chunk size does not change the generated data.
+    :param first_day: Day number of the first simulated day, start_date being day 0.
+    :param watch_history: Optional WatchHistory of the days before first_day, keyed by row in users.
+        It is updated with the generated events, so it can be passed on to the next call.
+    :param constraint_rules: Optional hard constraint rules as returned by load_constraint_rules.
+    :return: Generator of DataFrame chunks with the same schema as generate_behavior_data.
+    """
+    # Imported here, behavior_generator dispatches to this module.
+    from behavior_generation.generators.behavior_generator import create_day_mapping
+
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    simulation = prepare_simulation(users, movies, user_preferences, watch_history, constraint_rules)
+    day_mapping = create_day_mapping(start_date, num_days, first_day)
+    users_per_chunk = users_per_chunk or max(len(simulation["user_ids"]), 1)
+
+    for day_number in range(first_day, first_day + num_days):
+        day = day_mapping[day_number]
+        watch_chance = calculate_watch_chance(simulation, day["season"], day["day_of_week"])
+        watchers = np.flatnonzero(keyed_uniform(seed, simulation["keys"], day_number, WATCH_STREAM) < watch_chance)
+        instrumentation.count("watch_decisions", len(watch_chance))
+
+        if watchers.size:
+            yield from iter_day_chunks(simulation, seed, day_number, day, watchers, users_per_chunk)
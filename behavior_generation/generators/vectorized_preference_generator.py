@@ -0,0 +1,122 @@
+import random
+import numpy as np
+
+from behavior_generation.generators.preference_generator import SATISFACTION_WEIGHT_RANGES
+from behavior_generation.options import DEFAULT_BATCH_SIZE
+from behavior_generation.generators.satisfaction_calculator import SATISFACTION_FACTORS
+from behavior_generation.preference_store import PREFERENCE_CATEGORIES, PreferenceStore
+from behavior_generation.utils import iter_batches, round_array
+
+# Mixed into the seed, so users and preferences generated from the same seed use independent streams.
+SEED_SALT = 1
+
+# Veltkamp splitter for float64, used to split a value into two halves with exact products.
+_SPLITTER = 2.0**27 + 1
+
+
+def floor_cents(values):
+    """
+    Floor of values * 100 taken on the exact product, for non-negative values.
+
+    Matches Decimal(value).quantize(Decimal("0.01"), rounding=ROUND_DOWN) * 100. The float product
+    can round up onto a whole number, so its exact error is recovered with Dekker's TwoProduct
+    and such products are moved down by one.
+    """
+    product = values * 100
+    split = values * _SPLITTER
+    high = split - (split - values)
+    low = values - high
+    error = (high * 100 - product) + low * 100
+    cents = np.floor(product)
+    return np.where((cents == product) & (error < 0), cents - 1, cents).astype(np.int64)
+
+
+def sequential_row_sum(matrix):
+    """
+    Row sums added left to right, as sum() adds the values of a dictionary.
+    """
+    total = matrix[:, 0].copy()
+    for column in range(1, matrix.shape[1]):
+        total += matrix[:, column]
+    return total
+
+
+def normalize_probability_matrix(weights):
+    """
+    Batched normalize_probabilities, one distribution per row.
+
+    Each row is divided by its sum, rounded down to 2 decimals, and the remainder to 1.00
+    is added to the first category with the largest rounded value.
+    """
+    cents = floor_cents(weights / sequential_row_sum(weights)[:, None])
+    max_columns = np.argmax(cents, axis=1)
+    cents[np.arange(len(cents)), max_columns] += 100 - cents.sum(axis=1)
+    return cents / 100
+
+
+def generate_dominant_probability_matrix(num_users, num_categories, rng):
+    """
+    Batched generate_dominant_probabilities, one row per user.
+    """
+    dominant_index = rng.integers(0, num_categories, size=num_users)
+    weights = rng.uniform(0.1, 0.5, size=(num_users, num_categories))
+    weights[np.arange(num_users), dominant_index] = 1.0
+    return normalize_probability_matrix(weights)
+
+
+def generate_satisfaction_weight_matrix(num_users, rng):
+    """
+    Batched generate_satisfaction_weights, with columns ordered as SATISFACTION_FACTORS.
+    """
+    low, high = np.array([SATISFACTION_WEIGHT_RANGES[factor] for factor in SATISFACTION_FACTORS]).T
+    weights = round_array(rng.uniform(low, high, size=(num_users, len(SATISFACTION_FACTORS))), 2)
+    weights[:, SATISFACTION_FACTORS.index("disliked_genre_match")] *= -1  # Negative influence
+    return round_array(weights / sequential_row_sum(np.abs(weights))[:, None], 2)
+
+
+def generate_preference_batch(user_ids, rng):
+    """
+    Generate the preferences of one batch of users, drawing every distribution for all of them at once.
+    """
+    num_users = len(user_ids)
+
+    watch_tendency = rng.integers(1, 6, size=num_users).astype(np.int8)
+    matrices = {
+        key: generate_dominant_probability_matrix(num_users, len(categories), rng)
+        for key, categories in PREFERENCE_CATEGORIES.items()
+        if key != "SATISFACTION_WEIGHTS"
+    }
+    matrices["SATISFACTION_WEIGHTS"] = generate_satisfaction_weight_matrix(num_users, rng)
+
+    return PreferenceStore(
+        user_ids=np.array(user_ids, dtype=str),
+        watch_tendency=watch_tendency,
+        matrices=matrices,
+    )
+
+
+def generate_preferences_vectorized(user_ids, seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate the same preferences as generate_multiple_user_preferences, batch_size users at once.
+
+    Rounding follows the per-user functions exactly, so for the same raw draws the
+    distributions are identical. The draws come from a NumPy generator instead of the random module.
+
+    :param seed: Optional seed, drawn from the random module when omitted.
+    :param batch_size: Number of users drawn at once, bounds the size of the temporary arrays.
+    :return: A PreferenceStore, read like the preference dictionary.
+    """
+    batches = list(iter_preferences_vectorized(user_ids, seed=seed, batch_size=batch_size))
+    return PreferenceStore.concatenate(batches) if batches else generate_preference_batch([], np.random.default_rng(0))
+
+
+def iter_preferences_vectorized(user_ids, seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the batches of generate_preferences_vectorized one by one, reading user_ids lazily.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    rng = np.random.default_rng([seed, SEED_SALT])
+    for batch_user_ids in iter_batches(user_ids, batch_size):
+        yield generate_preference_batch([str(user_id) for user_id in batch_user_ids], rng)
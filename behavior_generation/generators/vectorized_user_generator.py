@@ -0,0 +1,244 @@
+import json
+import os
+import random
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from faker import Faker, VERSION as faker_version
+
+from behavior_generation.data.country_data import (
+    COUNTRY_PROBS,
+    CITIES_BY_COUNTRY,
+    LANGUAGES_BY_COUNTRY,
+)
+from behavior_generation.data.user_probabilities import (
+    GENRE_LIKE_PROBS,
+    GENRE_DISLIKE_PROBS,
+)
+from behavior_generation.encoding import GENRES, GENRE_MASK_DTYPE, LANGUAGES, LANGUAGE_MASK_DTYPE
+from behavior_generation.options import CACHE_DIRECTORY, DEFAULT_BATCH_SIZE
+from behavior_generation.user_table import USER_ID_DTYPE, categorical, concat_users
+from behavior_generation.utils import get_sampler
+
+from behavior_generation.generators.user_generator import get_specialized_country_probs
+
+NAME_POOL_SIZE = 2000
+NAME_POOL_SEED = 0
+NAME_POOL_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "name_pool")
+
+UNDER_18_AGE_RANGES = ["Under 13", "13-17"]
+STUDENT_LEANING_AGE_RANGES = ["18-24", "25-34"]
+
+# Constraints of adult users with a constraint, in the order pick_hard_constraint draws them.
+OPTIONAL_HARD_CONSTRAINTS = ["no_morning_thriller_horror", "only_known_languages", "no_long_movie_constraint", "strict_award_hunter"]
+HARD_CONSTRAINTS = ["no_constraint", "under_13", "13_17_constraint", *OPTIONAL_HARD_CONSTRAINTS]
+
+GENRE_BIT_VALUES = (1 << np.arange(len(GENRES))).astype(GENRE_MASK_DTYPE)
+LANGUAGE_BIT_VALUES = (np.uint64(1) << np.arange(len(LANGUAGES), dtype=np.uint64)).astype(LANGUAGE_MASK_DTYPE)
+
+
+@lru_cache(maxsize=None)
+def get_country_tables():
+    """
+    Precompute the per-country probability arrays used by batched user generation.
+
+    :return: Dictionary with the country list, the origin x language probability
+             matrix, the living country x language official-language mask, the city names
+             and, per country, the offset and count of its cities in city_codes.
+    """
+    countries = list(COUNTRY_PROBS)
+    cities = [CITIES_BY_COUNTRY.get(country, ["Unknown City"]) for country in countries]
+    city_names = list(dict.fromkeys(city for country_cities in cities for city in country_cities))
+    return {
+        "countries": countries,
+        "origin_language_probs": np.array([
+            [get_specialized_country_probs(country).get(language, 0) for language in LANGUAGES]
+            for country in countries
+        ]),
+        "official_languages": np.array([
+            [language in LANGUAGES_BY_COUNTRY.get(country, ["English"]) for language in LANGUAGES]
+            for country in countries
+        ]),
+        "city_names": city_names,
+        "city_codes": np.array([city_names.index(city) for country_cities in cities for city in country_cities], dtype=np.intp),
+        "city_offsets": np.cumsum([0] + [len(country_cities) for country_cities in cities[:-1]]),
+        "city_counts": np.array([len(country_cities) for country_cities in cities]),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_name_pool(size=NAME_POOL_SIZE):
+    """
+    Draw a shared pool of first names and last names with a single Faker instance.
+
+    The pool is seeded with a constant, so it is drawn once per process and users
+    only differ by the names they pick from it. Drawing it takes about half a second,
+    so it is also kept in NAME_POOL_CACHE_DIRECTORY, in the user cache directory, keyed by the
+    Faker version. When the cache cannot be written, the pool is drawn again by the next process.
+    """
+    cache_file = os.path.join(NAME_POOL_CACHE_DIRECTORY, f"{faker_version}-{size}-{NAME_POOL_SEED}.json")
+    try:
+        with open(cache_file, "r", encoding="utf-8") as file:
+            names = json.load(file)
+        return np.array(names["first_names"], dtype=object), np.array(names["last_names"], dtype=object)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    faker = Faker()
+    faker.seed_instance(NAME_POOL_SEED)
+    first_names = [faker.first_name() for _ in range(size)]
+    last_names = [faker.last_name() for _ in range(size)]
+    try:
+        os.makedirs(NAME_POOL_CACHE_DIRECTORY, exist_ok=True)
+        # Written to a temporary file then renamed, so concurrent runs never read a partial cache.
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=NAME_POOL_CACHE_DIRECTORY, prefix=".tmp-")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            json.dump({"first_names": first_names, "last_names": last_names}, file)
+        os.replace(temporary_file, cache_file)
+    except OSError:
+        pass
+    return np.array(first_names, dtype=object), np.array(last_names, dtype=object)
+
+
+def pick_codes(prob_dict, size, rng):
+    """
+    Draw size category codes from a probability dictionary, weights treated like random.choices does.
+
+    :return: (options, codes) where options[codes[i]] is the i-th draw.
+    """
+    sampler = get_sampler(prob_dict)
+    return sampler.options, sampler.sample_codes(rng.random(size))
+
+
+def pick_values(prob_dict, size, rng):
+    options, codes = pick_codes(prob_dict, size, rng)
+    return np.array(options, dtype=object)[codes]
+
+
+def pick_capped_subsets(selected, rng, cap=3):
+    """
+    Keep at most cap randomly chosen selected entries per row, like random.sample(selected, cap).
+
+    :param selected: Boolean (rows x options) matrix.
+    :return: Boolean (rows x options) matrix of the kept entries.
+    """
+    keys = np.where(selected, rng.random(selected.shape), 2.0)
+    order = np.argsort(keys, axis=1)[:, :cap]
+    counts = np.minimum(selected.sum(axis=1), cap)
+    kept = np.zeros_like(selected)
+    np.put_along_axis(kept, order, np.arange(order.shape[1]) < counts[:, None], axis=1)
+    return kept
+
+
+def bitmasks(selected, bit_values):
+    """
+    Bitmask of the selected entries of every row of a boolean (rows x options) matrix.
+    """
+    return (selected * bit_values).sum(axis=1, dtype=bit_values.dtype)
+
+
+def generate_user_batch(start_index, num_users, user_probabilities, rng, name_pool):
+    """
+    Generate one batch of users, sampling every attribute for all users at once.
+    """
+    tables = get_country_tables()
+    first_names, last_names = name_pool
+
+    clinical_gender = pick_values(user_probabilities.get("GENDER_PROBS"), num_users, rng)
+    age_range = pick_values(user_probabilities.get("AGE_RANGE_PROBS"), num_users, rng)
+    lifestyle = pick_values(user_probabilities.get("LIFESTYLE_PROBS"), num_users, rng)
+    ethnicity = pick_values(user_probabilities.get("ETHNICITY_PROBS"), num_users, rng)
+
+    under_18 = np.isin(age_range, UNDER_18_AGE_RANGES)
+
+    # Same rules as pick_working_status and pick_marital_status
+    working_status = pick_values(user_probabilities.get("WORKING_STATUS_PROBS"), num_users, rng)
+    working_status[np.isin(age_range, STUDENT_LEANING_AGE_RANGES) & (rng.random(num_users) < 0.5)] = "Student"
+    working_status[age_range == "65+"] = "Retired"
+    working_status[under_18] = "Student"
+    marital_status = pick_values(user_probabilities.get("MARITAL_STATUS_PROBS"), num_users, rng)
+    marital_status[under_18] = "Single"
+
+    # Same rules as pick_living_country and pick_city
+    _, origin = pick_codes(COUNTRY_PROBS, num_users, rng)
+    moved_country = rng.integers(0, len(tables["countries"]), size=num_users)
+    living = np.where(rng.random(num_users) < 0.8, origin, moved_country)
+    city_draws = rng.random(num_users)
+    current_location = tables["city_codes"][tables["city_offsets"][living] + (city_draws * tables["city_counts"][living]).astype(np.intp)]
+
+    # Same rules as pick_liked_genres and pick_disliked_genres
+    liked = rng.random((num_users, len(GENRES))) < np.array([GENRE_LIKE_PROBS.get(genre, 0) for genre in GENRES])
+    liked_selected = pick_capped_subsets(liked, rng)
+    disliked = ~liked_selected & (rng.random((num_users, len(GENRES))) < np.array([GENRE_DISLIKE_PROBS.get(genre, 0) for genre in GENRES]))
+    disliked_selected = pick_capped_subsets(disliked, rng)
+
+    # Same rules as pick_languages, using the origin x language matrix. Users speaking no official
+    # language of their living country get the official language picked by their draw added.
+    official = tables["official_languages"][living]
+    language_probs = tables["origin_language_probs"][origin]
+    spoken = rng.random((num_users, len(LANGUAGES))) < np.where(official, language_probs * 2.0, language_probs)
+    needs_official = ~(spoken & official).any(axis=1)
+    official_draws = rng.random(num_users)
+    picked_official = (official_draws * official.sum(axis=1)).astype(np.intp)
+    spoken |= needs_official[:, None] & official & (np.cumsum(official, axis=1) - 1 == picked_official[:, None])
+
+    award_hunter = (rng.random(num_users) < 0.2).astype(np.int8)
+
+    # Same rules as pick_hard_constraint, which always allows "no_long_movie_constraint"
+    constrained = rng.random(num_users) <= 0.2
+    constraint_draws = rng.random(num_users)
+    optional_constraints = np.array(OPTIONAL_HARD_CONSTRAINTS, dtype=object)
+    hard_constraint = np.where(constrained, optional_constraints[(constraint_draws * (3 + award_hunter)).astype(np.intp)], "no_constraint")
+    hard_constraint[age_range == "13-17"] = "13_17_constraint"
+    hard_constraint[age_range == "Under 13"] = "under_13"
+
+    name_draws = rng.integers(0, len(first_names), size=(2, num_users))
+
+    return pd.DataFrame({
+        "userID": np.arange(start_index + 1, start_index + num_users + 1, dtype=USER_ID_DTYPE),
+        "name": categorical(first_names[name_draws[0]], first_names),
+        "surname": categorical(last_names[name_draws[1]], last_names),
+        "clinical_gender": categorical(clinical_gender, user_probabilities.get("GENDER_PROBS")),
+        "age_range": categorical(age_range, user_probabilities.get("AGE_RANGE_PROBS")),
+        "lifestyle": categorical(lifestyle, user_probabilities.get("LIFESTYLE_PROBS")),
+        "country_of_origin": pd.Categorical.from_codes(origin, tables["countries"]),
+        "living_country": pd.Categorical.from_codes(living, tables["countries"]),
+        "current_location": pd.Categorical.from_codes(current_location, tables["city_names"]),
+        "liked_genres": bitmasks(liked_selected, GENRE_BIT_VALUES),
+        "disliked_genres": bitmasks(disliked_selected, GENRE_BIT_VALUES),
+        "current_working_status": categorical(working_status, [*user_probabilities.get("WORKING_STATUS_PROBS"), "Student", "Retired"]),
+        "marital_status": categorical(marital_status, [*user_probabilities.get("MARITAL_STATUS_PROBS"), "Single"]),
+        "ethnicity": categorical(ethnicity, user_probabilities.get("ETHNICITY_PROBS")),
+        "language_spoken": bitmasks(spoken, LANGUAGE_BIT_VALUES),
+        "award_hunter": award_hunter,
+        "hard_constraint": categorical(hard_constraint, HARD_CONSTRAINTS),
+    })
+
+
+def generate_users_vectorized(num_users, user_probabilities, start_index=0, seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate the same compact user table as generate_users, sampling users in batches with NumPy.
+
+    Names come from a shared pool drawn once with a single Faker instance, and the language
+    probabilities of every origin country are precomputed as one matrix.
+
+    :param seed: Optional seed, drawn from the random module when omitted.
+    :param batch_size: Number of users sampled at once, bounds the size of the temporary arrays.
+    """
+    return concat_users(list(iter_users_vectorized(num_users, user_probabilities, start_index=start_index, seed=seed, batch_size=batch_size)))
+
+
+def iter_users_vectorized(num_users, user_probabilities, start_index=0, seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the batches of generate_users_vectorized one by one, as they are sampled.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    rng = np.random.default_rng(seed)
+    name_pool = get_name_pool()
+
+    for batch_start in range(start_index, start_index + num_users, batch_size):
+        yield generate_user_batch(batch_start, min(batch_size, start_index + num_users - batch_start), user_probabilities, rng, name_pool)
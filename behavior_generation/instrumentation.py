@@ -0,0 +1,180 @@
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Instrumentation of the current run, None when instrumentation is off.
+_active = None
+
+
+def active_counters():
+    """
+    Counters of the current run, or None when instrumentation is off.
+
+    Hot loops fetch this once and only update it behind an `is not None` check,
+    so they cost next to nothing when instrumentation is off.
+    """
+    return _active.counters if _active is not None else None
+
+
+def count(name, amount=1):
+    """
+    Add amount to a counter of the current run, does nothing when instrumentation is off.
+    """
+    if _active is not None:
+        _active.counters[name] += amount
+
+
+def count_pool_picks(pool_name, amount=1):
+    if _active is not None:
+        _active.counters[f"picks.{pool_name}"] += amount
+
+
+def stage(name):
+    """
+    Context manager timing a stage of the current run, a no-op when instrumentation is off.
+    """
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def iterate(name, iterable):
+    """
+    Iterate over iterable, timing the time spent producing its items as a stage.
+    """
+    return _active.iterate(name, iterable) if _active is not None else iterable
+
+
+def max_rss_mb():
+    """
+    Peak resident memory of the process so far, or None where it cannot be read.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere.
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+class RunInstrumentation:
+    """
+    Records the wall time and peak memory of each stage and hot-path counters of one run.
+
+    Only one run is active at a time, between start() and stop() or inside a with block.
+    Stages can nest, and a stage entered several times accumulates its time. Peak memory
+    is traced with tracemalloc when trace_memory is set, which slows Python code down,
+    and the process peak resident memory is always recorded.
+    Work done in worker processes is timed as part of its stage, but its counters are not collected.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.counters = Counter()
+        self.stages = {}
+        self._stack = []
+        self._started = None
+        self._started_at = None
+        self._seconds = None
+
+    def start(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("Another run is already instrumented.")
+        _active = self
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started_at = datetime.now()
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        global _active
+        self._seconds = time.perf_counter() - self._started
+        if self.trace_memory:
+            tracemalloc.stop()
+        _active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def enter_stage(self, name):
+        if self.trace_memory:
+            if self._stack:
+                # The parent keeps the peak reached so far, before the peak is reset for the child.
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append({"name": name, "start": time.perf_counter(), "peak": 0})
+
+    def exit_stage(self):
+        frame = self._stack.pop()
+        seconds = time.perf_counter() - frame["start"]
+        peak = None
+        if self.trace_memory:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+
+        record = self.stages.setdefault(frame["name"], {"seconds": 0.0, "calls": 0, "peak_memory_mb": None, "max_rss_mb": None})
+        record["seconds"] += seconds
+        record["calls"] += 1
+        if peak is not None:
+            record["peak_memory_mb"] = max(record["peak_memory_mb"] or 0.0, peak / 2**20)
+        record["max_rss_mb"] = max_rss_mb()
+
+    def report(self, parameters=None):
+        """
+        Run report as a JSON-serializable dictionary.
+
+        Stage times include the time of the stages nested in them.
+
+        :param parameters: Optional run parameters to include.
+        """
+        return {
+            "started": self._started_at.isoformat(timespec="seconds") if self._started_at else None,
+            "total_seconds": self._seconds if self._seconds is not None else time.perf_counter() - self._started,
+            "trace_memory": self.trace_memory,
+            "max_rss_mb": max_rss_mb(),
+            "parameters": parameters or {},
+            "stages": self.stages,
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path, parameters=None):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(parameters), file, indent=4)
+
+
+class _Stage:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.instrumentation.enter_stage(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.exit_stage()
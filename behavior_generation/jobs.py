@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import traceback
+
+import pandas as pd
+
+from behavior_generation.generators.behavior_generator import iter_behavior_data
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.preference_store import save_preferences
+from behavior_generation.user_table import USER_LIST_SEPARATOR, format_user_ids, format_users
+from behavior_generation.writers import open_behavior_writer, write_users
+
+# Stages of a generation job, in the order they run.
+JOB_STAGES = ["preview", "users", "preferences", "behaviors"]
+JOB_STATUSES = ["pending", "running", "done", "cancelled", "failed"]
+
+# Users of the preview, generated with the job's settings before the full dataset.
+PREVIEW_USERS = 50
+# Rows of each preview DataFrame kept for display.
+PREVIEW_ROWS = 20
+# Users per behavior chunk, so progress and cancellation are checked within a day.
+JOB_USERS_PER_CHUNK = 2000
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's thread when the job is cancelled.
+    """
+
+
+class GenerationJob:
+    """
+    Generate users, preferences and behaviors in a background thread, reporting progress per stage.
+
+    The job first generates a small preview with the same settings, then the full dataset,
+    writing behavior chunks to the output files as they are generated. Cancellation is
+    checked between chunks, and the files written so far are kept.
+
+    :param catalog: MovieCatalog, shared with other jobs.
+    :param constraint_rules: Hard constraint rules, or ConstraintPools compiled against catalog.
+    :param outputs: Dictionary of "users", "preferences", "behaviors" and "config" output paths.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        constraint_rules,
+        user_probabilities,
+        num_users,
+        num_days,
+        outputs,
+        output_format="csv",
+        partition_by=None,
+        engine="vectorized",
+        seed=None,
+        start_date="2025-01-01",
+    ):
+        self.catalog = catalog
+        self.constraint_rules = constraint_rules
+        self.user_probabilities = user_probabilities
+        self.num_users = num_users
+        self.num_days = num_days
+        self.outputs = outputs
+        self.output_format = output_format
+        self.partition_by = partition_by
+        self.engine = engine
+        self.seed = seed
+        self.start_date = start_date
+
+        self.status = "pending"
+        self.progress = {stage: 0.0 for stage in JOB_STAGES}
+        self.preview = None
+        self.error = None
+        self.events_written = 0
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.status = "running"
+        self._thread = threading.Thread(target=self.run, name="generation-job", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """
+        Ask the job to stop, it does so at the next chunk.
+        """
+        self._cancel_event.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def finished(self):
+        return self.status in ["done", "cancelled", "failed"]
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def run(self):
+        try:
+            self.generate_preview()
+            self.generate()
+            self.status = "done"
+        except JobCancelled:
+            self.status = "cancelled"
+        except Exception:
+            self.error = traceback.format_exc()
+            self.status = "failed"
+
+    def generate_preview(self):
+        user_df = generate_users(min(PREVIEW_USERS, self.num_users), self.user_probabilities, engine=self.engine, seed=self.seed)
+        user_preferences = generate_multiple_user_preferences(format_user_ids(user_df["userID"]), engine=self.engine, seed=self.seed)
+        behavior_df = pd.concat(
+            list(iter_behavior_data(user_df, self.catalog, user_preferences, num_days=self.num_days, start_date=self.start_date, engine=self.engine, seed=self.seed, constraint_rules=self.constraint_rules)) or [pd.DataFrame()],
+            ignore_index=True,
+        )
+        self.preview = {"users": format_users(user_df.head(PREVIEW_ROWS), list_separator=USER_LIST_SEPARATOR), "behaviors": behavior_df.head(PREVIEW_ROWS)}
+        self.progress["preview"] = 1.0
+        self.check_cancelled()
+
+    def generate(self):
+        user_df = generate_users(self.num_users, self.user_probabilities, engine=self.engine, seed=self.seed)
+        write_users(user_df, self.outputs["users"], self.output_format)
+        self.progress["users"] = 1.0
+        self.check_cancelled()
+
+        user_preferences = generate_multiple_user_preferences(format_user_ids(user_df["userID"]), engine=self.engine, seed=self.seed)
+        save_preferences(user_preferences, self.outputs["preferences"], "json")
+        self.progress["preferences"] = 1.0
+        self.check_cancelled()
+
+        behavior_chunks = iter_behavior_data(
+            user_df,
+            self.catalog,
+            user_preferences,
+            num_days=self.num_days,
+            start_date=self.start_date,
+            engine=self.engine,
+            seed=self.seed,
+            users_per_chunk=JOB_USERS_PER_CHUNK,
+            constraint_rules=self.constraint_rules,
+        )
+        with open_behavior_writer(self.outputs["behaviors"], self.output_format, partition_by=self.partition_by) as writer:
+            for chunk in behavior_chunks:
+                writer.write(chunk)
+                self.events_written += len(chunk)
+                # Chunks come in day order, so the day of the latest chunk measures progress.
+                self.progress["behaviors"] = (int(chunk["day_number"].iloc[0]) + 1) / self.num_days
+                self.check_cancelled()
+        self.progress["behaviors"] = 1.0
+
+        os.makedirs(os.path.dirname(self.outputs["config"]) or ".", exist_ok=True)
+        with open(self.outputs["config"], "w", encoding="utf-8") as file:
+            json.dump(self.user_probabilities, file, indent=4)
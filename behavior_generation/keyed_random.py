@@ -0,0 +1,56 @@
+import hashlib
+
+import numpy as np
+
+# Independent random streams drawn for every (user, day).
+WATCH_STREAM = 0
+LOCATION_STREAM = 1
+COMPANION_STREAM = 2
+USER_MOOD_STREAM = 3
+TIME_OF_DAY_STREAM = 4
+MOVIE_STREAM = 5
+
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_MASK64 = 2**64 - 1
+
+
+def mix64(values):
+    """
+    SplitMix64 finalizer, a bijective avalanche mix of 64-bit integers.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def user_key(user_id):
+    """
+    Stable 64-bit key of a user ID, identical across processes and runs.
+    """
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def user_keys(user_ids):
+    return np.array([user_key(user_id) for user_id in user_ids], dtype=np.uint64)
+
+
+def keyed_uniform(seed, keys, day_number, stream):
+    """
+    Counter-based uniform draws in [0, 1), one per user key.
+
+    A draw depends only on (seed, user key, day_number, stream), so any user or
+    day range can be regenerated on its own and match the full run bit for bit.
+
+    :param seed: Non-negative integer seed of the run.
+    :param keys: Array of user keys from user_keys.
+    :param day_number: Simulated day number.
+    :param stream: One of the *_STREAM constants.
+    :return: Array of floats, one per key.
+    """
+    # Scalar parts are combined as Python ints, NumPy scalars would warn on the intended overflow.
+    stream_state = mix64([(seed ^ stream * _GOLDEN_GAMMA) & _MASK64])
+    day_offset = np.uint64(day_number * _GOLDEN_GAMMA & _MASK64)
+    state = mix64(stream_state ^ np.asarray(keys, dtype=np.uint64))
+    state = mix64(state + day_offset)
+    return (state >> np.uint64(11)) * 2.0**-53
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from behavior_generation.encoding import (
+    GENRE_BITS,
+    LANGUAGE_BITS,
+    GENRE_MASK_DTYPE,
+    LANGUAGE_MASK_DTYPE,
+)
+from behavior_generation.options import CACHE_DIRECTORY
+
+CATALOG_CACHE_VERSION = 1
+CATALOG_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "catalog")
+
+# Arrays saved in a catalog cache, one .npy file each.
+CATALOG_ARRAYS = [
+    "movie_ids",
+    "duration",
+    "imdb_rating",
+    "rotten_tomatoes_rating",
+    "having_award",
+    "number_of_rewatches",
+    "maturity_codes",
+    "genre_offsets",
+    "genre_codes",
+    "language_offsets",
+    "language_codes",
+]
+CATALOG_NAMES = ["maturity_names", "genre_names", "language_names"]
+
+
+def parse_percentages(values):
+    """
+    Parse ratings such as "81%" into floats, missing or malformed ratings become NaN.
+    """
+    return pd.to_numeric(pd.Series(values, dtype=object).astype(str).str.rstrip("%"), errors="coerce").to_numpy(dtype=np.float32)
+
+
+def encode_list_column(values, separator=", "):
+    """
+    Encode a column of separator-joined strings into flat integer codes with row offsets.
+
+    :param values: Iterable of strings such as "Action, Adventure".
+    :param separator: Separator used inside each string.
+    :return: (offsets, codes, names) where the codes of row i are codes[offsets[i]:offsets[i + 1]]
+             and names maps a code back to its string.
+    """
+    names = []
+    name_codes = {}
+    offsets = [0]
+    codes = []
+
+    for value in values:
+        for item in value.split(separator):
+            if item not in name_codes:
+                name_codes[item] = len(names)
+                names.append(item)
+            codes.append(name_codes[item])
+        offsets.append(len(codes))
+
+    return np.array(offsets, dtype=np.int32), np.array(codes, dtype=np.int16), names
+
+
+def encode_bitmasks(offsets, codes, names, bits, dtype):
+    """
+    Fold the per-row codes of an encoded list column into one bitmask per row.
+
+    Names without a bit in the vocabulary contribute nothing to the mask.
+    """
+    name_bits = np.array([bits.get(name, 0) for name in names], dtype=dtype)
+    if not len(codes):
+        return np.zeros(len(offsets) - 1, dtype=dtype)
+    return np.bitwise_or.reduceat(name_bits[codes], offsets[:-1])
+
+
+class MovieCatalog:
+    """
+    Columnar, array-backed view of the movie dataset.
+
+    Movies are addressed by their integer row index. Constraint pools and picks
+    work on those indices, so no per-movie Python objects are kept around.
+    Genres and languages are additionally available as bitmasks for scoring.
+    """
+
+    def __init__(
+        self,
+        movie_ids,
+        duration,
+        imdb_rating,
+        having_award,
+        number_of_rewatches,
+        maturity_codes,
+        maturity_names,
+        genre_offsets,
+        genre_codes,
+        genre_names,
+        language_offsets,
+        language_codes,
+        language_names,
+        rotten_tomatoes_rating=None,
+    ):
+        self.movie_ids = movie_ids
+        self.duration = duration
+        self.imdb_rating = imdb_rating
+        self.having_award = having_award
+        self.number_of_rewatches = number_of_rewatches
+        self.maturity_codes = maturity_codes
+        self.maturity_names = maturity_names
+        self.genre_offsets = genre_offsets
+        self.genre_codes = genre_codes
+        self.genre_names = genre_names
+        self.language_offsets = language_offsets
+        self.language_codes = language_codes
+        self.language_names = language_names
+        self.rotten_tomatoes_rating = (
+            np.full(len(movie_ids), np.nan, dtype=np.float32) if rotten_tomatoes_rating is None else rotten_tomatoes_rating
+        )
+        # Set when the catalog is memory-mapped from a cache directory.
+        self.cache_directory = None
+
+        self.genre_count = np.diff(genre_offsets).astype(np.int16)
+        self.genre_bitmask = encode_bitmasks(genre_offsets, genre_codes, genre_names, GENRE_BITS, GENRE_MASK_DTYPE)
+        self.language_bitmask = encode_bitmasks(language_offsets, language_codes, language_names, LANGUAGE_BITS, LANGUAGE_MASK_DTYPE)
+
+    @classmethod
+    def from_dataframe(cls, movies_df):
+        """
+        Build a catalog from the pipe-separated movie DataFrame.
+        """
+        maturity = pd.Categorical(movies_df["maturityRating"])
+        genre_offsets, genre_codes, genre_names = encode_list_column(movies_df["genres"])
+        language_offsets, language_codes, language_names = encode_list_column(movies_df["language"])
+
+        return cls(
+            movie_ids=movies_df["movieId"].to_numpy(dtype=str),
+            duration=movies_df["duration"].to_numpy(dtype=np.float32),
+            imdb_rating=movies_df["imdbRating"].to_numpy(dtype=np.float64),
+            having_award=movies_df["havingAward"].to_numpy(dtype=np.int8),
+            number_of_rewatches=movies_df["numberOfRewatches"].to_numpy(dtype=np.int16),
+            maturity_codes=maturity.codes.astype(np.int8),
+            maturity_names=list(maturity.categories),
+            genre_offsets=genre_offsets,
+            genre_codes=genre_codes,
+            genre_names=genre_names,
+            language_offsets=language_offsets,
+            language_codes=language_codes,
+            language_names=language_names,
+            rotten_tomatoes_rating=parse_percentages(movies_df["rottenTomatoesRating"]),
+        )
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Load a catalog saved by save, memory-mapping its arrays by default.
+        """
+        with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as file:
+            metadata = json.load(file)
+        if metadata.get("version") != CATALOG_CACHE_VERSION:
+            raise ValueError(f"Unsupported movie catalog cache version {metadata.get('version')} in '{directory}'.")
+
+        catalog = cls(
+            **{name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in CATALOG_ARRAYS},
+            **{name: metadata[name] for name in CATALOG_NAMES},
+        )
+        catalog.cache_directory = directory
+        return catalog
+
+    def save(self, directory):
+        """
+        Save the catalog as one .npy file per array plus a JSON metadata file with the category names.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in CATALOG_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name)))
+        metadata = {"version": CATALOG_CACHE_VERSION, **{name: list(getattr(self, name)) for name in CATALOG_NAMES}}
+        with open(os.path.join(directory, "metadata.json"), "w", encoding="utf-8") as file:
+            json.dump(metadata, file, indent=4)
+
+    def __reduce_ex__(self, protocol):
+        # A cached catalog is sent to worker processes as its directory, and memory-mapped there.
+        if self.cache_directory is not None:
+            return MovieCatalog.load, (self.cache_directory,)
+        return super().__reduce_ex__(protocol)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def maturity_mask(self, maturity_ratings):
+        """
+        Boolean mask of movies whose maturity rating is one of maturity_ratings.
+        """
+        codes = [code for code, name in enumerate(self.maturity_names) if name in maturity_ratings]
+        return np.isin(self.maturity_codes, codes)
+
+    def genre_mask(self, predicate):
+        """
+        Boolean mask of movies having at least one genre for which predicate(genre) is true.
+        """
+        matching_codes = np.array([predicate(name) for name in self.genre_names], dtype=bool)
+        hits = matching_codes[self.genre_codes].astype(np.int32)
+        return np.add.reduceat(hits, self.genre_offsets[:-1]) > 0
+
+    def genres(self, index):
+        """
+        Genres of the movie at row index, as the original comma-separated string.
+        """
+        codes = self.genre_codes[self.genre_offsets[index]:self.genre_offsets[index + 1]]
+        return ", ".join(self.genre_names[code] for code in codes)
+
+    def languages(self, index):
+        """
+        Languages of the movie at row index, as the original comma-separated string.
+        """
+        codes = self.language_codes[self.language_offsets[index]:self.language_offsets[index + 1]]
+        return ", ".join(self.language_names[code] for code in codes)
+
+    def record(self, index):
+        """
+        Materialize the movie at row index as a dictionary with the fields used downstream.
+        """
+        return {
+            "movieId": str(self.movie_ids[index]),
+            "genres": self.genres(index),
+            "language": self.languages(index),
+            "imdbRating": float(self.imdb_rating[index]),
+            "numberOfRewatches": int(self.number_of_rewatches[index]),
+            "havingAward": int(self.having_award[index]),
+        }
+
+
+def file_digest(path, block_size=1 << 20):
+    """
+    SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_movie_catalog(movie_data_file, use_cache=True):
+    """
+    Load the movie CSV as a MovieCatalog, through a binary cache in the user cache directory.
+
+    The cache lives in CATALOG_CACHE_DIRECTORY/<cache version>-<sha256 of the CSV>/, outside the
+    package, which may be installed read-only. Keyed by content, it is shared by every copy of
+    the same CSV, and editing the CSV invalidates it. On a miss the CSV is parsed once, and the
+    cache is written to a temporary directory then renamed into place, so concurrent runs never
+    read a partial cache. Later runs memory-map the arrays instead of parsing text. When the cache
+    cannot be written, the parsed catalog is returned as is.
+
+    :param use_cache: Set to False to always parse the CSV.
+    """
+    if not use_cache:
+        return MovieCatalog.from_dataframe(pd.read_csv(movie_data_file, sep="|"))
+
+    cache_directory = os.path.join(CATALOG_CACHE_DIRECTORY, f"{CATALOG_CACHE_VERSION}-{file_digest(movie_data_file)}")
+    if os.path.isfile(os.path.join(cache_directory, "metadata.json")):
+        return MovieCatalog.load(cache_directory)
+
+    catalog = MovieCatalog.from_dataframe(pd.read_csv(movie_data_file, sep="|"))
+    try:
+        os.makedirs(CATALOG_CACHE_DIRECTORY, exist_ok=True)
+        temporary_directory = tempfile.mkdtemp(dir=CATALOG_CACHE_DIRECTORY, prefix=".tmp-")
+        catalog.save(temporary_directory)
+        try:
+            os.rename(temporary_directory, cache_directory)
+        except OSError:
+            # Another run wrote the same cache first.
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+    except OSError:
+        return catalog
+    return MovieCatalog.load(cache_directory)
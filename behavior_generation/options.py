@@ -0,0 +1,42 @@
+# Choices and defaults of the command line options, kept free of heavy imports so the
+# command line can parse its arguments, and print --help, without loading pandas or NumPy.
+
+import os
+
+# Data files shipped with the package, found wherever it is installed.
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_MOVIE_DATA_FILE = os.path.join(DATA_DIRECTORY, "movie_data.csv")
+DEFAULT_USER_PROBABILITIES_FILE = os.path.join(DATA_DIRECTORY, "default_user_probabilities.json")
+DEFAULT_CONSTRAINT_RULES_FILE = os.path.join(DATA_DIRECTORY, "hard_constraint_rules.json")
+
+# Per-user cache directory, outside the package, which may be installed read-only.
+CACHE_DIRECTORY = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "behavior_generation")
+
+USER_ENGINES = ["python", "vectorized"]
+PREFERENCE_ENGINES = ["python", "vectorized"]
+BEHAVIOR_ENGINES = ["python", "vectorized"]
+SAMPLING_MODES = ["daily", "count_then_place"]
+
+PREFERENCE_FORMATS = ["json", "jsonl", "store"]
+OUTPUT_FORMATS = ["csv", "parquet"]
+# Formats the users command streams to, a file or standard output.
+USER_STREAM_FORMATS = ["csv", "jsonl"]
+# Formats of user files the behaviors command reads.
+USER_FILE_FORMATS = ["csv", "jsonl", "parquet"]
+PARTITION_COLUMNS = ["date", "season"]
+DEFAULT_ROW_GROUP_SIZE = 1_000_000
+
+DEFAULT_SHARD_SIZE = 1000
+
+# Users and preferences generated, and written, at a time by the streaming generators.
+DEFAULT_BATCH_SIZE = 100_000
+
+# Output path standing for standard output, so generated data can be piped into other tools.
+STDOUT_PATH = "-"
+
+# Days simulated between checkpoints.
+DEFAULT_CHECKPOINT_DAYS = 30
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SERVER_WORKERS = 4
@@ -0,0 +1,258 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from behavior_generation.generators.user_generator import generate_users, seed_python_engine
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.behavior_generator import generate_behavior_data
+from behavior_generation.generators.hard_constraints import as_movie_catalog
+from behavior_generation.preference_store import PreferenceStore
+from behavior_generation.user_table import compact_users, concat_users, format_user_ids
+from behavior_generation.watch_history import WatchHistory
+from behavior_generation.options import DEFAULT_SHARD_SIZE
+
+# Shards have a fixed size, so a shard's seed and content never depend on the number of workers.
+DEFAULT_DAYS_PER_BLOCK = 30
+
+STAGE_KEYS = {
+    "users": 0,
+    "preferences": 1,
+    "behaviors": 2,
+}
+
+# Movie catalog and compiled constraint pools of the current worker process, set once by init_worker.
+_worker_catalog = None
+_worker_constraint_rules = None
+
+
+def derive_seed(seed, stage, *indices):
+    """
+    Derive the seed of one shard of a stage from the master seed.
+
+    :param seed: Master seed of the run.
+    :param stage: Stage name, one of STAGE_KEYS.
+    :param indices: Shard index, and for behaviors of the python engine the first day number of the day block.
+    :return: A 64-bit integer seed.
+    """
+    words = np.random.SeedSequence(seed, spawn_key=(STAGE_KEYS[stage], *indices)).generate_state(2)
+    return int(words[0]) << 32 | int(words[1])
+
+
+def shard_ranges(num_items, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Split range(num_items) into consecutive (start, stop) shards.
+    """
+    return [(start, min(start + shard_size, num_items)) for start in range(0, num_items, shard_size)]
+
+
+def init_worker(catalog, constraint_rules=None):
+    """
+    Keep the movie catalog and constraint pools in the worker, so they are sent once per worker rather than once per task.
+    """
+    global _worker_catalog, _worker_constraint_rules
+    _worker_catalog = catalog
+    _worker_constraint_rules = constraint_rules
+
+
+def run_tasks(function, tasks, workers, catalog=None):
+    """
+    Run function over tasks, in a process pool when workers > 1, returning results in task order.
+    """
+    if workers <= 1 or not tasks:
+        init_worker(catalog)
+        return [function(*task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(catalog,)) as executor:
+        return list(executor.map(function, *zip(*tasks)))
+
+
+def generate_user_shard(start, stop, user_probabilities, engine, seed):
+    seed_python_engine(seed)
+    return generate_users(stop - start, user_probabilities, start_index=start, engine=engine, seed=seed)
+
+
+def generate_preference_shard(user_ids, engine, seed):
+    random.seed(seed)
+    return generate_multiple_user_preferences(user_ids, engine=engine, seed=seed)
+
+
+def generate_behavior_shard(users, user_preferences, first_day, num_days, start_date, engine, sampling, seed, watch_history, random_state):
+    if random_state is not None:
+        # The python engine continues a block started by an earlier task, from its random state.
+        random.setstate(random_state)
+        seed = None
+    behavior_df = generate_behavior_data(
+        users,
+        _worker_catalog,
+        user_preferences,
+        num_days=num_days,
+        start_date=start_date,
+        engine=engine,
+        seed=seed,
+        first_day=first_day,
+        sampling=sampling,
+        watch_history=watch_history,
+        constraint_rules=_worker_constraint_rules,
+    )
+    return behavior_df, watch_history, random.getstate()
+
+
+def generate_users_parallel(num_users, user_probabilities, seed, workers=1, shard_size=DEFAULT_SHARD_SIZE, engine="python"):
+    """
+    Generate users shard by shard, each shard seeded from the master seed.
+
+    :return: The same DataFrame as generate_users, identical for a given seed whatever the number of workers.
+    """
+    tasks = [
+        (start, stop, user_probabilities, engine, derive_seed(seed, "users", shard))
+        for shard, (start, stop) in enumerate(shard_ranges(num_users, shard_size))
+    ]
+    return concat_users(run_tasks(generate_user_shard, tasks, workers))
+
+
+def generate_preferences_parallel(user_ids, seed, workers=1, shard_size=DEFAULT_SHARD_SIZE, engine="python"):
+    """
+    Generate user preferences shard by shard, each shard seeded from the master seed.
+
+    :return: The same dictionary as generate_multiple_user_preferences, or the same
+             PreferenceStore with the vectorized engine.
+    """
+    user_ids = list(user_ids)
+    tasks = [
+        (user_ids[start:stop], engine, derive_seed(seed, "preferences", shard))
+        for shard, (start, stop) in enumerate(shard_ranges(len(user_ids), shard_size))
+    ]
+    shard_preferences = run_tasks(generate_preference_shard, tasks, workers)
+    if engine == "vectorized":
+        return PreferenceStore.concatenate(shard_preferences) if shard_preferences else PreferenceStore.from_dict({})
+
+    all_preferences = {}
+    for preferences in shard_preferences:
+        all_preferences.update(preferences)
+    return all_preferences
+
+
+def iter_behavior_data_parallel(
+    users,
+    movies,
+    user_preferences,
+    seed,
+    num_days=30,
+    start_date="2025-01-01",
+    engine="python",
+    workers=1,
+    shard_size=DEFAULT_SHARD_SIZE,
+    days_per_block=DEFAULT_DAYS_PER_BLOCK,
+    sampling="daily",
+    first_day=0,
+    watch_histories=None,
+    random_states=None,
+    constraint_rules=None,
+):
+    """
+    Generate behavior data for user shards in a process pool, yielding one merged chunk per day.
+
+    Work is split into (user shard, block of days) tasks, blocks being aligned to multiples of
+    days_per_block from day 0, so the output only depends on the seed and the shard size,
+    whatever days a call starts and ends at. With the python engine each block of a shard is
+    seeded from the master seed and the block's first day, and a block split between calls
+    continues from the shard's random state. The vectorized engine keys its draws by user and
+    day already, so its tasks all use the master seed and match a single-process run exactly.
+    Event counts of the count_then_place sampling mode are not keyed by user, so each shard is
+    seeded from the master seed, its windows of days being drawn independently.
+    Shard outputs are merged in date order, with users in their original order within a day.
+    Only one block of days is held in memory at a time.
+
+    :param first_day: Day number of the first simulated day, start_date being day 0.
+    :param watch_histories: Optional dictionary of shard index to the WatchHistory of the shard's
+        users before first_day. It is updated as blocks complete, so it can be passed on to a later call.
+    :param random_states: Optional dictionary of shard index to the random state the python engine
+        left the shard in, updated like watch_histories. A call starting inside a block needs it.
+    :param constraint_rules: Optional hard constraint rules as returned by load_constraint_rules.
+    """
+    catalog = as_movie_catalog(movies)
+    users = compact_users(users)
+    shards = shard_ranges(len(users), shard_size)
+    last_day = first_day + num_days
+    block_starts = sorted({first_day, *range(first_day - first_day % days_per_block + days_per_block, last_day, days_per_block)})
+    blocks = [(start, stop - start) for start, stop in zip(block_starts, block_starts[1:] + [last_day]) if stop > start]
+    shard_inputs = []
+    for start, stop in shards:
+        shard_users = users.iloc[start:stop]
+        shard_inputs.append((shard_users, {user_id: user_preferences[user_id] for user_id in format_user_ids(shard_users["userID"])}))
+    if watch_histories is None:
+        watch_histories = {}
+    if random_states is None:
+        random_states = {}
+
+    def shard_task(block_index, shard):
+        block_start, block_days = blocks[block_index]
+        aligned_start = block_start - block_start % days_per_block
+        random_state = None
+        if engine != "python":
+            task_seed = seed if sampling == "daily" else derive_seed(seed, "behaviors", shard)
+        else:
+            task_seed = derive_seed(seed, "behaviors", shard, aligned_start)
+            if block_start != aligned_start:
+                if shard not in random_states:
+                    raise ValueError(f"Continuing the block of day {aligned_start} at day {block_start} needs the random state of shard {shard}.")
+                random_state = random_states[shard]
+        return (
+            *shard_inputs[shard],
+            block_start,
+            block_days,
+            start_date,
+            engine,
+            sampling,
+            task_seed,
+            watch_histories[shard] if shard in watch_histories else WatchHistory(),
+            random_state,
+        )
+
+    def collect_result(shard, result):
+        shard_df, watch_histories[shard], random_state = result
+        if engine == "python":
+            random_states[shard] = random_state
+        return shard_df
+
+    if workers <= 1:
+        init_worker(catalog, constraint_rules)
+
+        def run_blocks():
+            for block_index in range(len(blocks)):
+                yield [collect_result(shard, generate_behavior_shard(*shard_task(block_index, shard))) for shard in range(len(shards))]
+
+        yield from merge_block_results(run_blocks())
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(catalog, constraint_rules)) as executor:
+        def collect():
+            # A shard's next block needs its updated watch history, so it is submitted as soon
+            # as the shard's current block is collected, keeping the workers busy.
+            pending = [executor.submit(generate_behavior_shard, *shard_task(0, shard)) for shard in range(len(shards))] if blocks else []
+            for block_index in range(len(blocks)):
+                shard_dfs = []
+                upcoming = []
+                for shard, future in enumerate(pending):
+                    shard_dfs.append(collect_result(shard, future.result()))
+                    if block_index + 1 < len(blocks):
+                        upcoming.append(executor.submit(generate_behavior_shard, *shard_task(block_index + 1, shard)))
+                yield shard_dfs
+                pending = upcoming
+
+        yield from merge_block_results(collect())
+
+
+def merge_block_results(block_results):
+    """
+    Merge the per-shard DataFrames of each day block into one chunk per day, in date order.
+    """
+    for shard_dfs in block_results:
+        shard_dfs = [shard_df for shard_df in shard_dfs if len(shard_df)]
+        if not shard_dfs:
+            continue
+        block_df = pd.concat(shard_dfs, ignore_index=True).sort_values("day_number", kind="stable")
+        for _, day_df in block_df.groupby("day_number", sort=True):
+            yield day_df.reset_index(drop=True)
@@ -0,0 +1,248 @@
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from behavior_generation.data.preference_categories import (
+    COMPANIONS,
+    SEASONS,
+    DAYS_OF_WEEK,
+    TIMES_OF_DAY,
+    LOCATIONS,
+)
+from behavior_generation.generators.satisfaction_calculator import SATISFACTION_FACTORS
+from behavior_generation.utils import LRUCache, open_output
+from behavior_generation.options import PREFERENCE_FORMATS
+
+# Columns of each preference matrix, in the order generate_single_user_preferences produces them.
+PREFERENCE_CATEGORIES = {
+    "COMPANION_PROBS": COMPANIONS,
+    "SEASON_PROBS": SEASONS,
+    "DAY_OF_WEEK_PROBS": DAYS_OF_WEEK,
+    "TIME_OF_DAY_PROBS": TIMES_OF_DAY,
+    "LOCATION_PROBS": LOCATIONS,
+    "SATISFACTION_WEIGHTS": SATISFACTION_FACTORS,
+}
+
+STORE_FORMAT_VERSION = 1
+METADATA_FILE = "metadata.json"
+JSON_LINES_EXTENSION = ".jsonl"
+
+# Per-user dictionaries kept by a store, so repeated lookups reuse the same objects and their cached samplers.
+USER_VIEW_CACHE_SIZE = 16384
+
+
+class PreferenceStore(Mapping):
+    """
+    Struct-of-arrays store of user preferences.
+
+    Each preference distribution is one (users x categories) float matrix, and the watch
+    tendency is one vector. Looking up a user ID returns the same nested dictionary as
+    generate_single_user_preferences, so the store can be used wherever the preference
+    dictionary is expected.
+    """
+
+    def __init__(self, user_ids, watch_tendency, matrices):
+        """
+        :param user_ids: Array of user IDs, one per row.
+        :param watch_tendency: Integer vector of watch tendencies, one per row.
+        :param matrices: Dictionary of (users x categories) matrices keyed like PREFERENCE_CATEGORIES.
+        """
+        self.user_ids = user_ids
+        self.watch_tendency = watch_tendency
+        self.matrices = matrices
+        self._rows = None
+        self._views = LRUCache(USER_VIEW_CACHE_SIZE)
+
+    @classmethod
+    def from_dict(cls, user_preferences):
+        """
+        Build a store from the preference dictionary of generate_multiple_user_preferences.
+        """
+        user_ids = list(user_preferences)
+        matrices = {
+            key: np.array(
+                [[user_preferences[user_id][key].get(category, 0) for category in categories] for user_id in user_ids],
+                dtype=np.float64,
+            ).reshape(len(user_ids), len(categories))
+            for key, categories in PREFERENCE_CATEGORIES.items()
+        }
+        return cls(
+            user_ids=np.array(user_ids, dtype=str),
+            watch_tendency=np.array([user_preferences[user_id]["WATCH_TENDENCY"] for user_id in user_ids], dtype=np.int8),
+            matrices=matrices,
+        )
+
+    @classmethod
+    def concatenate(cls, stores):
+        """
+        Stack the rows of several stores, in order, into one store.
+        """
+        return cls(
+            user_ids=np.concatenate([store.user_ids for store in stores]),
+            watch_tendency=np.concatenate([store.watch_tendency for store in stores]),
+            matrices={key: np.concatenate([store.matrices[key] for store in stores]) for key in PREFERENCE_CATEGORIES},
+        )
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Load a store saved by save, memory-mapping its arrays by default.
+
+        Rows are only read from disk when they are accessed.
+        """
+        with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as file:
+            metadata = json.load(file)
+        if metadata.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported preference store version {metadata.get('version')} in '{directory}'.")
+        if metadata.get("categories") != PREFERENCE_CATEGORIES:
+            raise ValueError(f"Preference store '{directory}' was saved with different categories.")
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        return cls(
+            user_ids=load_array("user_ids"),
+            watch_tendency=load_array("WATCH_TENDENCY"),
+            matrices={key: load_array(key) for key in PREFERENCE_CATEGORIES},
+        )
+
+    def save(self, directory):
+        """
+        Save the store as one .npy file per array plus a small JSON metadata file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "user_ids.npy"), np.asarray(self.user_ids, dtype=str))
+        np.save(os.path.join(directory, "WATCH_TENDENCY.npy"), np.asarray(self.watch_tendency))
+        for key, matrix in self.matrices.items():
+            np.save(os.path.join(directory, f"{key}.npy"), np.asarray(matrix))
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as file:
+            json.dump({"version": STORE_FORMAT_VERSION, "num_users": len(self), "categories": PREFERENCE_CATEGORIES}, file, indent=4)
+
+    def rows(self, user_ids):
+        """
+        Row indices of the given user IDs.
+        """
+        if self._rows is None:
+            self._rows = {str(user_id): row for row, user_id in enumerate(self.user_ids)}
+        return np.array([self._rows[str(user_id)] for user_id in user_ids], dtype=np.intp)
+
+    def matrix(self, key, user_ids=None):
+        """
+        Preference matrix of key, restricted to the rows of user_ids in that order when given.
+        """
+        matrix = self.matrices[key]
+        return np.asarray(matrix if user_ids is None else matrix[self.rows(user_ids)])
+
+    def to_dict(self):
+        """
+        Materialize the store as the nested preference dictionary.
+        """
+        return dict(zip((str(user_id) for user_id in self.user_ids), self.to_list()))
+
+    def to_list(self, user_ids=None):
+        """
+        Nested preference dictionaries of every user, or of user_ids in that order, built in bulk.
+
+        Each matrix is converted to Python floats once, rather than row by row.
+        """
+        rows = slice(None) if user_ids is None else self.rows(user_ids)
+        watch_tendency = np.asarray(self.watch_tendency)[rows].tolist()
+        columns = {key: np.asarray(self.matrices[key])[rows].tolist() for key in PREFERENCE_CATEGORIES}
+        return [
+            {"WATCH_TENDENCY": tendency, **{key: dict(zip(categories, columns[key][index])) for key, categories in PREFERENCE_CATEGORIES.items()}}
+            for index, tendency in enumerate(watch_tendency)
+        ]
+
+    def build_user_preferences(self, row):
+        preferences = {"WATCH_TENDENCY": int(self.watch_tendency[row])}
+        for key, categories in PREFERENCE_CATEGORIES.items():
+            preferences[key] = dict(zip(categories, self.matrices[key][row].tolist()))
+        return preferences
+
+    def __getitem__(self, user_id):
+        preferences = self._views.get(user_id)
+        if preferences is None:
+            preferences = self.build_user_preferences(self.rows([user_id])[0])
+            self._views.put(user_id, preferences)
+        return preferences
+
+    def __iter__(self):
+        return (str(user_id) for user_id in self.user_ids)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id):
+        try:
+            self.rows([user_id])
+        except KeyError:
+            return False
+        return True
+
+
+def save_preferences(user_preferences, path, preference_format="json"):
+    """
+    Save user preferences as an indented JSON file, a JSON Lines file, or as a PreferenceStore directory.
+
+    :param preference_format: "json", "jsonl" or "store".
+    """
+    save_preference_batches([user_preferences], path, preference_format)
+
+
+def save_preference_batches(batches, path, preference_format="json"):
+    """
+    Save batches of user preferences, e.g. from iter_user_preferences, as one preference file.
+
+    JSON and JSON Lines are written batch by batch, so a generator of batches is saved in constant
+    memory, and path can be STDOUT_PATH. JSON Lines hold one object per user, with its ID as "userID".
+    A store is built from every batch before it is saved.
+
+    :param batches: Iterable of preference dictionaries or PreferenceStores.
+    :param preference_format: "json", "jsonl" or "store".
+    :return: The number of users saved.
+    """
+    if preference_format == "store":
+        stores = [batch if isinstance(batch, PreferenceStore) else PreferenceStore.from_dict(batch) for batch in batches]
+        store = PreferenceStore.concatenate(stores) if stores else PreferenceStore.from_dict({})
+        store.save(path)
+        return len(store)
+    if preference_format not in PREFERENCE_FORMATS:
+        raise ValueError(f"Unknown preference format '{preference_format}'. Expected one of {PREFERENCE_FORMATS}.")
+
+    num_users = 0
+    with open_output(path) as file:
+        if preference_format == "json":
+            # Same text as json.dump(user_preferences, file, indent=4), one user at a time.
+            file.write("{")
+        for batch in batches:
+            if isinstance(batch, PreferenceStore):
+                batch = batch.to_dict()
+            for user_id, preferences in batch.items():
+                if preference_format == "jsonl":
+                    file.write(json.dumps({"userID": user_id, **preferences}) + "\n")
+                else:
+                    entry = json.dumps(preferences, indent=4).replace("\n", "\n    ")
+                    file.write(f"{',' if num_users else ''}\n    {json.dumps(user_id)}: {entry}")
+                num_users += 1
+        if preference_format == "json":
+            file.write("\n}" if num_users else "}")
+    return num_users
+
+
+def load_preferences(path):
+    """
+    Load user preferences saved by save_preferences, lazily when path is a PreferenceStore directory.
+    """
+    if os.path.isdir(path):
+        return PreferenceStore.load(path)
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith(JSON_LINES_EXTENSION):
+            user_preferences = {}
+            for line in file:
+                if line.strip():
+                    preferences = json.loads(line)
+                    user_preferences[preferences.pop("userID")] = preferences
+            return user_preferences
+        return json.load(file)
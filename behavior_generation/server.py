@@ -0,0 +1,237 @@
+import json
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from behavior_generation.generators.behavior_generator import iter_behavior_data
+from behavior_generation.generators.hard_constraints import get_filtered_movies, load_constraint_rules
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.generators.vectorized_user_generator import get_name_pool
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_SERVER_WORKERS
+from behavior_generation.user_table import USER_LIST_SEPARATOR, format_user_ids, iter_formatted_users
+
+# Requests larger than this are rejected, a request only holds a few parameters and probability overrides.
+MAX_REQUEST_BYTES = 1 << 20
+# Seconds an idle connection keeps its worker thread.
+CONNECTION_TIMEOUT = 30
+
+# Columns of behavior CSV output, written as the header of a dataset without events.
+BEHAVIOR_COLUMNS = [
+    "day_number",
+    "date",
+    "season",
+    "day_of_week",
+    "time_of_day",
+    "userId",
+    "movieId",
+    "location",
+    "companions",
+    "user_mood",
+    "satisfaction_score",
+]
+
+# Endpoint of each dataset a request can ask for.
+DATASET_ENDPOINTS = {"/users": "users", "/behaviors": "behaviors"}
+
+
+class GenerationService:
+    """
+    Movie catalog, user probabilities and compiled constraint pools, loaded once to serve many requests.
+
+    Requests run the vectorized engines, whose draws only depend on the request seed. So
+    concurrent requests share no random state, and a request returns the same data as
+    scripts/generate_behaviors.py with --engine vectorized and the same seed.
+    """
+
+    def __init__(self, movie_data_file, user_probabilities_file, constraint_rules_file, use_catalog_cache=True):
+        self.catalog = load_movie_catalog(movie_data_file, use_cache=use_catalog_cache)
+        with open(user_probabilities_file, "r", encoding="utf-8") as file:
+            self.user_probabilities = json.load(file)
+        self.constraint_pools = get_filtered_movies(self.catalog, load_constraint_rules(constraint_rules_file))
+        # Drawn on first use otherwise, by the first request.
+        get_name_pool()
+
+    def parse_request(self, request):
+        """
+        Validate the parameters of a generation request, filling in defaults.
+
+        :param request: Dictionary with num_users, num_days, start_date, seed, users_per_chunk and
+            probabilities, a dictionary replacing some distributions of the user probabilities.
+        :return: Dictionary of parameters for iter_csv.
+        :raises ValueError: When a parameter is unknown or invalid.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("The request body must be a JSON object.")
+        unknown = set(request) - {"num_users", "num_days", "start_date", "seed", "users_per_chunk", "probabilities"}
+        if unknown:
+            raise ValueError(f"Unknown request parameters {sorted(unknown)}.")
+
+        parameters = {
+            "num_users": request.get("num_users", 100),
+            "num_days": request.get("num_days", 30),
+            "start_date": request.get("start_date", "2025-01-01"),
+            "seed": request.get("seed"),
+            "users_per_chunk": request.get("users_per_chunk"),
+        }
+        for name in ["num_users", "num_days", "users_per_chunk"]:
+            value = parameters[name]
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                raise ValueError(f"'{name}' must be a positive integer.")
+        if parameters["seed"] is None:
+            parameters["seed"] = random.randrange(2**32)
+        elif not isinstance(parameters["seed"], int) or isinstance(parameters["seed"], bool) or parameters["seed"] < 0:
+            raise ValueError("'seed' must be a non-negative integer.")
+        if not isinstance(parameters["start_date"], str):
+            raise ValueError("'start_date' must be a YYYY-MM-DD string.")
+        datetime.strptime(parameters["start_date"], "%Y-%m-%d")
+
+        overrides = request.get("probabilities", {})
+        if not isinstance(overrides, dict):
+            raise ValueError("'probabilities' must be a JSON object of probability distributions.")
+        unknown = set(overrides) - set(self.user_probabilities)
+        if unknown:
+            raise ValueError(f"Unknown probability distributions {sorted(unknown)}. Expected some of {sorted(self.user_probabilities)}.")
+        for name, distribution in overrides.items():
+            if not isinstance(distribution, dict) or not distribution:
+                raise ValueError(f"'{name}' must be a non-empty JSON object of option weights.")
+            weights = list(distribution.values())
+            if any(not isinstance(weight, (int, float)) or isinstance(weight, bool) or not math.isfinite(weight) or weight < 0 for weight in weights) or sum(weights) <= 0:
+                raise ValueError(f"The weights of '{name}' must be non-negative numbers with a positive total.")
+        parameters["user_probabilities"] = {**self.user_probabilities, **overrides}
+        return parameters
+
+    def iter_csv(self, dataset, parameters):
+        """
+        Generate a dataset as pipe-separated CSV text, in the format of the files the scripts write.
+
+        :param dataset: "users", or "behaviors" of the users generated from the same parameters.
+        :param parameters: Parameters returned by parse_request.
+        :return: Generator of CSV text pieces, one per chunk of users or behaviors, the first one with the header.
+        """
+        seed = parameters["seed"]
+        user_df = generate_users(parameters["num_users"], parameters["user_probabilities"], engine="vectorized", seed=seed)
+        if dataset == "users":
+            for index, chunk in enumerate(iter_formatted_users(user_df, USER_LIST_SEPARATOR)):
+                yield chunk.to_csv(index=False, sep="|", header=index == 0)
+            return
+
+        user_preferences = generate_multiple_user_preferences(format_user_ids(user_df["userID"]), engine="vectorized", seed=seed)
+        behavior_chunks = iter_behavior_data(
+            user_df,
+            self.catalog,
+            user_preferences,
+            num_days=parameters["num_days"],
+            start_date=parameters["start_date"],
+            engine="vectorized",
+            seed=seed,
+            users_per_chunk=parameters["users_per_chunk"],
+            constraint_rules=self.constraint_pools,
+        )
+        header = True
+        for chunk in behavior_chunks:
+            yield chunk.to_csv(index=False, sep="|", header=header)
+            header = False
+        if header:
+            # No event at all, the header still describes the empty dataset.
+            yield "|".join(BEHAVIOR_COLUMNS) + "\n"
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve GET /health, and POST /users or /behaviors with a JSON body of request parameters.
+
+    Datasets are streamed back with chunked transfer encoding as they are generated.
+    The seed of the response is in its X-Seed header.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = CONNECTION_TIMEOUT
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Unknown endpoint '{self.path}'."})
+            return
+        self.send_json(200, {"status": "ok", "movies": len(self.server.service.catalog)})
+
+    def do_POST(self):
+        dataset = DATASET_ENDPOINTS.get(self.path)
+        if dataset is None:
+            self.send_json(404, {"error": f"Unknown endpoint '{self.path}'. Expected one of {list(DATASET_ENDPOINTS)}."})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_BYTES:
+            self.send_json(413, {"error": f"Request bodies are limited to {MAX_REQUEST_BYTES} bytes."})
+            self.close_connection = True
+            return
+
+        service = self.server.service
+        try:
+            parameters = service.parse_request(json.loads(self.rfile.read(length) or b"{}"))
+            pieces = service.iter_csv(dataset, parameters)
+            # Generating the first piece before answering reports invalid probabilities as a bad request.
+            first_piece = next(pieces)
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+            return
+        except Exception:
+            # Answer before the traceback is logged, so the client does not get an empty reply.
+            self.send_json(500, {"error": "Generation failed, see the server log."})
+            raise
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Seed", str(parameters["seed"]))
+        self.end_headers()
+        try:
+            self.write_chunk(first_piece)
+            for piece in pieces:
+                self.write_chunk(piece)
+        except Exception:
+            # The status is sent already, an incomplete chunked body tells the client the response failed.
+            self.close_connection = True
+            raise
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class GenerationServer(HTTPServer):
+    """
+    HTTP server handing connections to a fixed pool of worker threads, which share one GenerationService.
+    """
+
+    def __init__(self, address, service, workers=DEFAULT_SERVER_WORKERS):
+        super().__init__(address, GenerationRequestHandler)
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
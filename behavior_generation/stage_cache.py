@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from behavior_generation import instrumentation
+
+STAGE_CACHE_VERSION = 5
+STAGE_METADATA_FILE = "stage.json"
+STAGE_DATA_FILE = "data.pkl"
+
+
+def stage_key(stage, inputs, upstream=()):
+    """
+    Content address of a stage output: SHA-256 of the stage name, its inputs and the keys of the stages it reads.
+
+    :param inputs: JSON-serializable dictionary of everything deciding the stage output,
+        file contents being given as their digests or parsed content rather than their paths.
+    :param upstream: Keys of the stages whose outputs the stage reads.
+    """
+    payload = json.dumps({"version": STAGE_CACHE_VERSION, "stage": stage, "inputs": inputs, "upstream": list(upstream)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def copy_path(source, destination):
+    """
+    Copy a file, or a directory tree into destination, merging with existing directories.
+    """
+    if os.path.isdir(source):
+        shutil.copytree(source, destination, dirs_exist_ok=True)
+    else:
+        shutil.copy2(source, destination)
+
+
+class StageCache:
+    """
+    Outputs of pipeline stages, kept on disk in <directory>/<stage>/<key>/.
+
+    An entry is written to a temporary directory then renamed into place, like the movie
+    catalog cache, so concurrent runs never read a partial entry. Entries are never modified
+    once written, and files are copied in and out of them rather than linked, since resumed
+    runs append to their output files.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def entry_directory(self, stage, key):
+        return os.path.join(self.directory, stage, key)
+
+    def contains(self, stage, key):
+        return os.path.isfile(os.path.join(self.entry_directory(stage, key), STAGE_METADATA_FILE))
+
+    def load(self, stage, key):
+        """
+        Load the object stored by store.
+        """
+        with open(os.path.join(self.entry_directory(stage, key), STAGE_DATA_FILE), "rb") as file:
+            return pickle.load(file)
+
+    def store(self, stage, key, value, inputs=None):
+        """
+        Store a picklable stage output.
+        """
+
+        def write(directory):
+            with open(os.path.join(directory, STAGE_DATA_FILE), "wb") as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return self.write_entry(stage, key, inputs, write)
+
+    def store_files(self, stage, key, paths, inputs=None):
+        """
+        Store files or directories written by a stage.
+
+        :param paths: Dictionary of names in the entry to the paths copied there.
+        """
+
+        def write(directory):
+            for name, path in paths.items():
+                copy_path(path, os.path.join(directory, name))
+
+        return self.write_entry(stage, key, inputs, write)
+
+    def restore_files(self, stage, key, paths):
+        """
+        Copy files stored by store_files out of the cache.
+
+        :param paths: Dictionary of names in the entry to their destination paths.
+        """
+        entry_directory = self.entry_directory(stage, key)
+        for name, path in paths.items():
+            copy_path(os.path.join(entry_directory, name), path)
+
+    def write_entry(self, stage, key, inputs, write):
+        """
+        Write an entry with write(directory), then its metadata.
+
+        :return: Whether the entry was written. A failed write leaves the cache unchanged.
+        """
+        entry_directory = self.entry_directory(stage, key)
+        temporary_directory = None
+        try:
+            os.makedirs(os.path.dirname(entry_directory), exist_ok=True)
+            temporary_directory = tempfile.mkdtemp(dir=os.path.dirname(entry_directory), prefix=".tmp-")
+            write(temporary_directory)
+            with open(os.path.join(temporary_directory, STAGE_METADATA_FILE), "w", encoding="utf-8") as file:
+                json.dump({"version": STAGE_CACHE_VERSION, "stage": stage, "key": key, "inputs": inputs}, file, indent=4)
+            os.rename(temporary_directory, entry_directory)
+        except OSError:
+            # The cache could not be written, or another run wrote the same entry first.
+            if temporary_directory is not None:
+                shutil.rmtree(temporary_directory, ignore_errors=True)
+            return False
+        return True
+
+    def cached(self, stage, key, compute, inputs=None):
+        """
+        Load the output of a stage, computing and storing it on a miss.
+
+        :param compute: Function returning the stage output.
+        :return: Tuple of the output and whether it was loaded from the cache.
+        """
+        if self.contains(stage, key):
+            instrumentation.count("stage_cache_hits")
+            return self.load(stage, key), True
+        instrumentation.count("stage_cache_misses")
+        value = compute()
+        self.store(stage, key, value, inputs)
+        return value, False
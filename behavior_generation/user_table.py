@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from behavior_generation.encoding import (
+    GENRES,
+    GENRE_BITS,
+    GENRE_MASK_DTYPE,
+    LANGUAGES,
+    LANGUAGE_BITS,
+    LANGUAGE_MASK_DTYPE,
+    decode_set,
+    encode_set,
+)
+
+# User IDs are stored as integers and exported as "U" followed by at least 4 digits, the
+# format of user files, preference keys and the keyed random draws of the behavior engines.
+USER_ID_PREFIX = "U"
+USER_ID_DIGITS = 4
+USER_ID_DTYPE = np.int64
+
+# Set columns, stored as bitmasks of their vocabulary: (vocabulary, bits, dtype).
+USER_SET_COLUMNS = {
+    "liked_genres": (GENRES, GENRE_BITS, GENRE_MASK_DTYPE),
+    "disliked_genres": (GENRES, GENRE_BITS, GENRE_MASK_DTYPE),
+    "language_spoken": (LANGUAGES, LANGUAGE_BITS, LANGUAGE_MASK_DTYPE),
+}
+
+# Enumeration columns, stored as pandas categoricals.
+USER_CATEGORICAL_COLUMNS = [
+    "name",
+    "surname",
+    "clinical_gender",
+    "age_range",
+    "lifestyle",
+    "country_of_origin",
+    "living_country",
+    "current_location",
+    "current_working_status",
+    "marital_status",
+    "ethnicity",
+    "hard_constraint",
+]
+
+USER_FLAG_COLUMNS = ["award_hunter"]
+
+# Separator of the list columns of the CSV the users command writes, e.g. "Drama, War".
+USER_LIST_SEPARATOR = ", "
+
+# Rows formatted at once when a user table is exported, bounding the memory of the string columns.
+USER_EXPORT_CHUNK_ROWS = 100_000
+
+
+def format_user_ids(user_ids):
+    """
+    Format integer user IDs as their exported strings, e.g. 1 as "U0001" and 12345 as "U12345".
+
+    :return: Object array of strings.
+    """
+    return np.array([f"{USER_ID_PREFIX}{user_id:0{USER_ID_DIGITS}d}" for user_id in np.asarray(user_ids).tolist()], dtype=object)
+
+
+def parse_user_ids(user_ids):
+    """
+    Parse user IDs formatted by format_user_ids back to integers, integers being kept as is.
+    """
+    user_ids = pd.Series(np.asarray(user_ids))
+    if user_ids.dtype == object:
+        user_ids = user_ids.str.slice(len(USER_ID_PREFIX))
+    return user_ids.astype(USER_ID_DTYPE).to_numpy()
+
+
+def categorical(values, categories=()):
+    """
+    Categorical of values, with categories first and then the other values in order of appearance.
+    """
+    values = np.asarray(values, dtype=object)
+    return pd.Categorical(values, categories=list(dict.fromkeys([*categories, *pd.unique(values)])))
+
+
+def encode_set_column(values, bits, dtype):
+    """
+    Encode a column of name lists as bitmasks, encoding each distinct list once.
+    """
+    masks = {}
+    encoded = np.empty(len(values), dtype=dtype)
+    for row, items in enumerate(values):
+        key = tuple(items)
+        if key not in masks:
+            masks[key] = encode_set(key, bits)
+        encoded[row] = masks[key]
+    return encoded
+
+
+def decode_set_column(masks, vocabulary, separator=None):
+    """
+    Decode a bitmask column into name lists, or into strings joined with separator, decoding each distinct mask once.
+
+    Names come in vocabulary order, as a bitmask does not keep the order they were drawn in.
+
+    :return: Object array, one list or string per row.
+    """
+    uniques, inverse = np.unique(np.asarray(masks), return_inverse=True)
+    decoded = [decode_set(mask, vocabulary) for mask in uniques]
+    if separator is not None:
+        return np.array([separator.join(names) for names in decoded], dtype=object)[inverse]
+    values = np.empty(len(inverse), dtype=object)
+    values[:] = [list(decoded[code]) for code in inverse]
+    return values
+
+
+def is_compact(user_df):
+    return (
+        user_df["userID"].dtype == USER_ID_DTYPE
+        and all(user_df[name].dtype == dtype for name, (_, _, dtype) in USER_SET_COLUMNS.items() if name in user_df)
+        and all(isinstance(user_df[name].dtype, pd.CategoricalDtype) for name in USER_CATEGORICAL_COLUMNS if name in user_df)
+    )
+
+
+def compact_users(user_df):
+    """
+    Convert a user DataFrame with string IDs and list columns to the compact user table.
+
+    The compact table keeps the same columns: integer userID, categorical enumerations,
+    bitmask set columns and an int8 award_hunter flag. A 10M-user table takes a few hundred MB.
+    Tables that are already compact are returned as is.
+    """
+    if "userID" not in user_df or is_compact(user_df):
+        return user_df
+    columns = {}
+    for name in user_df.columns:
+        values = user_df[name]
+        if name == "userID":
+            columns[name] = parse_user_ids(values)
+        elif name in USER_SET_COLUMNS:
+            _, bits, dtype = USER_SET_COLUMNS[name]
+            columns[name] = values.to_numpy() if values.dtype == dtype else encode_set_column(values, bits, dtype)
+        elif name in USER_CATEGORICAL_COLUMNS:
+            columns[name] = values if isinstance(values.dtype, pd.CategoricalDtype) else categorical(values)
+        elif name in USER_FLAG_COLUMNS:
+            columns[name] = values.to_numpy(dtype=np.int8)
+        else:
+            columns[name] = values
+    return pd.DataFrame(columns, index=user_df.index)
+
+
+def concat_users(user_dfs):
+    """
+    Concatenate compact user tables, merging the categories of their categorical columns.
+    """
+    user_dfs = [user_df for user_df in user_dfs if len(user_df.columns)]
+    if not user_dfs:
+        return pd.DataFrame()
+    columns = {}
+    for name in user_dfs[0].columns:
+        values = [user_df[name] for user_df in user_dfs]
+        if isinstance(values[0].dtype, pd.CategoricalDtype):
+            columns[name] = union_categoricals([value.array for value in values])
+        else:
+            columns[name] = np.concatenate([value.to_numpy() for value in values])
+    return pd.DataFrame(columns)
+
+
+def user_bitmasks(user_df):
+    """
+    Genre and language bitmask arrays of a compact user table, keyed by column.
+    """
+    return {name: user_df[name].to_numpy() for name in USER_SET_COLUMNS}
+
+
+def format_users(user_df, list_separator=None):
+    """
+    Format a user table back to the exported DataFrame, with string IDs and enumerations and list columns.
+
+    :param list_separator: Optional separator joining list columns into strings, lists are kept otherwise.
+    """
+    user_df = compact_users(user_df)
+    columns = {}
+    for name in user_df.columns:
+        values = user_df[name]
+        if name == "userID":
+            columns[name] = format_user_ids(values)
+        elif name in USER_SET_COLUMNS:
+            columns[name] = decode_set_column(values, USER_SET_COLUMNS[name][0], list_separator)
+        elif name in USER_CATEGORICAL_COLUMNS:
+            columns[name] = values.to_numpy(dtype=object)
+        elif name in USER_FLAG_COLUMNS:
+            columns[name] = values.to_numpy(dtype=np.int64)
+        else:
+            columns[name] = values.to_numpy()
+    return pd.DataFrame(columns)
+
+
+def iter_formatted_users(user_df, list_separator=None, chunk_rows=USER_EXPORT_CHUNK_ROWS):
+    """
+    Format a user table with format_users, chunk_rows rows at a time.
+
+    An empty table yields one empty chunk, so exports still get their columns.
+    """
+    user_df = compact_users(user_df)
+    for start in range(0, max(len(user_df), 1), chunk_rows):
+        yield format_users(user_df.iloc[start:start + chunk_rows], list_separator)
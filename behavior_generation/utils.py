@@ -1,9 +1,164 @@
 import random
+import sys
+import threading
+from bisect import bisect
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+import numpy as np
+
+from behavior_generation.options import STDOUT_PATH
+
+# Compiled samplers kept by get_sampler, sized for the three behavior distributions of many users.
+SAMPLER_CACHE_SIZE = 65536
+
+
+class LRUCache:
+    """
+    Small least-recently-used cache holding at most maxsize entries.
+
+    Safe to share between threads, as the generation server does.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # Locks cannot be pickled, objects holding a cache are sent to worker processes.
+        with self._lock:
+            return {"maxsize": self.maxsize, "_entries": OrderedDict(self._entries)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class Sampler:
+    """
+    Weighted sampler over the items of a probability dictionary, compiled once into a cumulative table.
+
+    Weights are treated as unnormalized, like random.choices, and single draws consume the
+    random module exactly like random.choices(options, weights, k=1) does.
+    """
+
+    def __init__(self, prob_dict):
+        self.options = list(prob_dict)
+        self.cum_weights = list(accumulate(prob_dict.values()))
+        if not self.cum_weights:
+            raise ValueError("Cannot sample from an empty probability dictionary.")
+        self.total = self.cum_weights[-1] + 0.0
+        if self.total <= 0.0:
+            raise ValueError("Total of weights must be greater than zero.")
+        self._cumulative = np.array(self.cum_weights, dtype=np.float64)
+
+    def sample(self):
+        """
+        Draw one option with the random module.
+        """
+        return self.options[bisect(self.cum_weights, random.random() * self.total, 0, len(self.options) - 1)]
+
+    def sample_codes(self, uniforms):
+        """
+        Map uniform draws in [0, 1) to option indices.
+        """
+        codes = np.searchsorted(self._cumulative, np.asarray(uniforms) * self.total, side="right")
+        return np.minimum(codes, len(self.options) - 1)
+
+    def sample_many(self, size, rng=None):
+        """
+        Draw size options at once.
+
+        :param rng: Optional NumPy Generator, defaults to draws from the random module.
+        :return: Object array of the drawn options.
+        """
+        uniforms = rng.random(size) if rng is not None else np.array([random.random() for _ in range(size)])
+        return np.array(self.options, dtype=object)[self.sample_codes(uniforms)]
+
+
+_sampler_cache = LRUCache(SAMPLER_CACHE_SIZE)
+
+
+def get_sampler(prob_dict):
+    """
+    Return the compiled Sampler of a probability dictionary, reusing it while the dictionary is cached.
+
+    The cache is keyed by the dictionary's identity, so a distribution is expected not to be
+    mutated once it has been sampled. Entries keep a reference to their dictionary, which
+    prevents its id from being reused by another dictionary while the entry is cached.
+    """
+    entry = _sampler_cache.get(id(prob_dict))
+    if entry is not None and entry[0] is prob_dict:
+        return entry[1]
+    sampler = Sampler(prob_dict)
+    _sampler_cache.put(id(prob_dict), (prob_dict, sampler))
+    return sampler
 
 
 def pick_from_probabilities(prob_dict):
     """
     Select an option based on weighted probabilities.
     """
-    options, probabilities = zip(*prob_dict.items())
-    return random.choices(options, weights=probabilities, k=1)[0]
+    return get_sampler(prob_dict).sample()
+
+
+def round_array(values, ndigits):
+    """
+    Round every element of a float array exactly like the built-in round(value, ndigits).
+
+    np.round can disagree with round() when the scaled value sits next to a .5 tie,
+    so those elements are rounded one by one with round().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_tie = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    for index in np.flatnonzero(near_tie):
+        rounded.flat[index] = round(float(values.flat[index]), ndigits)
+    return rounded
+
+
+def iter_batches(items, batch_size):
+    """
+    Split an iterable into consecutive lists of at most batch_size items, reading it lazily.
+    """
+    if batch_size < 1:
+        raise ValueError(f"Batch size must be positive, got {batch_size}.")
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        yield batch
+
+
+@contextmanager
+def open_output(path):
+    """
+    Open a text file for writing, or standard output when path is STDOUT_PATH, which is left open.
+    """
+    if path == STDOUT_PATH:
+        yield sys.stdout
+        return
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        yield file
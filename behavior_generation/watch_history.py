@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+
+from behavior_generation.keyed_random import mix64
+
+INITIAL_CAPACITY = 1024
+MAX_LOAD_FACTOR = 0.7
+
+# Watch counts saturate at the largest uint16, scoring only uses them up to 3.
+MAX_WATCH_COUNT = np.iinfo(np.uint16).max
+
+_EMPTY = np.uint64(2**64 - 1)
+
+
+class WatchHistory:
+    """
+    How many times each user watched each movie, in an open-addressing hash table.
+
+    A (user row, movie index) pair is stored as one uint64 key, user_row << 32 | movie_index,
+    next to a uint16 watch count. Both live in flat arrays probed linearly from the mix64 hash
+    of the key, so there is no per-pair object and a pair takes about 10 / MAX_LOAD_FACTOR bytes.
+    The table doubles when more than MAX_LOAD_FACTOR of its slots are used, which keeps lookups
+    and updates O(1) amortized. User rows are positions in the users DataFrame the history is used with.
+
+    Memory grows with the number of distinct pairs watched, which is at most the number of events
+    and at most users x movies. Between doublings the table is 35% to 70% full, so a pair costs
+    14 to 29 bytes, so 1M users with 1,000 distinct movies each take 14 to 29 GB. Pairs are never
+    evicted, since a rewatch years later still changes the score.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+        self.keys = np.full(capacity, _EMPTY, dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.uint16)
+        self.size = 0
+
+    @classmethod
+    def from_arrays(cls, keys, counts):
+        """
+        Rebuild a history from the pair keys and counts returned by to_arrays.
+        """
+        history = cls(capacity=len(keys) / MAX_LOAD_FACTOR + 1)
+        history.counts[history.locate(np.asarray(keys, dtype=np.uint64))] = counts
+        return history
+
+    def to_arrays(self):
+        """
+        Pair keys and watch counts of the stored pairs, without the empty slots.
+        """
+        used = self.keys != _EMPTY
+        return self.keys[used], self.counts[used]
+
+    def __reduce__(self):
+        # Pickled without the empty slots, as histories are sent to worker processes.
+        return WatchHistory.from_arrays, self.to_arrays()
+
+    def __len__(self):
+        return self.size
+
+    def watch_count(self, user_row, movie_index):
+        """
+        Number of times the user watched the movie so far.
+        """
+        key = np.uint64(int(user_row) << 32 | int(movie_index))
+        mask = len(self.keys) - 1
+        slot = int(mix64([key])[0]) & mask
+        while True:
+            stored_key = self.keys[slot]
+            if stored_key == key:
+                return int(self.counts[slot])
+            if stored_key == _EMPTY:
+                return 0
+            slot = (slot + 1) & mask
+
+    def record(self, user_row, movie_index):
+        """
+        Record one watch of a movie by a user.
+
+        :return: Number of times the user watched the movie before.
+        """
+        self.reserve(self.size + 1)
+        key = np.uint64(int(user_row) << 32 | int(movie_index))
+        mask = len(self.keys) - 1
+        slot = int(mix64([key])[0]) & mask
+        while True:
+            stored_key = self.keys[slot]
+            if stored_key == key:
+                break
+            if stored_key == _EMPTY:
+                self.keys[slot] = key
+                self.size += 1
+                break
+            slot = (slot + 1) & mask
+        previous = int(self.counts[slot])
+        self.counts[slot] = min(previous + 1, MAX_WATCH_COUNT)
+        return previous
+
+    def record_many(self, user_rows, movie_indices):
+        """
+        Batched record, watches being recorded in array order.
+
+        :return: Array with the number of times each user watched the movie before.
+        """
+        keys = np.asarray(user_rows, dtype=np.uint64) << np.uint64(32) | np.asarray(movie_indices, dtype=np.uint64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        self.reserve(self.size + len(unique_keys))
+        slots = self.locate(unique_keys)
+
+        counts = self.counts[slots].astype(np.int64)
+        if len(unique_keys) == len(keys):
+            self.counts[slots] = np.minimum(counts + 1, MAX_WATCH_COUNT)
+            return counts[inverse]
+
+        # A pair repeated in the batch also counts its earlier occurrences.
+        order = np.argsort(inverse, kind="stable")
+        sorted_inverse = inverse[order]
+        occurrence = np.empty(len(keys), dtype=np.int64)
+        occurrence[order] = np.arange(len(keys)) - np.searchsorted(sorted_inverse, sorted_inverse)
+
+        previous = np.minimum(counts[inverse] + occurrence, MAX_WATCH_COUNT)
+        self.counts[slots] = np.minimum(counts + np.bincount(inverse, minlength=len(unique_keys)), MAX_WATCH_COUNT)
+        return previous
+
+    def reserve(self, size):
+        """
+        Grow the table, if needed, so it can hold size pairs within MAX_LOAD_FACTOR.
+        """
+        if size <= MAX_LOAD_FACTOR * len(self.keys):
+            return
+        keys, counts = self.to_arrays()
+        capacity = len(self.keys)
+        while size > MAX_LOAD_FACTOR * capacity:
+            capacity *= 2
+        self.keys = np.full(capacity, _EMPTY, dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.uint16)
+        self.size = 0
+        self.counts[self.locate(keys)] = counts
+
+    def locate(self, keys):
+        """
+        Slots of distinct keys, claiming an empty slot for each key not stored yet.
+
+        Every key is probed at once. When several keys reach the same empty slot in a round,
+        the key that ends up written there claims it and the others probe it again next round.
+        The caller reserves room for the new keys first.
+        """
+        mask = len(self.keys) - 1
+        probes = (mix64(keys) & np.uint64(mask)).astype(np.intp)
+        slots = np.empty(len(keys), dtype=np.intp)
+        pending = np.arange(len(keys))
+        while len(pending):
+            probed = probes[pending]
+            pending_keys = keys[pending]
+            stored_keys = self.keys[probed]
+            empty = stored_keys == _EMPTY
+            self.keys[probed[empty]] = pending_keys[empty]
+            claimed = empty & (self.keys[probed] == pending_keys)
+            self.size += np.count_nonzero(claimed)
+
+            matched = claimed | (stored_keys == pending_keys)
+            slots[pending[matched]] = probed[matched]
+            occupied = ~matched & ~empty
+            probes[pending[occupied]] = (probed[occupied] + 1) & mask
+            pending = pending[~matched]
+        return slots
+
+
+def save_watch_histories(path, watch_histories):
+    """
+    Save histories keyed by shard index to one .npz file, written to a temporary file first.
+    """
+    arrays = {}
+    for shard, history in watch_histories.items():
+        arrays[f"keys_{shard}"], arrays[f"counts_{shard}"] = history.to_arrays()
+    temporary_path = f"{path}.tmp.npz"
+    np.savez(temporary_path, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_watch_histories(path):
+    """
+    Load histories saved by save_watch_histories, keyed by shard index.
+    """
+    with np.load(path) as arrays:
+        shards = sorted(int(name[len("keys_"):]) for name in arrays.files if name.startswith("keys_"))
+        return {shard: WatchHistory.from_arrays(arrays[f"keys_{shard}"], arrays[f"counts_{shard}"]) for shard in shards}
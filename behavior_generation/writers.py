@@ -0,0 +1,385 @@
+import ast
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from behavior_generation.data.preference_categories import (
+    COMPANIONS,
+    SEASONS,
+    DAYS_OF_WEEK,
+    TIMES_OF_DAY,
+    LOCATIONS,
+)
+from behavior_generation.generators.vectorized_behavior_generator import USER_MOODS
+from behavior_generation.options import OUTPUT_FORMATS, PARTITION_COLUMNS, DEFAULT_ROW_GROUP_SIZE, USER_FILE_FORMATS, USER_STREAM_FORMATS
+from behavior_generation.user_table import USER_LIST_SEPARATOR, USER_SET_COLUMNS, compact_users, iter_formatted_users
+
+PARQUET_COMPRESSION = "zstd"
+
+# Parquet files of different partitions kept open at once by a partitioned writer.
+MAX_OPEN_PARTITIONS = 32
+
+# Dictionary-encoded behavior columns, with their fixed categories when they are known upfront.
+BEHAVIOR_DICTIONARY_COLUMNS = {
+    "date": None,
+    "season": SEASONS,
+    "day_of_week": DAYS_OF_WEEK,
+    "time_of_day": TIMES_OF_DAY,
+    "location": LOCATIONS,
+    "companions": COMPANIONS,
+    "user_mood": USER_MOODS,
+}
+
+USER_LIST_COLUMNS = list(USER_SET_COLUMNS)
+USER_DICTIONARY_COLUMNS = [
+    "clinical_gender",
+    "age_range",
+    "lifestyle",
+    "country_of_origin",
+    "living_country",
+    "current_location",
+    "current_working_status",
+    "marital_status",
+    "ethnicity",
+    "hard_constraint",
+]
+
+
+def import_pyarrow():
+    """
+    Import pyarrow, which is only needed for the parquet output format.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "The parquet output format requires pyarrow. Install it with `pip install behavior_generation[parquet]`."
+        ) from error
+    return pyarrow
+
+
+def dictionary_array(values, categories=None):
+    """
+    Encode values as an Arrow dictionary array with int32 indices.
+
+    :param categories: Optional fixed categories, so every chunk shares the same dictionary.
+    """
+    pa = import_pyarrow()
+    values = np.asarray(values, dtype=object)
+    if categories is None:
+        categories, codes = np.unique(values.astype(str), return_inverse=True)
+    else:
+        category_codes = {category: code for code, category in enumerate(categories)}
+        codes = np.array([category_codes.get(value, -1) for value in values], dtype=np.int32)
+    codes = np.asarray(codes, dtype=np.int32)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes, mask=codes < 0),
+        pa.array([str(category) for category in categories], type=pa.string()),
+    )
+
+
+def behavior_schema():
+    pa = import_pyarrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("day_number", pa.int32()),
+        ("date", dictionary),
+        ("season", dictionary),
+        ("day_of_week", dictionary),
+        ("time_of_day", dictionary),
+        ("userId", pa.string()),
+        ("movieId", pa.string()),
+        ("location", dictionary),
+        ("companions", dictionary),
+        ("user_mood", dictionary),
+        ("satisfaction_score", pa.float64()),
+    ])
+
+
+def behavior_table(chunk, schema=None):
+    """
+    Convert a behavior chunk to an Arrow table with dictionary-encoded context columns.
+
+    :param schema: Optional subset of behavior_schema() to convert, defaults to every column.
+    """
+    pa = import_pyarrow()
+    schema = schema or behavior_schema()
+    columns = []
+    for field in schema:
+        if field.name in BEHAVIOR_DICTIONARY_COLUMNS:
+            columns.append(dictionary_array(chunk[field.name], BEHAVIOR_DICTIONARY_COLUMNS[field.name]))
+        else:
+            columns.append(pa.array(chunk[field.name].to_numpy(), type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def user_table(user_df):
+    """
+    Convert a user DataFrame formatted by format_users to an Arrow table with native list columns and dictionary-encoded attributes.
+    """
+    pa = import_pyarrow()
+    columns = {}
+    for name in user_df.columns:
+        if name in USER_LIST_COLUMNS:
+            columns[name] = pa.array(user_df[name].tolist(), type=pa.list_(pa.string()))
+        elif name in USER_DICTIONARY_COLUMNS:
+            columns[name] = dictionary_array(user_df[name])
+        else:
+            columns[name] = pa.array(user_df[name].tolist())
+    return pa.table(columns)
+
+
+def write_users(user_df, path, output_format="csv"):
+    """
+    Save a user table as a pipe-separated CSV or as a Parquet file.
+
+    Users are formatted back to string IDs, attributes and genre and language lists one chunk
+    at a time, so only one chunk of strings is held in memory.
+    """
+    if output_format == "parquet":
+        parquet = import_pyarrow().parquet
+        writer = None
+        try:
+            for chunk in iter_formatted_users(user_df):
+                table = user_table(chunk)
+                writer = writer or parquet.ParquetWriter(path, table.schema, compression=PARQUET_COMPRESSION)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif output_format == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            write_user_batches([user_df], file, output_format)
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'. Expected one of {OUTPUT_FORMATS}.")
+
+
+def write_user_batches(user_dfs, file, output_format="csv"):
+    """
+    Write compact user tables to an open text file as they come, as pipe-separated CSV or JSON Lines.
+
+    Each table is written as soon as it is formatted, so a generator of batches is written in
+    constant memory. CSV joins genre and language lists with USER_LIST_SEPARATOR, and JSON Lines
+    keep them as JSON arrays.
+
+    :param user_dfs: Iterable of compact user tables, e.g. from iter_users.
+    :return: The number of users written.
+    """
+    if output_format not in USER_STREAM_FORMATS:
+        raise ValueError(f"Unknown user output format '{output_format}'. Expected one of {USER_STREAM_FORMATS}.")
+
+    num_users = 0
+    header_written = False
+    for user_df in user_dfs:
+        for chunk in iter_formatted_users(user_df, USER_LIST_SEPARATOR if output_format == "csv" else None):
+            if output_format == "csv":
+                chunk.to_csv(file, index=False, sep="|", header=not header_written)
+                header_written = True
+            elif len(chunk):
+                file.write(chunk.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n")
+            num_users += len(chunk)
+    return num_users
+
+
+def parse_user_list(values):
+    """
+    Parse a list column of a user CSV, joined with USER_LIST_SEPARATOR, or written as a Python
+    list by earlier versions of the pipeline command.
+    """
+    if values.startswith("["):
+        return ast.literal_eval(values)
+    return values.split(USER_LIST_SEPARATOR) if values else []
+
+
+def read_users(path, output_format="csv"):
+    """
+    Read a user file saved by write_users or by the users command back into the compact user table.
+    """
+    if output_format == "parquet":
+        return compact_users(pd.read_parquet(path))
+    if output_format == "jsonl":
+        return compact_users(pd.read_json(path, orient="records", lines=True, dtype=False))
+    if output_format == "csv":
+        user_df = pd.read_csv(path, sep="|", keep_default_na=False, dtype={"userID": str})
+        for name in USER_LIST_COLUMNS:
+            # Lists repeat a lot, each distinct one is parsed once.
+            lists = {values: parse_user_list(values) for values in user_df[name].unique()}
+            user_df[name] = user_df[name].map(lists)
+        return compact_users(user_df)
+    raise ValueError(f"Unknown output format '{output_format}'. Expected one of {USER_FILE_FORMATS}.")
+
+
+class CsvBehaviorWriter:
+    """
+    Append behavior chunks to one pipe-separated CSV file, writing the header once.
+
+    :param position: Optional position returned by checkpoint(). The file is cut back to it
+        and appended to, dropping rows written after the checkpoint.
+    """
+
+    def __init__(self, path, position=None):
+        self.path = path
+        if position is None:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+            self.rows_written = 0
+        else:
+            with open(path, "r+b") as file:
+                file.truncate(position["offset"])
+            self.file = open(path, "a", encoding="utf-8", newline="")
+            self.rows_written = position["rows_written"]
+
+    def write(self, chunk):
+        chunk.to_csv(self.file, index=False, sep="|", header=self.rows_written == 0)
+        self.rows_written += len(chunk)
+
+    def checkpoint(self):
+        """
+        Make everything written so far durable, and return the position to resume from.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"offset": self.file.tell(), "rows_written": self.rows_written}
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetBehaviorWriter:
+    """
+    Write behavior chunks to Parquet in row groups of row_group_size rows.
+
+    Without partitioning, everything goes to the single file at path. With partition_by,
+    path is a directory laid out as path/<column>=<value>/part-<n>.parquet, which Arrow,
+    Spark and pandas read back as one partitioned dataset. The partition column is only
+    stored in the directory names. At most MAX_OPEN_PARTITIONS files are open at a time,
+    a partition seen again after its file was closed continues in a new part file.
+
+    Only partitioned output can be checkpointed, since a Parquet file cannot be appended to.
+
+    :param position: Optional position returned by checkpoint(). Part files written after
+        the checkpoint are removed, and new rows go to new part files.
+    """
+
+    def __init__(self, path, partition_by=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, position=None):
+        if partition_by is not None and partition_by not in PARTITION_COLUMNS:
+            raise ValueError(f"Unknown partition column '{partition_by}'. Expected one of {PARTITION_COLUMNS}.")
+        self.pa = import_pyarrow()
+        self.path = path
+        self.partition_by = partition_by
+        self.row_group_size = row_group_size
+        self.schema = behavior_schema()
+        if partition_by is not None:
+            self.schema = self.schema.remove(self.schema.get_field_index(partition_by))
+        self.rows_written = 0
+        # Open partitions in least recently written order, each with its writer and pending tables.
+        self.partitions = {}
+        self.part_counts = {}
+        if position is not None:
+            self.resume(position)
+
+    def write(self, chunk):
+        if not len(chunk):
+            return
+        if self.partition_by is None:
+            self.append(None, behavior_table(chunk, self.schema))
+        else:
+            for value, partition_chunk in chunk.groupby(self.partition_by, sort=False):
+                self.append(value, behavior_table(partition_chunk, self.schema))
+        self.rows_written += len(chunk)
+
+    def append(self, value, table):
+        partition = self.partitions.pop(value, None)
+        if partition is None:
+            partition = {"writer": self.open_writer(value), "tables": [], "rows": 0}
+        # Reinserted last, so the dictionary stays ordered from least to most recently written.
+        self.partitions[value] = partition
+
+        partition["tables"].append(table)
+        partition["rows"] += len(table)
+        if partition["rows"] >= self.row_group_size:
+            self.flush(partition)
+
+        while len(self.partitions) > MAX_OPEN_PARTITIONS:
+            self.close_partition(next(iter(self.partitions)))
+
+    def open_writer(self, value):
+        if value is None:
+            return self.pa.parquet.ParquetWriter(self.path, self.schema, compression=PARQUET_COMPRESSION)
+        directory = os.path.join(self.path, f"{self.partition_by}={value}")
+        os.makedirs(directory, exist_ok=True)
+        part = self.part_counts.get(value, 0)
+        self.part_counts[value] = part + 1
+        return self.pa.parquet.ParquetWriter(os.path.join(directory, f"part-{part:04d}.parquet"), self.schema, compression=PARQUET_COMPRESSION)
+
+    def flush(self, partition):
+        if partition["tables"]:
+            table = self.pa.concat_tables(partition["tables"])
+            partition["writer"].write_table(table, row_group_size=self.row_group_size)
+        partition["tables"] = []
+        partition["rows"] = 0
+
+    def close_partition(self, value):
+        partition = self.partitions.pop(value)
+        self.flush(partition)
+        partition["writer"].close()
+
+    def close(self):
+        for value in list(self.partitions):
+            self.close_partition(value)
+
+    def checkpoint(self):
+        """
+        Close every open part file and return the position to resume from.
+        """
+        if self.partition_by is None:
+            raise ValueError("Only partitioned parquet output can be checkpointed.")
+        self.close()
+        return {"rows_written": self.rows_written, "part_counts": dict(self.part_counts)}
+
+    def resume(self, position):
+        if self.partition_by is None:
+            raise ValueError("Only partitioned parquet output can be resumed.")
+        self.rows_written = position["rows_written"]
+        self.part_counts = dict(position["part_counts"])
+        prefix = f"{self.partition_by}="
+        for directory in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if not directory.startswith(prefix):
+                continue
+            part_count = self.part_counts.get(directory[len(prefix):], 0)
+            for name in os.listdir(os.path.join(self.path, directory)):
+                match = re.fullmatch(r"part-(\d+)\.parquet", name)
+                if match and int(match.group(1)) >= part_count:
+                    os.remove(os.path.join(self.path, directory, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_behavior_writer(path, output_format="csv", partition_by=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, position=None):
+    """
+    Open a writer for behavior chunks, used as a context manager.
+
+    :param output_format: "csv" for a pipe-separated file, "parquet" for Parquet.
+    :param partition_by: Optional partition column for Parquet output, "date" or "season".
+    :param row_group_size: Rows per Parquet row group.
+    :param position: Optional position returned by the checkpoint() of an earlier writer, to resume from.
+    """
+    if output_format == "csv":
+        if partition_by is not None:
+            raise ValueError("Partitioned output is only supported with the parquet output format.")
+        return CsvBehaviorWriter(path, position=position)
+    if output_format == "parquet":
+        return ParquetBehaviorWriter(path, partition_by=partition_by, row_group_size=row_group_size, position=position)
+    raise ValueError(f"Unknown output format '{output_format}'. Expected one of {OUTPUT_FORMATS}.")
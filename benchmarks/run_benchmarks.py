@@ -0,0 +1,386 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from behavior_generation.encoding import encode_languages
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.behavior_generator import generate_behavior_data
+from behavior_generation.generators.hard_constraints import get_filtered_movies, pick_movie
+from behavior_generation.generators.satisfaction_calculator import (
+    calculate_satisfaction_score,
+    calculate_satisfaction_scores,
+)
+from behavior_generation.movie_catalog import MovieCatalog
+from behavior_generation.user_table import format_user_ids, format_users, user_bitmasks
+
+SEED = 1234
+MOVIE_DATA_FILE = "behavior_generation/data/movie_data.csv"
+USER_PROBABILITIES_FILE = "behavior_generation/data/default_user_probabilities.json"
+
+BASE_CATALOG_SIZE = 5733
+# Per-call stages are timed over this many calls.
+CALLS_PER_RUN = 100_000
+
+# Sweeps of each suite. The python engines only run up to python_max_users users,
+# and python_max_user_days simulated user days for behaviors.
+SUITES = {
+    "quick": {
+        "users": [1_000, 10_000],
+        "days": [30, 90],
+        "catalog_sizes": [BASE_CATALOG_SIZE, 10 * BASE_CATALOG_SIZE],
+        "python_max_users": 1_000,
+        "python_max_user_days": 30_000,
+    },
+    "full": {
+        "users": [1_000, 10_000, 100_000, 1_000_000],
+        "days": [30, 365, 730],
+        "catalog_sizes": [BASE_CATALOG_SIZE, 10 * BASE_CATALOG_SIZE, 100 * BASE_CATALOG_SIZE],
+        "python_max_users": 10_000,
+        "python_max_user_days": 300_000,
+    },
+}
+
+ENGINES = ["python", "vectorized"]
+
+HARD_CONSTRAINTS = [
+    "under_13",
+    "13_17_constraint",
+    "no_morning_thriller_horror",
+    "no_long_movie_constraint",
+    "strict_award_hunter",
+    "only_known_languages",
+    "no_constraint",
+]
+
+# Language combinations of the users in pick_movie calls.
+LANGUAGE_COMBINATIONS = [
+    ["English"],
+    ["English", "Spanish"],
+    ["French", "English"],
+    ["German"],
+    ["Turkish", "English"],
+]
+
+# Users of the behavior sweeps over days and catalog sizes.
+BEHAVIOR_SWEEP_USERS = 1_000
+
+# behavior-gen commands whose startup is timed, each run in a new interpreter.
+CLI_STARTUP_COMMANDS = [
+    ["--help"],
+    ["pipeline", "--help"],
+    ["users", "--num_users", "10", "--engine", "vectorized", "--seed", str(SEED), "--user_output_file", os.devnull],
+]
+
+
+def load_user_probabilities():
+    with open(USER_PROBABILITIES_FILE, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def scale_catalog(movies_df, size):
+    """
+    Build a catalog of size movies by repeating the movie dataset with new movie IDs.
+    """
+    repeats = -(-size // len(movies_df))
+    scaled = pd.concat([movies_df] * repeats, ignore_index=True).iloc[:size].copy()
+    scaled["movieId"] = [f"M{index + 1:07d}" for index in range(size)]
+    return MovieCatalog.from_dataframe(scaled)
+
+
+def measure(run, repeat, track_memory):
+    """
+    Time run, keeping the fastest of repeat runs, then measure its peak traced memory in one more run.
+
+    Every run starts from the same seeds, so repeated runs do the same work.
+
+    :return: (seconds, result of the last timed run, peak memory in bytes or None)
+    """
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        random.seed(SEED)
+        start = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - start)
+
+    peak_memory = None
+    if track_memory:
+        random.seed(SEED)
+        tracemalloc.start()
+        run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return min(seconds), result, peak_memory
+
+
+def build_cases(suite, movies_df, user_probabilities):
+    """
+    List the benchmark cases of a suite as (name, parameters, setup) tuples.
+
+    setup() prepares the inputs outside of the timed region and returns (run, count_items),
+    where count_items(result) is the number of items, users, movies, calls or events, processed by run().
+    """
+    cases = []
+    catalogs = {}
+
+    def catalog(size):
+        if size not in catalogs:
+            catalogs[size] = scale_catalog(movies_df, size)
+        return catalogs[size]
+
+    def population(num_users):
+        users = generate_users(num_users, user_probabilities, engine="vectorized", seed=SEED)
+        preferences = generate_multiple_user_preferences(format_user_ids(users["userID"]), engine="vectorized", seed=SEED)
+        return users, preferences
+
+    for command in CLI_STARTUP_COMMANDS:
+        cases.append(("cli_startup", {"command": " ".join(command[:2])}, lambda command=command: (
+            lambda: subprocess.run([sys.executable, "-m", "behavior_generation.cli", *command], check=True, capture_output=True),
+            lambda result: 1,
+        )))
+
+    for num_users in suite["users"]:
+        for engine in ENGINES:
+            if engine == "python" and num_users > suite["python_max_users"]:
+                continue
+            params = {"engine": engine, "users": num_users}
+
+            def user_setup(num_users=num_users, engine=engine):
+                # Warms up per-process caches, such as the name pool of the vectorized engine.
+                generate_users(1, user_probabilities, engine=engine, seed=SEED)
+                return lambda: generate_users(num_users, user_probabilities, engine=engine, seed=SEED), len
+
+            cases.append(("generate_users", params, user_setup))
+
+            def preference_setup(num_users=num_users, engine=engine):
+                user_ids = format_user_ids(range(1, num_users + 1))
+                return lambda: generate_multiple_user_preferences(user_ids, engine=engine, seed=SEED), len
+
+            cases.append(("generate_multiple_user_preferences", params, preference_setup))
+
+    for size in suite["catalog_sizes"]:
+        cases.append(("get_filtered_movies", {"catalog": size}, lambda size=size: (
+            lambda: get_filtered_movies(catalog(size)),
+            lambda result: size,
+        )))
+
+        def pick_movie_setup(size=size):
+            filtered_movies = get_filtered_movies(catalog(size))
+            rng = np.random.default_rng(SEED)
+            constraints = rng.choice(HARD_CONSTRAINTS, size=CALLS_PER_RUN)
+            languages = rng.integers(0, len(LANGUAGE_COMBINATIONS), size=CALLS_PER_RUN)
+            contexts = [
+                (constraint, encode_languages(LANGUAGE_COMBINATIONS[language]), companions, time_of_day)
+                for constraint, language, companions, time_of_day in zip(
+                    constraints,
+                    languages,
+                    rng.choice(["Alone", "Family", "Friends"], size=CALLS_PER_RUN),
+                    rng.choice(["Morning", "Evening"], size=CALLS_PER_RUN),
+                )
+            ]
+            return lambda: [pick_movie(filtered_movies, *context) for context in contexts], len
+
+        cases.append(("pick_movie", {"catalog": size}, pick_movie_setup))
+
+    def satisfaction_inputs():
+        movies = catalog(BASE_CATALOG_SIZE)
+        users, preferences = population(1_000)
+        rng = np.random.default_rng(SEED)
+        movie_rows = rng.integers(0, len(movies), size=CALLS_PER_RUN)
+        user_rows = rng.integers(0, len(users), size=CALLS_PER_RUN)
+        moods = rng.choice(["Happy", "Neutral", "Sad"], size=CALLS_PER_RUN)
+        return movies, users, preferences, movie_rows, user_rows, moods
+
+    def satisfaction_setup():
+        movies, users, preferences, movie_rows, user_rows, moods = satisfaction_inputs()
+        # The list-based scorer takes the exported form of users.
+        formatted = format_users(users)
+        arguments = [
+            (
+                movies.genres(movie),
+                formatted["liked_genres"][user],
+                formatted["disliked_genres"][user],
+                movies.languages(movie),
+                formatted["language_spoken"][user],
+                float(movies.imdb_rating[movie]),
+                mood,
+                int(movies.number_of_rewatches[movie]),
+                formatted["award_hunter"][user],
+                int(movies.having_award[movie]),
+                preferences[formatted["userID"][user]]["SATISFACTION_WEIGHTS"],
+            )
+            for movie, user, mood in zip(movie_rows, user_rows, moods)
+        ]
+        return lambda: [calculate_satisfaction_score(*argument) for argument in arguments], len
+
+    cases.append(("calculate_satisfaction_score", {"calls": CALLS_PER_RUN}, satisfaction_setup))
+
+    def batched_satisfaction_setup():
+        # Imported here, the benchmark only needs the batched engine's helpers for this case.
+        from behavior_generation.generators.vectorized_behavior_generator import build_probability_matrix, USER_MOODS, USER_MOOD_SCORE_VALUES
+        from behavior_generation.generators.satisfaction_calculator import SATISFACTION_FACTORS
+
+        movies, users, preferences, movie_rows, user_rows, moods = satisfaction_inputs()
+        bitmasks = user_bitmasks(users)
+        weights = build_probability_matrix(format_user_ids(users["userID"]), preferences, "SATISFACTION_WEIGHTS", SATISFACTION_FACTORS)
+        mood_scores = USER_MOOD_SCORE_VALUES[[USER_MOODS.index(mood) for mood in moods]]
+        award_hunters = users["award_hunter"].to_numpy()
+
+        def run():
+            return calculate_satisfaction_scores(
+                movies.genre_bitmask[movie_rows],
+                movies.genre_count[movie_rows],
+                bitmasks["liked_genres"][user_rows],
+                bitmasks["disliked_genres"][user_rows],
+                movies.language_bitmask[movie_rows],
+                bitmasks["language_spoken"][user_rows],
+                movies.imdb_rating[movie_rows],
+                mood_scores,
+                movies.number_of_rewatches[movie_rows],
+                award_hunters[user_rows],
+                movies.having_award[movie_rows],
+                weights[user_rows],
+            )
+
+        return run, len
+
+    cases.append(("calculate_satisfaction_scores", {"calls": CALLS_PER_RUN}, batched_satisfaction_setup))
+
+    behavior_runs = (
+        [(num_users, suite["days"][0], BASE_CATALOG_SIZE) for num_users in suite["users"]]
+        + [(BEHAVIOR_SWEEP_USERS, num_days, BASE_CATALOG_SIZE) for num_days in suite["days"][1:]]
+        + [(BEHAVIOR_SWEEP_USERS, suite["days"][0], size) for size in suite["catalog_sizes"][1:]]
+    )
+    for num_users, num_days, size in behavior_runs:
+        for engine in ENGINES:
+            if engine == "python" and (num_users > suite["python_max_users"] or num_users * num_days > suite["python_max_user_days"]):
+                continue
+
+            def behavior_setup(num_users=num_users, num_days=num_days, size=size, engine=engine):
+                users, preferences = population(num_users)
+                movies = catalog(size)
+                return lambda: generate_behavior_data(users, movies, preferences, num_days=num_days, engine=engine, seed=SEED), len
+
+            params = {"engine": engine, "users": num_users, "days": num_days, "catalog": size}
+            cases.append(("generate_behavior_data", params, behavior_setup))
+
+    return cases
+
+
+def case_key(name, params):
+    return f"{name}[{','.join(f'{key}={value}' for key, value in params.items())}]"
+
+
+def run_suite(suite_name, repeat=1, track_memory=True, stage_filter=None):
+    """
+    Run every case of a suite.
+
+    :param stage_filter: Optional list of stage names to run, defaults to all stages.
+    :return: Result dictionary with the environment and one record per case.
+    """
+    movies_df = pd.read_csv(MOVIE_DATA_FILE, sep="|")
+    user_probabilities = load_user_probabilities()
+
+    records = []
+    for name, params, setup in build_cases(SUITES[suite_name], movies_df, user_probabilities):
+        if stage_filter and name not in stage_filter:
+            continue
+        run, count_items = setup()
+        seconds, result, peak_memory = measure(run, repeat, track_memory)
+        items = count_items(result)
+        record = {
+            "key": case_key(name, params),
+            "stage": name,
+            "params": params,
+            "seconds": seconds,
+            "items": items,
+            "items_per_second": items / seconds if seconds > 0 else None,
+            "peak_memory_mb": peak_memory / 2**20 if peak_memory is not None else None,
+        }
+        records.append(record)
+        memory = f"{record['peak_memory_mb']:.1f} MB" if peak_memory is not None else "-"
+        print(f"{record['key']}: {seconds:.3f} s, {items} items, {record['items_per_second']:.0f} items/s, peak {memory}", flush=True)
+
+    return {
+        "suite": suite_name,
+        "seed": SEED,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "results": records,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Compare results with a baseline run.
+
+    A case regresses when its throughput drops, or its peak memory grows, by more than tolerance.
+    Cases missing from either run are skipped.
+
+    :return: List of regression messages.
+    """
+    baseline_records = {record["key"]: record for record in baseline["results"]}
+    regressions = []
+    for record in results["results"]:
+        reference = baseline_records.get(record["key"])
+        if reference is None:
+            continue
+        if reference["items_per_second"] and record["items_per_second"] < reference["items_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{record['key']}: {record['items_per_second']:.0f} items/s, baseline {reference['items_per_second']:.0f} items/s"
+            )
+        if reference["peak_memory_mb"] and record["peak_memory_mb"] and record["peak_memory_mb"] > reference["peak_memory_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{record['key']}: peak {record['peak_memory_mb']:.1f} MB, baseline {reference['peak_memory_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def main():
+    """
+    Benchmark every generation stage over user counts, day counts and catalog sizes.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the generation stages.")
+    parser.add_argument("--suite", type=str, default="quick", choices=list(SUITES), help="Sweep to run.")
+    parser.add_argument("--stages", type=str, nargs="*", default=None, help="Only run these stages.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, the fastest one is kept.")
+    parser.add_argument("--no_memory", action="store_true", help="Skip the extra run measuring peak memory with tracemalloc.")
+    parser.add_argument("--output", type=str, default="benchmarks/results.json", help="Where to write the results.")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline results to compare with, regressions exit with status 1.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative drop in throughput or growth in peak memory.")
+    args = parser.parse_args()
+
+    results = run_suite(args.suite, repeat=args.repeat, track_memory=not args.no_memory, stage_filter=args.stages)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results saved to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against '{args.baseline}':")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regression against '{args.baseline}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,33 @@
 import streamlit as st
 import json
-import pandas as pd
 import os
+import time
 from datetime import datetime
-from behavior_generation.generators.user_generator import generate_users
-from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
-from behavior_generation.generators.behavior_generator import generate_behavior_data
+from behavior_generation.generators.behavior_generator import BEHAVIOR_ENGINES
+from behavior_generation.generators.hard_constraints import get_filtered_movies, load_constraint_rules
+from behavior_generation.jobs import JOB_STAGES, GenerationJob
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.writers import OUTPUT_FORMATS, PARTITION_COLUMNS
 
 # File path for user probability configurations
 USER_PROBABILITIES_FILE = "behavior_generation/data/default_user_probabilities.json"
+MOVIE_DATA_FILE = "behavior_generation/data/movie_data.csv"
+CONSTRAINT_RULES_FILE = "behavior_generation/data/hard_constraint_rules.json"
 
-def get_timestamp():
-    return datetime.now().strftime("%d_%m_%Y_%H_%M")
+# Seconds between page refreshes while a job runs.
+PROGRESS_REFRESH_SECONDS = 0.5
 
-timestamp = get_timestamp()
-output_dir = f"outputs/{timestamp}"
-os.makedirs(output_dir, exist_ok=True)
-os.makedirs(f"{output_dir}/users", exist_ok=True)
-os.makedirs(f"{output_dir}/behaviors", exist_ok=True)
+def get_timestamp():
+    return datetime.now().strftime("%d_%m_%Y_%H_%M_%S")
 
-user_output_file = f"{output_dir}/users/user_data.csv"
-preference_output_file = f"{output_dir}/users/preferences.json"
-behavior_output_file = f"{output_dir}/behaviors/behavior_data.csv"
+# **Load the catalog and compiled constraint pools once, shared by every rerun and session**
+@st.cache_resource
+def load_generation_resources(movie_data_file, constraint_rules_file):
+    catalog = load_movie_catalog(movie_data_file)
+    return catalog, get_filtered_movies(catalog, load_constraint_rules(constraint_rules_file))
 
 # **Load existing configuration**
+@st.cache_data
 def load_user_probabilities():
     try:
         with open(USER_PROBABILITIES_FILE, "r", encoding="utf-8") as file:
@@ -38,18 +42,25 @@ user_probabilities = load_user_probabilities()
 st.sidebar.header("User Generation Settings")
 num_users = st.sidebar.number_input("Number of Users", min_value=10, max_value=10000, value=100)
 num_days = st.sidebar.number_input("Number of Days", min_value=1, max_value=365, value=30)
+engine = st.sidebar.selectbox("Engine", BEHAVIOR_ENGINES, index=BEHAVIOR_ENGINES.index("vectorized"))
+
+st.sidebar.header("Output Settings")
+output_format = st.sidebar.selectbox("Output Format", OUTPUT_FORMATS)
+partition_by = None
+if output_format == "parquet":
+    partition_by = st.sidebar.selectbox("Partition Behaviors By", [None, *PARTITION_COLUMNS], format_func=lambda column: column or "No partitioning")
 
 # **Adjust probability distributions dynamically**
 def adjust_probabilities(category_name):
     st.sidebar.subheader(category_name)
     probs = user_probabilities.get(category_name, {})
     updated_probs = {key: st.sidebar.slider(f"{key}:", 0, 100, int(100*value), 1) for key, value in probs.items()}
-    
+
     # Normalize to sum to 1
     total_prob = sum(updated_probs.values())
     if total_prob > 0:
         updated_probs = {k: v / total_prob for k, v in updated_probs.items()}
-    
+
     return updated_probs
 
 # **Categories of probabilities**
@@ -59,44 +70,67 @@ categories = [
 ]
 updated_probabilities = {category: adjust_probabilities(category) for category in categories}
 
-# **Run Behavior Generation**
-if st.button("Generate Behaviors"):
-    st.write("Generating users...")
-
-    # **Step 1: Generate Users**
-    user_df = generate_users(num_users, updated_probabilities)
-    user_ids = user_df["userID"].tolist()
-
-    # **Step 2: Generate Preferences**
-    st.write("Generating user preferences...")
-    user_preferences = generate_multiple_user_preferences(user_ids)
-
-    # **Step 3: Generate Behaviors**
-    st.write("Generating behavior data...")
-    movie_df = pd.read_csv("behavior_generation/data/movie_data.csv", sep="|")
-    behavior_df = generate_behavior_data(user_df, movie_df, user_preferences, num_days=num_days)
-
-    user_df.to_csv(user_output_file, index=False, sep="|")
-    behavior_df.to_csv(behavior_output_file, index=False, sep="|")
-
-    st.success(f"Users saved to {user_output_file}")
-    st.success(f"Behavior data saved to {behavior_output_file}")
+# **Start a background job, its output directory is only created here**
+job = st.session_state.get("job")
+running = job is not None and not job.finished
 
+if st.button("Generate Behaviors", disabled=running):
+    output_dir = f"outputs/{get_timestamp()}"
+    os.makedirs(f"{output_dir}/users", exist_ok=True)
+    os.makedirs(f"{output_dir}/behaviors", exist_ok=True)
     date = datetime.today().strftime("%d_%m_%Y")
-    config_filename = f"{output_dir}/user_config_{date}.json"
 
-    # **Save the latest configuration**
-    with open(config_filename, "w", encoding="utf-8") as file:
-        json.dump(updated_probabilities, file, indent=4)
-
-    # **Show Sample Data**
-    st.subheader("Sample User Data")
-    st.dataframe(user_df.head())
-
-    st.subheader("Sample Behavior Data")
-    st.dataframe(behavior_df.head())
+    catalog, constraint_pools = load_generation_resources(MOVIE_DATA_FILE, CONSTRAINT_RULES_FILE)
+    job = GenerationJob(
+        catalog,
+        constraint_pools,
+        updated_probabilities,
+        num_users,
+        num_days,
+        outputs={
+            "users": f"{output_dir}/users/user_data.{output_format}",
+            "preferences": f"{output_dir}/users/preferences.json",
+            "behaviors": f"{output_dir}/behaviors/behavior_data" + ("" if partition_by else f".{output_format}"),
+            "config": f"{output_dir}/user_config_{date}.json",
+        },
+        output_format=output_format,
+        partition_by=partition_by,
+        engine=engine,
+    ).start()
+    st.session_state["job"] = job
+    running = True
+
+# **Show the progress of the current job**
+if job is not None:
+    if running and st.button("Cancel"):
+        job.cancel()
+
+    for stage in JOB_STAGES:
+        st.progress(job.progress[stage], text=f"{stage.capitalize()}: {int(100 * job.progress[stage])}%")
+    st.write(f"{job.events_written} events written.")
+
+    if job.status == "done":
+        st.success(f"Users saved to {job.outputs['users']}")
+        st.success(f"Behavior data saved to {job.outputs['behaviors']}")
+    elif job.status == "cancelled":
+        st.warning(f"Generation cancelled, files written so far are kept in {os.path.dirname(job.outputs['config'])}")
+    elif job.status == "failed":
+        st.error(f"Generation failed:\n\n{job.error}")
+
+    # **Show Sample Data, from the preview until the full dataset is written**
+    if job.preview is not None:
+        st.subheader("Sample User Data")
+        st.dataframe(job.preview["users"])
+
+        st.subheader("Sample Behavior Data")
+        st.dataframe(job.preview["behaviors"])
 
 # **Show Current Configurations**
 st.subheader("Current Configuration")
 config = {"num_users": num_users, "num_days": num_days, **updated_probabilities}
 st.json(config)
+
+# **Refresh the page while the job runs, the job itself keeps running between reruns**
+if running:
+    time.sleep(PROGRESS_REFRESH_SECONDS)
+    st.rerun()
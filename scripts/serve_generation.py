@@ -0,0 +1,6 @@
+import sys
+from behavior_generation.cli import main
+
+# Same as `behavior-gen serve`, kept for existing commands.
+if __name__ == "__main__":
+    main(["serve", *sys.argv[1:]])
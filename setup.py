@@ -5,8 +5,18 @@ setup(
     version="0.1.0",
     description="A package for synthetic user and behavior generation",
     packages=find_packages(),
+    # Default data files, read relative to the package when no other file is given.
+    package_data={"behavior_generation": ["data/*.csv", "data/*.json"]},
     install_requires=[
         "pandas",
         "faker",
+        "numpy",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "test": ["pytest"],
+    },
+    entry_points={
+        "console_scripts": ["behavior-gen=behavior_generation.cli:main"],
+    },
 )
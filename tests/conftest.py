@@ -0,0 +1,26 @@
+import glob
+import os
+
+import pytest
+
+from behavior_generation.cli import main
+
+
+@pytest.fixture
+def run_pipeline(monkeypatch):
+    """
+    Run the pipeline command in a directory and return its output directory.
+    """
+    def run(directory, *arguments):
+        os.makedirs(directory, exist_ok=True)
+        monkeypatch.chdir(directory)
+        main(["pipeline", *arguments])
+        (output_dir,) = glob.glob(os.path.join("outputs", "*"))
+        return os.path.join(directory, output_dir)
+
+    return run
+
+
+def read_behaviors(output_dir):
+    with open(os.path.join(output_dir, "behaviors", "behavior_data.csv"), "rb") as file:
+        return file.read()
@@ -0,0 +1,67 @@
+import os
+import random
+
+import pytest
+
+from behavior_generation.checkpoint import RUN_PARAMETERS, load_checkpoint, save_checkpoint
+from behavior_generation.generators.behavior_generator import generate_behavior_data
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE
+from behavior_generation.preference_store import load_preferences
+from behavior_generation.watch_history import WatchHistory
+from behavior_generation.writers import read_users
+
+from conftest import read_behaviors
+
+
+def interrupt_and_resume(run_pipeline, directory, arguments):
+    """
+    Run 8 days, append a partial row as an interrupted run leaves, then resume for 6 more days.
+    """
+    first = run_pipeline(directory, "--num_days", "8", *arguments)
+    # Rows written after the last checkpoint of an interrupted run are dropped on resume.
+    with open(os.path.join(first, "behaviors", "behavior_data.csv"), "a") as file:
+        file.write("partial|row\n")
+    resumed = run_pipeline(directory, "--resume", first, "--extra_days", "6")
+    assert resumed == first
+    return resumed
+
+
+def test_resumed_python_run_matches_single_run(tmp_path, run_pipeline):
+    # Behaviors are compared to a single run over the users and preferences the resumed run saved.
+    resumed = interrupt_and_resume(run_pipeline, tmp_path, ["--num_users", "50", "--seed", "11", "--checkpoint_days", "4"])
+    users = read_users(os.path.join(resumed, "users", "user_data.csv"))
+    preferences = load_preferences(os.path.join(resumed, "users", "preferences.json"))
+
+    single = generate_behavior_data(users, load_movie_catalog(DEFAULT_MOVIE_DATA_FILE), preferences, num_days=14, seed=11)
+    assert read_behaviors(resumed) == single.to_csv(index=False, sep="|").encode()
+
+
+@pytest.mark.parametrize("options", [
+    ["--engine", "vectorized"],
+    ["--engine", "vectorized", "--sampling", "count_then_place"],
+    ["--engine", "python", "--workers", "2", "--shard_size", "20"],
+])
+def test_resumed_run_matches_single_run(tmp_path, run_pipeline, options):
+    arguments = ["--num_users", "50", "--seed", "11", "--checkpoint_days", "4", *options]
+    single = run_pipeline(tmp_path / "single", "--num_days", "14", *arguments)
+    resumed = interrupt_and_resume(run_pipeline, tmp_path / "resumed", arguments)
+    assert read_behaviors(resumed) == read_behaviors(single)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    history = WatchHistory()
+    history.record_many([0, 0, 3], [5, 5, 9])
+    parameters = {name: None for name in RUN_PARAMETERS}
+    state = random.Random(3).getstate()
+
+    save_checkpoint(tmp_path, parameters, 12, 30, {"offset": 10}, state, "digest", {0: history}, {1: state})
+    save_checkpoint(tmp_path, parameters, 16, 30, {"offset": 20}, state, "digest", {0: history}, {1: state})
+    checkpoint = load_checkpoint(tmp_path)
+
+    assert checkpoint["next_day"] == 16
+    assert checkpoint["random_state"] == state
+    assert checkpoint["shard_random_states"] == {1: state}
+    assert checkpoint["watch_histories"][0].watch_count(0, 5) == 2
+    # Only the watch histories of the latest checkpoint are kept.
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("watch_history")) == ["watch_history-16.npz"]
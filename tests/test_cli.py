@@ -0,0 +1,46 @@
+import os
+
+from behavior_generation.cli import main
+from behavior_generation.user_table import format_users
+from behavior_generation.writers import read_users
+
+from conftest import read_behaviors
+
+
+def read_file(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_seeded_python_pipeline_is_reproducible(tmp_path, run_pipeline):
+    arguments = ["--num_users", "30", "--num_days", "5", "--seed", "3", "--engine", "python"]
+    first = run_pipeline(tmp_path / "first", *arguments)
+    second = run_pipeline(tmp_path / "second", *arguments)
+
+    for name in ["user_data.csv", "preferences.json"]:
+        assert read_file(os.path.join(first, "users", name)) == read_file(os.path.join(second, "users", name))
+    assert read_behaviors(first) == read_behaviors(second)
+
+
+def test_users_command_writes_the_users_of_the_pipeline(tmp_path, run_pipeline, monkeypatch):
+    output_dir = run_pipeline(tmp_path / "pipeline", "--num_users", "30", "--num_days", "1", "--seed", "3", "--engine", "python")
+    monkeypatch.chdir(tmp_path)
+    main(["users", "--num_users", "30", "--seed", "3", "--batch_size", "7", "--user_output_file", "users.csv"])
+
+    users_file = read_file(tmp_path / "users.csv")
+    assert users_file == read_file(os.path.join(output_dir, "users", "user_data.csv"))
+    assert b"['" not in users_file
+
+
+def test_read_users_accepts_joined_and_python_lists(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main(["users", "--num_users", "10", "--seed", "4", "--user_output_file", "users.csv"])
+    users = format_users(read_users("users.csv"))
+
+    # Earlier versions of the pipeline wrote list columns as Python lists.
+    legacy = users.copy()
+    legacy.to_csv("legacy.csv", index=False, sep="|")
+    legacy_users = format_users(read_users("legacy.csv"))
+
+    assert legacy_users.equals(users)
+    assert all(isinstance(values, list) for values in users["language_spoken"])
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from behavior_generation.cli import load_user_probabilities
+from behavior_generation.generators.behavior_generator import create_day_mapping
+from behavior_generation.generators.counted_behavior_generator import (
+    iter_behavior_data_counted,
+    sample_distinct_slots,
+    window_bounds,
+)
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.generators.vectorized_behavior_generator import calculate_watch_chance, prepare_simulation
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.user_table import format_user_ids
+from behavior_generation.watch_history import WatchHistory
+
+SEED = 7
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    users = generate_users(300, load_user_probabilities(DEFAULT_USER_PROBABILITIES_FILE), engine="vectorized", seed=SEED)
+    preferences = generate_multiple_user_preferences(format_user_ids(users["userID"]), engine="vectorized", seed=SEED)
+    return users, load_movie_catalog(DEFAULT_MOVIE_DATA_FILE), preferences
+
+
+def generate_in_segments(inputs, segments, **options):
+    watch_history = WatchHistory()
+    chunks = []
+    for first_day, num_days in segments:
+        chunks.extend(iter_behavior_data_counted(*inputs, num_days=num_days, first_day=first_day, seed=SEED, watch_history=watch_history, **options))
+    return pd.concat(chunks, ignore_index=True)
+
+
+@pytest.mark.parametrize("segments", [
+    [(0, 13), (13, 27)],
+    [(0, 7), (7, 7), (14, 7), (21, 7), (28, 12)],
+])
+def test_segments_match_full_run(inputs, segments):
+    pd.testing.assert_frame_equal(generate_in_segments(inputs, segments), generate_in_segments(inputs, [(0, 40)]))
+
+
+def test_segments_across_blocks_match_full_run(inputs):
+    options = {"days_per_block": 20, "days_per_window": 8}
+    full = generate_in_segments(inputs, [(0, 45)], **options)
+    pd.testing.assert_frame_equal(generate_in_segments(inputs, [(0, 5), (5, 17), (22, 23)], **options), full)
+
+
+def test_window_bounds_are_aligned_to_day_zero():
+    assert window_bounds(0, 365, 30).tolist() == [0, *range(30, 365, 30), 365]
+    assert window_bounds(365, 730, 30).tolist() == [365, *range(390, 730, 30), 730]
+
+
+def test_event_counts_follow_watch_chances(inputs):
+    users, movies, preferences = inputs
+    simulation = prepare_simulation(users, movies, preferences)
+    day_mapping = create_day_mapping("2025-01-01", 365)
+    expected = sum(calculate_watch_chance(simulation, day["season"], day["day_of_week"]).sum() for day in day_mapping.values())
+
+    events = sum(len(chunk) for chunk in iter_behavior_data_counted(users, movies, preferences, num_days=365, seed=SEED))
+    assert abs(events - expected) < 5 * np.sqrt(expected)
+
+
+def test_sample_distinct_slots_draws_distinct_slots():
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 31, size=2000)
+    indices, slots = sample_distinct_slots(counts, 30, rng)
+
+    assert np.bincount(indices, minlength=len(counts)).tolist() == counts.tolist()
+    assert len(set(zip(indices.tolist(), slots.tolist()))) == len(indices)
+    assert ((slots >= 0) & (slots < 30)).all()
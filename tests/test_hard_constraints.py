@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from behavior_generation.encoding import encode_languages
+from behavior_generation.generators.hard_constraints import ConstraintPools, get_filtered_movies, pick_movies
+from behavior_generation.movie_catalog import MovieCatalog
+
+
+def small_catalog():
+    return MovieCatalog.from_dataframe(pd.DataFrame({
+        "movieId": ["M1", "M2", "M3", "M4"],
+        "duration": [90.0, 150.0, 100.0, 130.0],
+        "genres": ["Comedy", "Horror", "Thriller, Drama", "Drama"],
+        "language": ["English", "French", "English, French", "Spanish"],
+        "maturityRating": ["PG", "R", "PG-13", "NC-17"],
+        "imdbRating": [7.0, 6.0, 8.0, 5.0],
+        "rottenTomatoesRating": ["80%", "40%", "90%", "30%"],
+        "havingAward": [1, 0, 0, 1],
+        "numberOfRewatches": [1, 1, 1, 1],
+    }))
+
+
+def pool(pools, hard_constraint, languages, companions="Alone", time_of_day="Evening"):
+    name, movies = pools.pool(hard_constraint, companions, time_of_day, encode_languages(languages))
+    return name, movies.tolist()
+
+
+def test_only_known_languages_pool_is_the_union_of_the_user_languages():
+    pools = get_filtered_movies(small_catalog())
+
+    assert pool(pools, "only_known_languages", ["English"]) == ("only_known_languages", [0, 2])
+    assert pool(pools, "only_known_languages", ["French"]) == ("only_known_languages", [1, 2])
+    assert pool(pools, "only_known_languages", ["English", "Spanish"]) == ("only_known_languages", [0, 2, 3])
+
+
+def test_only_known_languages_falls_back_to_every_movie_when_no_language_matches():
+    pools = get_filtered_movies(small_catalog())
+
+    assert pool(pools, "only_known_languages", ["German"]) == ("only_known_languages:any_language", [0, 1, 2, 3])
+    assert pool(pools, "only_known_languages", []) == ("only_known_languages:any_language", [0, 1, 2, 3])
+
+
+def test_pick_movies_only_picks_movies_in_a_known_language():
+    pools = get_filtered_movies(small_catalog())
+    language_masks = np.array([encode_languages(["Spanish"]), encode_languages(["French"]), encode_languages(["German"])] * 50, dtype=np.uint64)
+    uniforms = np.random.default_rng(0).random(len(language_masks))
+
+    picks = pick_movies(pools, ["only_known_languages"] * len(uniforms), ["Alone"] * len(uniforms), ["Evening"] * len(uniforms), uniforms, language_masks)
+
+    assert set(picks[0::3]) == {3}
+    assert set(picks[1::3]) == {1, 2}
+    assert set(picks[2::3]) == {0, 1, 2, 3}
+
+
+def test_combined_rules_intersect_the_cases_matching_the_context():
+    pools = get_filtered_movies(small_catalog())
+
+    assert pool(pools, "13_17_constraint+no_morning_thriller_horror", [], time_of_day="Evening") == ("13_17", [0, 2])
+    assert pool(pools, "13_17_constraint+no_morning_thriller_horror", [], time_of_day="Morning") == ("13_17+no_morning_thriller_horror", [0])
+    assert pool(pools, "13_17_constraint+no_morning_thriller_horror", [], companions="Family") == ("13_17_with_parent", [0, 1, 2])
+    assert pool(pools, "no_constraint", []) == ("no_constraint", [0, 1, 2, 3])
+
+
+def test_known_languages_fallback_keeps_the_other_rules():
+    pools = get_filtered_movies(small_catalog())
+
+    assert pool(pools, "13_17_constraint+only_known_languages", ["French"]) == ("13_17+only_known_languages", [2])
+    # Spanish only has an NC-17 movie, so the languages are relaxed but 13_17 still applies.
+    assert pool(pools, "13_17_constraint+only_known_languages", ["Spanish"]) == ("13_17+only_known_languages:any_language", [0, 2])
+
+
+def test_rules_leaving_no_movie_raise():
+    rules = {"short_and_awarded": [{"name": "short_and_awarded", "movies": {"max_duration": 95, "having_award": False}}]}
+    pools = get_filtered_movies(small_catalog(), rules)
+
+    with pytest.raises(ValueError, match="short_and_awarded"):
+        pools.pool("short_and_awarded", "Alone", "Evening")
+    with pytest.raises(ValueError, match="Unknown hard constraints"):
+        pools.pool("no_such_rule", "Alone", "Evening")
+    with pytest.raises(ValueError, match="Unknown conditions"):
+        get_filtered_movies(small_catalog(), {"bad": [{"movies": {"max_budget": 10}}]})
+
+
+def test_pools_are_evicted_least_recently_used_first():
+    pools = ConstraintPools(small_catalog(), cache_size=2)
+
+    first = pools.pool("13_17_constraint", "Alone", "Evening")
+    pools.pool("13_17_constraint", "Family", "Evening")
+    pools.pool("13_17_constraint", "Alone", "Evening")
+    pools.pool("under_13", "Alone", "Evening")
+
+    assert len(pools.pools) == 2
+    assert pools.pools.get(("13_17_constraint", "Family", "Evening", None)) is None
+    assert pools.pools.get(("13_17_constraint", "Alone", "Evening", None)) is first
+    name, movies = pools.pool("13_17_constraint", "Family", "Evening")
+    assert (name, movies.tolist()) == ("13_17_with_parent", [0, 1, 2])
@@ -0,0 +1,16 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize("engine", ["python", "vectorized"])
+def test_run_report_counts_one_scoring_call_per_event(tmp_path, run_pipeline, engine):
+    output_dir = run_pipeline(tmp_path, "--num_users", "40", "--num_days", "10", "--seed", "5", "--engine", engine, "--instrument")
+    with open(os.path.join(output_dir, "run_report.json"), encoding="utf-8") as file:
+        report = json.load(file)
+
+    counters = report["counters"]
+    assert counters["events"] > 0
+    assert counters["scoring_calls"] == counters["events"]
+    assert {"catalog_load", "constraint_pools", "behaviors"} <= set(report["stages"])
@@ -0,0 +1,34 @@
+import os
+import shutil
+
+import numpy as np
+
+from behavior_generation import movie_catalog
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE
+
+
+def test_catalog_cache_is_keyed_by_content_outside_the_data_directory(tmp_path, monkeypatch):
+    cache_root = tmp_path / "cache"
+    monkeypatch.setattr(movie_catalog, "CATALOG_CACHE_DIRECTORY", str(cache_root))
+    data_directory = tmp_path / "data"
+    data_directory.mkdir()
+    movie_data_file = str(data_directory / "movies.csv")
+    shutil.copyfile(DEFAULT_MOVIE_DATA_FILE, movie_data_file)
+
+    parsed = load_movie_catalog(movie_data_file, use_cache=False)
+    cached = load_movie_catalog(movie_data_file)
+    assert os.listdir(data_directory) == ["movies.csv"]
+    assert os.path.dirname(cached.cache_directory) == str(cache_root)
+    assert np.array_equal(cached.movie_ids, parsed.movie_ids)
+    assert np.array_equal(cached.genre_bitmask, parsed.genre_bitmask)
+
+    # Any copy of the same content shares the cache, a different content gets its own.
+    assert load_movie_catalog(DEFAULT_MOVIE_DATA_FILE).cache_directory == cached.cache_directory
+    with open(movie_data_file) as file:
+        lines = file.readlines()
+    with open(movie_data_file, "w") as file:
+        file.writelines(lines[:-1])
+    edited = load_movie_catalog(movie_data_file)
+    assert edited.cache_directory != cached.cache_directory
+    assert len(edited) == len(parsed) - 1
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from behavior_generation.cli import load_user_probabilities
+from behavior_generation.generators.hard_constraints import get_filtered_movies
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.parallel import iter_behavior_data_parallel
+from behavior_generation.user_table import format_user_ids
+
+from conftest import read_behaviors
+
+SEED = 5
+
+
+@pytest.mark.parametrize("options", [
+    ["--engine", "python"],
+    ["--engine", "vectorized", "--sampling", "count_then_place"],
+])
+def test_output_does_not_depend_on_checkpoint_days(tmp_path, run_pipeline, options):
+    arguments = ["--num_users", "60", "--num_days", "40", "--seed", str(SEED), "--workers", "2", "--shard_size", "30", *options]
+    outputs = [
+        read_behaviors(run_pipeline(tmp_path / str(checkpoint_days), *arguments, "--checkpoint_days", str(checkpoint_days)))
+        for checkpoint_days in [40, 7, 30]
+    ]
+    assert outputs[1] == outputs[0]
+    assert outputs[2] == outputs[0]
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    users = generate_users(80, load_user_probabilities(DEFAULT_USER_PROBABILITIES_FILE), engine="vectorized", seed=SEED)
+    preferences = generate_multiple_user_preferences(format_user_ids(users["userID"]), engine="vectorized", seed=SEED)
+    return users, load_movie_catalog(DEFAULT_MOVIE_DATA_FILE), preferences
+
+
+def generate_parallel(inputs, segments, workers=1):
+    users, movies, preferences = inputs
+    watch_histories = {}
+    random_states = {}
+    chunks = []
+    for first_day, num_days in segments:
+        chunks.extend(iter_behavior_data_parallel(
+            users, movies, preferences, SEED, num_days=num_days, first_day=first_day, workers=workers, shard_size=30,
+            watch_histories=watch_histories, random_states=random_states, constraint_rules=get_filtered_movies(movies),
+        ))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def test_blocks_split_between_calls_continue_their_random_state(inputs):
+    full = generate_parallel(inputs, [(0, 45)])
+    pd.testing.assert_frame_equal(generate_parallel(inputs, [(0, 11), (11, 20), (31, 14)]), full)
+    pd.testing.assert_frame_equal(generate_parallel(inputs, [(0, 45)], workers=2), full)
+
+
+def test_block_continued_without_its_random_state_is_rejected(inputs):
+    users, movies, preferences = inputs
+    with pytest.raises(ValueError, match="random state"):
+        list(iter_behavior_data_parallel(users, movies, preferences, SEED, num_days=5, first_day=11, shard_size=30))
@@ -0,0 +1,66 @@
+import io
+
+import pandas as pd
+import pytest
+
+from behavior_generation.cli import load_user_probabilities
+from behavior_generation.generators.behavior_generator import generate_behavior_data, rebuild_watch_history
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.user_table import format_user_ids
+from behavior_generation.watch_history import WatchHistory
+
+SEED = 7
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    users = generate_users(300, load_user_probabilities(DEFAULT_USER_PROBABILITIES_FILE), engine="vectorized", seed=SEED)
+    preferences = generate_multiple_user_preferences(format_user_ids(users["userID"]), engine="vectorized", seed=SEED)
+    return users, load_movie_catalog(DEFAULT_MOVIE_DATA_FILE), preferences
+
+
+@pytest.fixture(scope="module")
+def full_run(inputs):
+    return generate_behavior_data(*inputs, num_days=40, engine="vectorized", seed=SEED)
+
+
+def test_range_of_days_matches_full_run(inputs, full_run):
+    watch_history = WatchHistory()
+    chunks = [
+        generate_behavior_data(*inputs, num_days=num_days, first_day=first_day, engine="vectorized", seed=SEED, watch_history=watch_history)
+        for first_day, num_days in [(0, 13), (13, 27)]
+    ]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), full_run)
+
+
+def test_subset_of_users_matches_full_run(inputs, full_run):
+    users, movies, preferences = inputs
+    subset = users.iloc[::3]
+    regenerated = generate_behavior_data(subset, movies, preferences, num_days=40, engine="vectorized", seed=SEED)
+
+    expected = full_run[full_run["userId"].isin(set(format_user_ids(subset["userID"])))].reset_index(drop=True)
+    pd.testing.assert_frame_equal(regenerated, expected)
+
+
+def test_range_of_days_for_subset_from_rebuilt_history(inputs, full_run):
+    users, movies, preferences = inputs
+    subset = users.iloc[1::4]
+    # The history is rebuilt from the run's output as written and read back, keeping other users' rows.
+    output = io.StringIO()
+    full_run.to_csv(output, index=False, sep="|")
+    written = pd.read_csv(io.StringIO(output.getvalue()), sep="|")
+    watch_history = rebuild_watch_history(subset, movies, written, first_day=25)
+
+    regenerated = generate_behavior_data(subset, movies, preferences, num_days=15, first_day=25, engine="vectorized", seed=SEED, watch_history=watch_history)
+    expected = full_run[(full_run["day_number"] >= 25) & full_run["userId"].isin(set(format_user_ids(subset["userID"])))]
+    pd.testing.assert_frame_equal(regenerated, expected.reset_index(drop=True))
+
+
+def test_rebuild_watch_history_rejects_unknown_movies(inputs, full_run):
+    users, movies, _ = inputs
+    behaviors = full_run.head(3).assign(movieId="M99999")
+    with pytest.raises(ValueError, match="M99999"):
+        rebuild_watch_history(users, movies, behaviors)
@@ -0,0 +1,77 @@
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from behavior_generation.options import DEFAULT_CONSTRAINT_RULES_FILE, DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.server import GenerationServer, GenerationService
+
+
+@pytest.fixture(scope="module")
+def server_port():
+    service = GenerationService(DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE, DEFAULT_CONSTRAINT_RULES_FILE)
+    server = GenerationServer(("127.0.0.1", 0), service, workers=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def post(port, path, body):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        connection.request("POST", path, body=body if isinstance(body, bytes) else json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, response.getheader("X-Seed"), response.read().decode("utf-8")
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("body", [
+    b"{not json",
+    [1, 2],
+    {"num_users": 0},
+    {"num_days": "ten"},
+    {"seed": -1},
+    {"start_date": "2025-13-01"},
+    {"colour": "blue"},
+    {"probabilities": {"NO_SUCH_DISTRIBUTION": {"a": 1}}},
+    {"probabilities": {"GENDER_PROBS": {"Male": -1, "Female": 2}}},
+    {"probabilities": {"GENDER_PROBS": {"Male": "often"}}},
+    {"probabilities": {"GENDER_PROBS": {"Male": 0}}},
+])
+def test_invalid_requests_are_answered_with_400(server_port, body):
+    status, _, text = post(server_port, "/behaviors", body)
+
+    assert status == 400
+    assert json.loads(text)["error"]
+
+
+def test_unknown_endpoint_is_answered_with_404(server_port):
+    assert post(server_port, "/movies", {})[0] == 404
+
+
+def test_responses_only_depend_on_the_seed(server_port):
+    request = {"num_users": 30, "num_days": 5, "seed": 9}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda body: post(server_port, "/behaviors", body), [request, {**request, "seed": 10}] * 2))
+
+    assert responses[0] == responses[2]
+    assert responses[1] == responses[3]
+    assert responses[0][:2] == (200, "9")
+    assert responses[0][2] != responses[1][2]
+    assert responses[0][2].startswith("day_number|date|")
+
+
+def test_users_and_behaviors_of_a_request_share_their_users(server_port):
+    request = {"num_users": 20, "num_days": 10, "seed": 4, "users_per_chunk": 7}
+    _, _, users = post(server_port, "/users", request)
+    _, _, behaviors = post(server_port, "/behaviors", request)
+
+    user_ids = {line.split("|")[0] for line in users.splitlines()[1:]}
+    behavior_user_ids = {line.split("|")[5] for line in behaviors.splitlines()[1:]}
+    assert len(user_ids) == 20
+    assert behavior_user_ids and behavior_user_ids <= user_ids
@@ -0,0 +1,82 @@
+import json
+import random
+
+import pytest
+
+from behavior_generation.cli import load_user_probabilities, main
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences, iter_user_preferences
+from behavior_generation.generators.user_generator import generate_users, iter_users, seed_python_engine
+from behavior_generation.options import DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.preference_store import load_preferences, save_preference_batches
+from behavior_generation.user_table import concat_users, format_user_ids, format_users
+
+SEED = 12
+
+
+@pytest.fixture(scope="module")
+def user_probabilities():
+    return load_user_probabilities(DEFAULT_USER_PROBABILITIES_FILE)
+
+
+def test_python_users_do_not_depend_on_the_batch_size(user_probabilities):
+    seed_python_engine(SEED)
+    batches = list(iter_users(25, user_probabilities, batch_size=7))
+    seed_python_engine(SEED)
+    users = generate_users(25, user_probabilities)
+
+    assert [len(batch) for batch in batches] == [7, 7, 7, 4]
+    assert format_users(concat_users(batches)).equals(format_users(users))
+
+
+def test_vectorized_users_in_default_batches_match_generate_users(user_probabilities):
+    batches = list(iter_users(25, user_probabilities, engine="vectorized", seed=SEED))
+    users = generate_users(25, user_probabilities, engine="vectorized", seed=SEED)
+
+    assert format_users(concat_users(batches)).equals(format_users(users))
+
+
+@pytest.mark.parametrize("engine", ["python", "vectorized"])
+def test_preferences_read_user_ids_one_batch_at_a_time(engine):
+    user_ids = format_user_ids(range(1, 21))
+    consumed = []
+
+    def lazy_user_ids():
+        for user_id in user_ids:
+            consumed.append(user_id)
+            yield user_id
+
+    random.seed(SEED)
+    batches = iter_user_preferences(lazy_user_ids(), engine=engine, seed=SEED, batch_size=8)
+    next(batches)
+    assert len(consumed) == 8
+
+    preferences = {}
+    for batch in batches:
+        preferences.update(batch.to_dict() if engine == "vectorized" else batch)
+    assert list(preferences) == list(user_ids[8:])
+
+
+def test_streamed_preference_files_match_a_single_dump(tmp_path):
+    random.seed(SEED)
+    batches = list(iter_user_preferences(format_user_ids(range(1, 11)), batch_size=4))
+    random.seed(SEED)
+    preferences = generate_multiple_user_preferences(format_user_ids(range(1, 11)))
+    assert {user_id: values for batch in batches for user_id, values in batch.items()} == preferences
+
+    json_file = str(tmp_path / "preferences.json")
+    jsonl_file = str(tmp_path / "preferences.jsonl")
+    assert save_preference_batches(iter(batches), json_file, "json") == 10
+    assert save_preference_batches(iter(batches), jsonl_file, "jsonl") == 10
+
+    with open(json_file, encoding="utf-8") as file:
+        assert file.read() == json.dumps(preferences, indent=4)
+    assert load_preferences(jsonl_file) == preferences
+
+
+def test_users_command_streams_json_lines_to_standard_output(capsys):
+    main(["users", "--num_users", "12", "--seed", str(SEED), "--batch_size", "5", "--output_format", "jsonl", "--user_output_file", "-"])
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+    users = [json.loads(line) for line in lines]
+    assert [user["userID"] for user in users] == list(format_user_ids(range(1, 13)))
+    assert all(isinstance(user["liked_genres"], list) for user in users)
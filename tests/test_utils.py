@@ -0,0 +1,27 @@
+import numpy as np
+
+from behavior_generation.utils import round_array
+
+
+def tie_adjacent_values(ndigits):
+    """
+    Values whose scaled value sits on or right next to a .5 tie, where np.round and round() can disagree.
+    """
+    rng = np.random.default_rng(0)
+    ties = (np.arange(-2000, 2000) + 0.5) / 10 ** ndigits
+    values = [ties, np.nextafter(ties, np.inf), np.nextafter(ties, -np.inf), rng.uniform(-10, 10, 20000)]
+    return np.concatenate(values)
+
+
+def test_round_array_matches_round_on_tie_adjacent_values():
+    for ndigits in [0, 1, 2, 3]:
+        values = tie_adjacent_values(ndigits)
+        expected = [round(float(value), ndigits) for value in values]
+        assert round_array(values, ndigits).tolist() == expected
+
+
+def test_round_array_keeps_shape():
+    values = tie_adjacent_values(2)[:12].reshape(3, 4)
+    rounded = round_array(values, 2)
+    assert rounded.shape == (3, 4)
+    assert rounded.tolist() == [[round(float(value), 2) for value in row] for row in values]
@@ -0,0 +1,87 @@
+import random
+from decimal import Decimal, ROUND_DOWN
+
+import numpy as np
+
+from behavior_generation.generators.preference_generator import (
+    SATISFACTION_WEIGHT_RANGES,
+    generate_dominant_probabilities,
+    generate_satisfaction_weights,
+    normalize_probabilities,
+)
+from behavior_generation.generators.satisfaction_calculator import SATISFACTION_FACTORS
+from behavior_generation.generators.vectorized_preference_generator import (
+    generate_dominant_probability_matrix,
+    floor_cents,
+    generate_satisfaction_weight_matrix,
+    normalize_probability_matrix,
+)
+
+CATEGORIES = ["Spring", "Summer", "Autumn", "Winter"]
+
+
+class FixedDraws:
+    """
+    Stands in for a NumPy Generator, returning given draws so both engines round the same values.
+    """
+
+    def __init__(self, integers=None, uniform=None):
+        self._integers = integers
+        self._uniform = uniform
+
+    def integers(self, low, high, size):
+        return np.array(self._integers)
+
+    def uniform(self, low, high, size):
+        return np.array(self._uniform, dtype=np.float64).reshape(size)
+
+
+def test_floor_cents_matches_decimal():
+    # Values like 0.03 are stored slightly below the cent, while their float product with 100 is 3.0.
+    cents = np.arange(1, 100) / 100
+    values = np.concatenate([cents, np.nextafter(cents, 0), np.nextafter(cents, 1), np.random.default_rng(3).random(20000)])
+    expected = [int(Decimal(value).quantize(Decimal("0.01"), rounding=ROUND_DOWN) * 100) for value in values.tolist()]
+    assert floor_cents(values).tolist() == expected
+
+
+def test_normalize_probability_matrix_matches_normalize_probabilities():
+    rng = np.random.default_rng(0)
+    weights = rng.uniform(0.1, 0.5, size=(20000, len(CATEGORIES)))
+    weights[np.arange(len(weights)), rng.integers(0, len(CATEGORIES), size=len(weights))] = 1.0
+    # Rows whose shares are exact cents, repeating fractions or tied maxima.
+    crafted = np.array([[1.0, 1.0, 1.0, 1.0], [1.0, 1.0, 1.0, 0.5], [0.3, 0.3, 0.3, 0.1], [1.0, 0.1, 0.1, 0.1], [0.03, 0.06, 0.09, 0.82]])
+    weights = np.concatenate([crafted, weights])
+
+    expected = [list(normalize_probabilities(dict(zip(CATEGORIES, row))).values()) for row in weights.tolist()]
+    assert normalize_probability_matrix(weights).tolist() == expected
+
+
+def test_dominant_probability_matrix_matches_per_user_draws(monkeypatch):
+    rng = np.random.default_rng(1)
+    num_users = 2000
+    dominant = rng.integers(0, len(CATEGORIES), size=num_users)
+    uniforms = rng.uniform(0.1, 0.5, size=(num_users, len(CATEGORIES)))
+
+    matrix = generate_dominant_probability_matrix(num_users, len(CATEGORIES), FixedDraws(dominant, uniforms))
+
+    for user in range(num_users):
+        draws = iter(uniforms[user][np.arange(len(CATEGORIES)) != dominant[user]].tolist())
+        monkeypatch.setattr(random, "randint", lambda low, high: int(dominant[user]))
+        monkeypatch.setattr(random, "uniform", lambda low, high: next(draws))
+        assert matrix[user].tolist() == list(generate_dominant_probabilities(CATEGORIES).values())
+
+
+def test_satisfaction_weight_matrix_matches_per_user_draws(monkeypatch):
+    rng = np.random.default_rng(2)
+    num_users = 20000
+    low, high = np.array([SATISFACTION_WEIGHT_RANGES[factor] for factor in SATISFACTION_FACTORS]).T
+    uniforms = rng.uniform(low, high, size=(num_users, len(SATISFACTION_FACTORS)))
+
+    matrix = generate_satisfaction_weight_matrix(num_users, FixedDraws(uniform=uniforms))
+
+    for user in range(num_users):
+        draws = dict(zip(SATISFACTION_FACTORS, uniforms[user].tolist()))
+        by_range = iter([draws[factor] for factor in SATISFACTION_WEIGHT_RANGES])
+        monkeypatch.setattr(random, "uniform", lambda low, high: next(by_range))
+        weights = generate_satisfaction_weights()
+        assert matrix[user].tolist() == [weights[factor] for factor in SATISFACTION_FACTORS]
@@ -0,0 +1,80 @@
+import pickle
+from collections import Counter
+
+import numpy as np
+
+from behavior_generation.keyed_random import mix64
+from behavior_generation.watch_history import MAX_WATCH_COUNT, WatchHistory
+
+
+def random_pairs(size, seed):
+    """
+    (user row, movie index) pairs over few users and movies, so most pairs repeat.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 300, size=size), rng.integers(0, 200, size=size)
+
+
+def assert_matches(history, reference):
+    assert len(history) == len(reference)
+    for (user_row, movie_index), count in reference.items():
+        assert history.watch_count(user_row, movie_index) == count
+    assert history.watch_count(300, 0) == 0
+
+
+def test_record_matches_counter_while_growing():
+    history = WatchHistory(capacity=2)
+    reference = Counter()
+    for user_row, movie_index in zip(*random_pairs(20000, 0)):
+        assert history.record(user_row, movie_index) == reference[user_row, movie_index]
+        reference[user_row, movie_index] += 1
+
+    assert len(history.keys) > 2
+    assert_matches(history, reference)
+
+
+def test_record_many_matches_counter_with_repeated_pairs():
+    history = WatchHistory(capacity=2)
+    reference = Counter()
+    user_rows, movie_indices = random_pairs(60000, 1)
+    for start in range(0, len(user_rows), 7000):
+        batch = list(zip(user_rows[start:start + 7000].tolist(), movie_indices[start:start + 7000].tolist()))
+        expected = []
+        for pair in batch:
+            expected.append(reference[pair])
+            reference[pair] += 1
+        assert history.record_many(*zip(*batch)).tolist() == expected
+
+    assert_matches(history, reference)
+
+
+def test_colliding_keys_are_probed():
+    history = WatchHistory()
+    user_rows, movie_indices = random_pairs(5000, 2)
+    reference = Counter(zip(user_rows.tolist(), movie_indices.tolist()))
+    history.record_many(user_rows, movie_indices)
+
+    # to_arrays returns the used slots in table order.
+    stored_slots = np.flatnonzero(history.keys != np.iinfo(np.uint64).max)
+    keys, _ = history.to_arrays()
+    home_slots = (mix64(keys) & np.uint64(len(history.keys) - 1)).astype(np.intp)
+    assert (home_slots != stored_slots).any()
+    assert_matches(history, reference)
+
+
+def test_counts_saturate():
+    history = WatchHistory()
+    previous = history.record_many(np.zeros(MAX_WATCH_COUNT + 10, dtype=np.int64), np.zeros(MAX_WATCH_COUNT + 10, dtype=np.int64))
+    assert previous[-1] == MAX_WATCH_COUNT
+    assert history.record(0, 0) == MAX_WATCH_COUNT
+    assert history.watch_count(0, 0) == MAX_WATCH_COUNT
+
+
+def test_pickle_and_arrays_round_trip():
+    history = WatchHistory()
+    user_rows, movie_indices = random_pairs(5000, 3)
+    reference = Counter(zip(user_rows.tolist(), movie_indices.tolist()))
+    history.record_many(user_rows, movie_indices)
+
+    assert_matches(pickle.loads(pickle.dumps(history)), reference)
+    assert_matches(WatchHistory.from_arrays(*history.to_arrays()), reference)
@@ -0,0 +1,88 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from behavior_generation.cli import load_user_probabilities
+from behavior_generation.generators.behavior_generator import iter_behavior_data
+from behavior_generation.generators.preference_generator import generate_multiple_user_preferences
+from behavior_generation.generators.user_generator import generate_users
+from behavior_generation.movie_catalog import load_movie_catalog
+from behavior_generation.options import DEFAULT_MOVIE_DATA_FILE, DEFAULT_USER_PROBABILITIES_FILE
+from behavior_generation.user_table import format_user_ids, format_users
+from behavior_generation.writers import open_behavior_writer, read_users, write_user_batches, write_users
+
+SEED = 8
+
+
+@pytest.fixture(scope="module")
+def users():
+    return generate_users(50, load_user_probabilities(DEFAULT_USER_PROBABILITIES_FILE), engine="vectorized", seed=SEED)
+
+
+@pytest.fixture(scope="module")
+def behavior_chunks(users):
+    preferences = generate_multiple_user_preferences(format_user_ids(users["userID"]), engine="vectorized", seed=SEED)
+    # 120 days from February 1st span three seasons.
+    return list(iter_behavior_data(users, load_movie_catalog(DEFAULT_MOVIE_DATA_FILE), preferences, num_days=120, start_date="2025-02-01", engine="vectorized", seed=SEED))
+
+
+def read_behavior_dataset(path):
+    # Parquet keeps day numbers as int32 and context values as categoricals.
+    behaviors = pd.read_parquet(path)
+    behaviors = behaviors.astype({"day_number": np.int64, **{name: object for name in behaviors.columns if isinstance(behaviors[name].dtype, pd.CategoricalDtype)}})
+    return behaviors.sort_values(["day_number", "userId"]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "jsonl"])
+def test_users_round_trip(tmp_path, users, output_format):
+    path = str(tmp_path / f"users.{output_format}")
+    if output_format == "jsonl":
+        with open(path, "w", encoding="utf-8") as file:
+            write_user_batches([users[:20], users[20:]], file, output_format)
+    else:
+        write_users(users, path, output_format)
+
+    read_back = read_users(path, output_format)
+    assert read_back["userID"].dtype == np.int64
+    assert read_back["language_spoken"].dtype == np.uint64
+    assert format_users(read_back).equals(format_users(users))
+
+
+def test_parquet_partitions_hold_the_rows_of_their_value(tmp_path, behavior_chunks):
+    expected = pd.concat(behavior_chunks, ignore_index=True)
+    path = str(tmp_path / "behaviors")
+    with open_behavior_writer(path, "parquet", partition_by="season", row_group_size=100) as writer:
+        for chunk in behavior_chunks:
+            writer.write(chunk)
+
+    seasons = sorted(os.path.basename(directory) for directory in glob.glob(os.path.join(path, "*")))
+    assert seasons == [f"season={season}" for season in sorted(expected["season"].unique())]
+    for directory in seasons:
+        season_rows = pd.read_parquet(glob.glob(os.path.join(path, directory, "*.parquet"))[0])
+        assert "season" not in season_rows.columns
+        assert set(season_rows["date"].astype(str)) <= set(expected.loc[expected["season"] == directory.split("=")[1], "date"])
+
+    read_back = read_behavior_dataset(path)
+    assert read_back[expected.columns].equals(expected.sort_values(["day_number", "userId"]).reset_index(drop=True))
+
+
+def test_resumed_parquet_partitions_drop_the_parts_written_after_the_checkpoint(tmp_path, behavior_chunks):
+    path = str(tmp_path / "behaviors")
+    half = len(behavior_chunks) // 2
+    with open_behavior_writer(path, "parquet", partition_by="date") as writer:
+        for chunk in behavior_chunks[:half]:
+            writer.write(chunk)
+        position = writer.checkpoint()
+        # Rows written after the checkpoint, lost when the run stops.
+        writer.write(behavior_chunks[half])
+
+    with open_behavior_writer(path, "parquet", partition_by="date", position=position) as writer:
+        for chunk in behavior_chunks[half:]:
+            writer.write(chunk)
+
+    expected = pd.concat(behavior_chunks, ignore_index=True).sort_values(["day_number", "userId"]).reset_index(drop=True)
+    read_back = read_behavior_dataset(path)
+    assert read_back[expected.columns].equals(expected)